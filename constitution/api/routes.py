@@ -8,14 +8,21 @@ from flask_cors import cross_origin
 import logging
 from datetime import datetime
 import os
-import cv2
-import numpy as np
+import time
 from dotenv import load_dotenv  # 新增：加载.env文件
 
 # 导入服务层
 from services.ocr_service import BaiduOCRService
 from services.drug_extractor import DrugInfoExtractor
+from services.drug_lexicon import DrugLexicon
+from services.drug_knowledge import DrugKnowledgeBase
 from services.image_processor import ImageProcessor
+from services.frame_index import RecentFrameIndex
+from services.text_detector import TextPresenceDetector
+from services.analysis_store import AnalysisResultStore
+from services.capture_session import CaptureSessionStore
+from services.burst_selector import BurstFrameSelector
+from services.ocr_fusion import OCRResultFusion
 from utils.logger import get_logger, log_api_call  # 新增：日志装饰器
 
 # 加载.env文件（优先加载项目根目录的.env）
@@ -31,23 +38,247 @@ class DefaultConfig:
     BAIDU_TOKEN_URL = 'https://aip.baidubce.com/oauth/2.0/token'
     BAIDU_OCR_URL = 'https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic'
 
+    # HTTP连接池（keep-alive复用）
+    OCR_TIMEOUT = int(os.getenv('OCR_TIMEOUT', 30))
+    REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 10))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 10))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 1))
+
+    # access_token后台刷新：到期前自动续期，请求线程不等待token接口
+    TOKEN_AUTO_REFRESH = os.getenv('TOKEN_AUTO_REFRESH', 'True').lower() == 'true'
+    TOKEN_REFRESH_AHEAD = int(os.getenv('TOKEN_REFRESH_AHEAD', 6 * 3600))
+    TOKEN_STORE_PATH = os.getenv('TOKEN_STORE_PATH', 'tmp/baidu_token.db')
+
+    # OCR结果缓存（内存LRU + 可选磁盘层）
+    OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'True').lower() == 'true'
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', 256))
+    OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', 3600))
+    OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '')
+
+    # 近重复帧复用（感知哈希）
+    FRAME_DEDUP_ENABLED = os.getenv('FRAME_DEDUP_ENABLED', 'True').lower() == 'true'
+    FRAME_DEDUP_THRESHOLD = int(os.getenv('FRAME_DEDUP_THRESHOLD', 6))
+    FRAME_DEDUP_MAX_AGE = float(os.getenv('FRAME_DEDUP_MAX_AGE', 10))
+    FRAME_DEDUP_HISTORY = int(os.getenv('FRAME_DEDUP_HISTORY', 8))
+
+    # 内存识别流水线仅在调试时保存原图和处理结果
+    DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+    DEBUG_SAVE_IMAGES = os.getenv('DEBUG_SAVE_IMAGES', str(DEBUG)).lower() == 'true'
+
+    # 超大JPEG缩小解码
+    JPEG_REDUCED_DECODE = os.getenv('JPEG_REDUCED_DECODE', 'True').lower() == 'true'
+    PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'full')
+    PREPROCESS_BACKEND = os.getenv('PREPROCESS_BACKEND', 'thread')
+    PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', 0))
+    ANALYSIS_MAX_SIDE = int(os.getenv('ANALYSIS_MAX_SIDE', 1024))
+    SHARPNESS_BLURRY = float(os.getenv('SHARPNESS_BLURRY', 300))
+    SHARPNESS_FAIR = float(os.getenv('SHARPNESS_FAIR', 800))
+    CROP_TEXT_REGION = os.getenv('CROP_TEXT_REGION', 'True').lower() == 'true'
+    ENCODE_BUDGET_BYTES = int(os.getenv('ENCODE_BUDGET_BYTES', 200 * 1024))
+    ENCODE_MIN_QUALITY = int(os.getenv('ENCODE_MIN_QUALITY', 60))
+    ENCODE_MIN_TEXT_HEIGHT = int(os.getenv('ENCODE_MIN_TEXT_HEIGHT', 16))
+
+    # 本地文字检测：引导帧检测到足够大的文字后才调用远程OCR
+    TEXT_GATE_ENABLED = os.getenv('TEXT_GATE_ENABLED', 'True').lower() == 'true'
+    TEXT_MIN_HEIGHT_RATIO = float(os.getenv('TEXT_MIN_HEIGHT_RATIO', 0.018))
+    TEXT_DETECTOR_EAST_MODEL = os.getenv('TEXT_DETECTOR_EAST_MODEL', '')
+
+    # 拍照分析结果复用：/api/recognize携带analysis_id或提交同一张照片时复用分析阶段的OCR结果
+    ANALYSIS_STORE_ENABLED = os.getenv('ANALYSIS_STORE_ENABLED', 'True').lower() == 'true'
+    ANALYSIS_STORE_MAX_ENTRIES = int(os.getenv('ANALYSIS_STORE_MAX_ENTRIES', 512))
+    ANALYSIS_STORE_TTL = int(os.getenv('ANALYSIS_STORE_TTL', 120))
+
+    # 多面拍摄会话：/api/recognize携带session_id时各次拍摄结果按字段置信度合并
+    CAPTURE_SESSION_ENABLED = os.getenv('CAPTURE_SESSION_ENABLED', 'True').lower() == 'true'
+    CAPTURE_SESSION_MAX_ENTRIES = int(os.getenv('CAPTURE_SESSION_MAX_ENTRIES', 1024))
+    CAPTURE_SESSION_TTL = int(os.getenv('CAPTURE_SESSION_TTL', 300))
+    CAPTURE_SESSION_MAX_BYTES = int(os.getenv('CAPTURE_SESSION_MAX_BYTES', 32 * 1024 * 1024))
+
+    # 多帧OCR融合：连拍的多帧、同一会话内对同一面的重拍按行对齐后逐字投票
+    OCR_FUSION_ENABLED = os.getenv('OCR_FUSION_ENABLED', 'True').lower() == 'true'
+    OCR_FUSION_HISTORY = int(os.getenv('OCR_FUSION_HISTORY', 3))
+
+    # 连拍识别：/api/recognize/burst一次上传多帧，只OCR评分最高的一帧
+    BURST_MIN_FRAMES = int(os.getenv('BURST_MIN_FRAMES', 3))
+    BURST_MAX_FRAMES = int(os.getenv('BURST_MAX_FRAMES', 8))
+    BURST_SCORE_SIDE = int(os.getenv('BURST_SCORE_SIDE', 480))
+    BURST_TRY_RUNNER_UP = os.getenv('BURST_TRY_RUNNER_UP', 'True').lower() == 'true'
+
+    # 流式拍照分析（WebSocket /api/stream，需要安装flask-sock）
+    STREAM_ENABLED = os.getenv('STREAM_ENABLED', 'True').lower() == 'true'
+    STREAM_MAX_FRAME_BYTES = int(os.getenv('STREAM_MAX_FRAME_BYTES', 2 * 1024 * 1024))
+    STREAM_SMOOTHING = float(os.getenv('STREAM_SMOOTHING', 0.4))
+    STREAM_OCR_INTERVAL = float(os.getenv('STREAM_OCR_INTERVAL', 1.0))
+    STREAM_OCR_CHANGE_THRESHOLD = int(os.getenv('STREAM_OCR_CHANGE_THRESHOLD', 10))
+
+    # 药品名称词库：名录文件为空时不启用，药名不做校正
+    DRUG_LEXICON_PATH = os.getenv('DRUG_LEXICON_PATH', '')
+    DRUG_LEXICON_INDEX_DIR = os.getenv('DRUG_LEXICON_INDEX_DIR', 'tmp/lexicon')
+    DRUG_LEXICON_MAX_DISTANCE = int(os.getenv('DRUG_LEXICON_MAX_DISTANCE', 2))
+    DRUG_LEXICON_RELOAD_INTERVAL = float(os.getenv('DRUG_LEXICON_RELOAD_INTERVAL', 60))
+
+    # 药品知识库：识别出药名后按知识库补全、核对用法、用量和禁忌
+    DRUG_KB_ENABLED = os.getenv('DRUG_KB_ENABLED', 'True').lower() == 'true'
+    DRUG_KB_PATH = os.getenv('DRUG_KB_PATH', 'tmp/drug_knowledge.db')
+    DRUG_KB_SEED = os.getenv('DRUG_KB_SEED', '')
+    DRUG_KB_CACHE_ENTRIES = int(os.getenv('DRUG_KB_CACHE_ENTRIES', 1024))
+
     @property
     def baidu_ocr_config(self):
         return {
             'api_key': self.BAIDU_API_KEY,
             'secret_key': self.BAIDU_SECRET_KEY,
             'token_url': self.BAIDU_TOKEN_URL,
-            'ocr_url': self.BAIDU_OCR_URL
+            'ocr_url': self.BAIDU_OCR_URL,
+            'token_timeout': self.REQUEST_TIMEOUT,
+            'ocr_timeout': self.OCR_TIMEOUT,
+            'token_refresh_ahead': self.TOKEN_REFRESH_AHEAD,
+            'token_store_path': self.TOKEN_STORE_PATH or None,
+            'http_pool': {
+                'pool_connections': self.HTTP_POOL_CONNECTIONS,
+                'pool_maxsize': self.HTTP_POOL_MAXSIZE,
+                'max_retries': self.HTTP_MAX_RETRIES,
+                'connect_timeout': self.HTTP_CONNECT_TIMEOUT,
+                'read_timeout': self.OCR_TIMEOUT
+            },
+            'cache': {
+                'enabled': self.OCR_CACHE_ENABLED,
+                'max_entries': self.OCR_CACHE_MAX_ENTRIES,
+                'max_bytes': self.OCR_CACHE_MAX_BYTES,
+                'ttl': self.OCR_CACHE_TTL,
+                'disk_dir': self.OCR_CACHE_DIR or None
+            }
+        }
+
+    @property
+    def frame_index_config(self):
+        return {
+            'threshold': self.FRAME_DEDUP_THRESHOLD,
+            'max_age': self.FRAME_DEDUP_MAX_AGE,
+            'history_size': self.FRAME_DEDUP_HISTORY
+        }
+
+    @property
+    def analysis_store_config(self):
+        return {
+            'max_entries': self.ANALYSIS_STORE_MAX_ENTRIES,
+            'ttl': self.ANALYSIS_STORE_TTL
+        }
+
+    @property
+    def capture_session_config(self):
+        return {
+            'max_entries': self.CAPTURE_SESSION_MAX_ENTRIES,
+            'max_bytes': self.CAPTURE_SESSION_MAX_BYTES,
+            'ttl': self.CAPTURE_SESSION_TTL,
+            'ocr_history': self.OCR_FUSION_HISTORY if self.OCR_FUSION_ENABLED else 0
+        }
+
+    @property
+    def burst_config(self):
+        return {
+            'score_side': self.BURST_SCORE_SIDE
+        }
+
+    @property
+    def stream_config(self):
+        return {
+            'smoothing': self.STREAM_SMOOTHING,
+            'ocr_interval': self.STREAM_OCR_INTERVAL,
+            'ocr_change_threshold': self.STREAM_OCR_CHANGE_THRESHOLD
+        }
+
+    @property
+    def drug_lexicon_config(self):
+        return {
+            'path': self.DRUG_LEXICON_PATH,
+            'index_dir': self.DRUG_LEXICON_INDEX_DIR,
+            'max_distance': self.DRUG_LEXICON_MAX_DISTANCE,
+            'reload_interval': self.DRUG_LEXICON_RELOAD_INTERVAL
+        }
+
+    @property
+    def drug_knowledge_config(self):
+        return {
+            'db_path': self.DRUG_KB_PATH,
+            'seed_path': self.DRUG_KB_SEED or None,
+            'cache_entries': self.DRUG_KB_CACHE_ENTRIES
+        }
+
+    @property
+    def text_detector_config(self):
+        return {
+            'min_text_height_ratio': self.TEXT_MIN_HEIGHT_RATIO,
+            'east_model_path': self.TEXT_DETECTOR_EAST_MODEL or None
+        }
+
+    @property
+    def image_processor_config(self):
+        return {
+            'debug_save': self.DEBUG_SAVE_IMAGES,
+            'reduced_decode': self.JPEG_REDUCED_DECODE,
+            'preprocess_mode': self.PREPROCESS_MODE,
+            'preprocess_backend': self.PREPROCESS_BACKEND,
+            'preprocess_workers': self.PREPROCESS_WORKERS,
+            'analysis_max_side': self.ANALYSIS_MAX_SIDE,
+            'crop_text_region': self.CROP_TEXT_REGION,
+            'encode_budget_bytes': self.ENCODE_BUDGET_BYTES,
+            'encode_min_quality': self.ENCODE_MIN_QUALITY,
+            'encode_min_text_height': self.ENCODE_MIN_TEXT_HEIGHT
         }
 
 config = DefaultConfig()
 
 ocr_service = BaiduOCRService(config.baidu_ocr_config)
-drug_extractor = DrugInfoExtractor()
-image_processor = ImageProcessor()
+drug_lexicon = DrugLexicon(config.drug_lexicon_config) if config.DRUG_LEXICON_PATH else None
+drug_knowledge = DrugKnowledgeBase(config.drug_knowledge_config) if config.DRUG_KB_ENABLED else None
+drug_extractor = DrugInfoExtractor(lexicon=drug_lexicon, knowledge_base=drug_knowledge)
+image_processor = ImageProcessor(config.image_processor_config)
+frame_index = RecentFrameIndex(config.frame_index_config) if config.FRAME_DEDUP_ENABLED else None
+text_detector = TextPresenceDetector(config.text_detector_config) if config.TEXT_GATE_ENABLED else None
+analysis_store = AnalysisResultStore(config.analysis_store_config) if config.ANALYSIS_STORE_ENABLED else None
+capture_sessions = CaptureSessionStore(config.capture_session_config) if config.CAPTURE_SESSION_ENABLED else None
+burst_selector = BurstFrameSelector(image_processor, text_detector, config.burst_config)
+ocr_fusion = OCRResultFusion() if config.OCR_FUSION_ENABLED else None
 logger = get_logger(__name__)
 
 
+@api_bp.record_once
+def start_background_tasks(state):
+    """蓝图注册到应用时启动后台任务；只导入本模块（测试、工具脚本）不会发起token请求"""
+    if config.TOKEN_AUTO_REFRESH:
+        ocr_service.start_token_refresher()
+
+
+def get_client_id() -> str:
+    """
+    获取客户端标识，用于按客户端隔离近重复帧索引
+
+    Returns:
+        str: 客户端标识（X-Client-Id请求头 > client_id表单字段 > 远端地址）
+    """
+    return (request.headers.get('X-Client-Id') or
+            request.form.get('client_id') or
+            request.remote_addr or 'anonymous')
+
+
+def get_frame_fingerprint(image):
+    """
+    计算帧指纹，未启用近重复帧复用时返回None
+
+    Args:
+        image: 图片文件路径或编码后的图片字节
+    """
+    if not frame_index:
+        return None
+    if isinstance(image, bytes):
+        return image_processor.fingerprint_image_bytes(image)
+    return image_processor.fingerprint_image(image)
+
+
 @api_bp.route('/health', methods=['GET'])
 @cross_origin()
 @log_api_call  # 新增：API调用日志装饰器
@@ -74,6 +305,38 @@ def health_check():
         }), 500
 
 
+@api_bp.route('/stats', methods=['GET'])
+@cross_origin()
+@log_api_call
+def service_stats():
+    """服务运行统计接口 - 用于容量规划和调优"""
+    try:
+        return jsonify({
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'ocr_http_pool': ocr_service.get_pool_stats(),
+            'ocr_cache': ocr_service.get_cache_stats(),
+            'frame_index': frame_index.get_stats() if frame_index else None,
+            'preprocess_pool': image_processor.get_preprocess_pool_stats(),
+            'preprocess_workspaces': image_processor.get_workspace_stats(),
+            'payload_encoder': image_processor.get_payload_encoder_stats(),
+            'text_gate': text_detector.get_stats() if text_detector else None,
+            'analysis_store': analysis_store.get_stats() if analysis_store else None,
+            'capture_sessions': capture_sessions.get_stats() if capture_sessions else None,
+            'burst': burst_selector.get_stats(),
+            'ocr_fusion': ocr_fusion.get_stats() if ocr_fusion else None,
+            'drug_lexicon': drug_lexicon.get_stats() if drug_lexicon else None,
+            'drug_knowledge': drug_knowledge.get_stats() if drug_knowledge else None
+        })
+    except Exception as e:
+        logger.error(f"获取服务统计失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'获取服务统计失败: {str(e)}',
+            'error_code': 'STATS_ERROR'
+        }), 500
+
+
 @api_bp.route('/analyze-image', methods=['POST'])
 @cross_origin()
 @log_api_call
@@ -93,41 +356,17 @@ def analyze_image():
 
         image_file = request.files['image']
 
-        # 保存临时文件
-        temp_image_path = image_processor.save_temp_image(image_file)
-        if not temp_image_path:
+        # 读取图片数据（只解码一次，不落盘）
+        image_bytes = image_processor.read_image_bytes(image_file)
+        if not image_bytes:
             return jsonify({
                 'success': False,
-                'error': '图片保存失败',
-                'error_code': 'SAVE_FAILED'
-            }), 500
-
-        try:
-            # 1. 光线检测
-            light_analysis = analyze_lighting(temp_image_path)
-
-            # 2. 图像质量检测
-            quality_analysis = analyze_image_quality(temp_image_path)
-
-            # 3. 内容预检测（快速OCR）
-            content_analysis = quick_content_analysis(temp_image_path)
-
-            # 4. 生成拍照指导
-            guidance = generate_photo_guidance(light_analysis, quality_analysis, content_analysis)
+                'error': '图片读取失败',
+                'error_code': 'READ_FAILED'
+            }), 400
 
-            return jsonify({
-                'success': True,
-                'analysis': {
-                    'lighting': light_analysis,
-                    'quality': quality_analysis,
-                    'content': content_analysis,
-                    'guidance': guidance
-                }
-            })
-
-        finally:
-            # 清理临时文件
-            image_processor.cleanup_temp_files(temp_image_path)
+        response_data, status_code = run_analysis_pipeline(image_bytes, get_client_id())
+        return jsonify(response_data), status_code
 
     except Exception as e:
         logger.error(f"图像分析异常: {str(e)}")
@@ -188,62 +427,22 @@ def recognize_drug():
                 'voice_guidance': '请使用正确的图片格式'
             }), 400
 
-        # 保存临时文件
-        temp_image_path = image_processor.save_temp_image(image_file)
-        if not temp_image_path:
+        # 读取图片数据（全程在内存中处理，不落盘）
+        image_bytes = image_processor.read_image_bytes(image_file)
+        if not image_bytes:
             return jsonify({
                 'success': False,
-                'error': '图片保存失败',
-                'error_code': 'SAVE_FAILED',
+                'error': '图片读取失败',
+                'error_code': 'READ_FAILED',
                 'voice_guidance': '拍照失败，请重试'
-            }), 500
-
-        logger.info(f"图片保存成功: {temp_image_path}")
-        logger.info(f"文件存在: {os.path.exists(temp_image_path)}")
-        logger.info(f"文件大小: {os.path.getsize(temp_image_path)} 字节")
-
-        try:
-            # 1. 图像预处理
-            processed_image_path = image_processor.preprocess_image(temp_image_path)
-            logger.info("图像预处理完成")
-
-            # 2. OCR文字识别（强制调用，忽略前置内容检测）
-            logger.info("开始OCR识别...")
-            ocr_result = ocr_service.recognize_text(processed_image_path, force_call=True)
-
-            if not ocr_result.get('success'):
-                logger.error(f"OCR识别失败: {ocr_result.get('error')}，错误码: {ocr_result.get('error_code')}")
-                return jsonify({
-                    'success': False,
-                    'error': ocr_result.get('error', 'OCR识别失败'),
-                    'error_code': ocr_result.get('error_code', 'OCR_FAILED'),
-                    'voice_guidance': '识别失败，请重试'
-                }), 500
-
-            # 3. 药品信息提取
-            drug_info = drug_extractor.extract_drug_info(ocr_result)
-
-            # 4. 验证药品信息完整性
-            validation_result = validate_drug_info(drug_info)
-
-            # 5. 构建响应
-            response_data = {
-                'success': True,
-                'drug_info': drug_info,
-                'ocr_confidence': ocr_result.get('words_result_num', 0),
-                'processing_time': datetime.now().isoformat(),
-                'image_processed': processed_image_path != temp_image_path,
-                'validation': validation_result,
-                'voice_guidance': generate_voice_guidance(drug_info, validation_result),
-                'raw_ocr_result': ocr_result.get('raw_result')  # 新增：返回OCR原始结果
-            }
+            }), 400
 
-            logger.info(f"药品识别成功: {drug_info.get('drug_name', '未知药品')}")
-            return jsonify(response_data)
+        logger.info(f"图片读取成功, 大小: {len(image_bytes)} 字节")
 
-        finally:
-            # 清理临时文件
-            image_processor.cleanup_temp_files(temp_image_path, processed_image_path)
+        analysis_id = request.form.get('analysis_id') or request.headers.get('X-Analysis-Id')
+        session_id = request.form.get('session_id') or request.headers.get('X-Session-Id')
+        response_data, status_code = run_recognition_pipeline(image_bytes, get_client_id(), analysis_id, session_id)
+        return jsonify(response_data), status_code
 
     except Exception as e:
         logger.error(f"药品识别异常: {str(e)}")
@@ -255,6 +454,65 @@ def recognize_drug():
         }), 500
 
 
+@api_bp.route('/recognize/burst', methods=['POST'])
+@cross_origin()
+@log_api_call
+def recognize_drug_burst():
+    """
+    连拍识别接口
+    一次上传3~8张连拍照片，服务端按清晰度、曝光和文字存在性选出最好的一帧识别，
+    结果不完整时可再识别次优帧，减少因模糊导致的重拍往返
+    """
+    try:
+        image_files = request.files.getlist('images')
+        if not (config.BURST_MIN_FRAMES <= len(image_files) <= config.BURST_MAX_FRAMES):
+            return jsonify({
+                'success': False,
+                'error': f'连拍需要上传{config.BURST_MIN_FRAMES}~{config.BURST_MAX_FRAMES}张图片，'
+                         f'实际{len(image_files)}张',
+                'error_code': 'INVALID_BURST_SIZE',
+                'voice_guidance': '请重新拍照'
+            }), 400
+
+        frames = [image_processor.read_image_bytes(image_file) for image_file in image_files]
+        session_id = request.form.get('session_id') or request.headers.get('X-Session-Id')
+        try_runner_up = request.form.get('try_runner_up', str(config.BURST_TRY_RUNNER_UP)).lower() == 'true'
+
+        response_data, status_code = run_burst_pipeline(frames, get_client_id(), session_id, try_runner_up)
+        return jsonify(response_data), status_code
+
+    except Exception as e:
+        logger.error(f"连拍识别异常: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'error_code': 'INTERNAL_ERROR',
+            'voice_guidance': '识别出错，请重试'
+        }), 500
+
+
+@api_bp.route('/session/<session_id>', methods=['DELETE'])
+@cross_origin()
+@log_api_call
+def end_capture_session(session_id):
+    """结束多面拍摄会话（用户换下一盒药时调用，不调用则按TTL自然过期）"""
+    if not capture_sessions:
+        return jsonify({
+            'success': False,
+            'error': '多面拍摄会话未启用',
+            'error_code': 'SESSION_DISABLED'
+        }), 404
+
+    if not capture_sessions.end(session_id):
+        return jsonify({
+            'success': False,
+            'error': '会话不存在或已过期',
+            'error_code': 'SESSION_NOT_FOUND'
+        }), 404
+
+    return jsonify({'success': True, 'session_id': session_id})
+
+
 @api_bp.route('/recognize/base64', methods=['POST'])
 @cross_origin()
 @log_api_call
@@ -272,43 +530,38 @@ def recognize_drug_base64():
                 'error_code': 'NO_IMAGE_DATA'
             }), 400
 
-        # 处理Base64图片
-        temp_image_path = image_processor.save_base64_image(data['image'])
-        if not temp_image_path:
+        # 解码Base64图片（内存处理，不落盘）
+        image_bytes = image_processor.decode_base64_image(data['image'])
+        if not image_bytes:
             return jsonify({
                 'success': False,
                 'error': '图片数据无效',
                 'error_code': 'INVALID_IMAGE_DATA'
             }), 400
 
-        try:
-            # 图像预处理
-            processed_image_path = image_processor.preprocess_image(temp_image_path)
+        # 图像预处理（失败时使用原图）
+        processed_bytes = image_processor.preprocess_image_bytes(image_bytes)
 
-            # OCR识别（强制调用）
-            ocr_result = ocr_service.recognize_text(processed_image_path, force_call=True)
-
-            if not ocr_result.get('success'):
-                return jsonify({
-                    'success': False,
-                    'error': ocr_result.get('error', 'OCR识别失败'),
-                    'error_code': 'OCR_FAILED'
-                }), 500
-
-            # 药品信息提取
-            drug_info = drug_extractor.extract_drug_info(ocr_result)
+        # OCR识别
+        ocr_result = ocr_service.recognize_image_bytes(processed_bytes or image_bytes)
 
+        if not ocr_result.get('success'):
             return jsonify({
-                'success': True,
-                'drug_info': drug_info,
-                'ocr_confidence': ocr_result.get('words_result_num', 0),
-                'processing_time': datetime.now().isoformat(),
-                'raw_ocr_result': ocr_result.get('raw_result')
-            })
+                'success': False,
+                'error': ocr_result.get('error', 'OCR识别失败'),
+                'error_code': 'OCR_FAILED'
+            }), 500
+
+        # 药品信息提取
+        drug_info = drug_extractor.extract_drug_info(ocr_result)
 
-        finally:
-            # 清理临时文件
-            image_processor.cleanup_temp_files(temp_image_path, processed_image_path)
+        return jsonify({
+            'success': True,
+            'drug_info': drug_info,
+            'ocr_confidence': ocr_result.get('words_result_num', 0),
+            'processing_time': datetime.now().isoformat(),
+            'raw_ocr_result': ocr_result.get('raw_result')
+        })
 
     except Exception as e:
         logger.error(f"Base64药品识别异常: {str(e)}")
@@ -319,31 +572,310 @@ def recognize_drug_base64():
         }), 500
 
 
-def analyze_lighting(image_path: str) -> dict:
+def analysis_frame_source(kind: str, gray) -> dict:
     """
-    分析图像光线条件
+    描述分析阶段OCR所用的图像，随复用结果一起返回
+
+    分析阶段OCR的是缩小的灰度工作图（或实时预览帧），没有经过全分辨率预处理和文字区域裁剪，
+    识别接口复用时客户端据此知道结果来自较低质量的图像。
 
     Args:
-        image_path: 图片路径
+        kind: 'analysis_frame'（拍照分析）或'stream_preview'（实时预览帧）
+        gray: 提交OCR的灰度工作图
 
     Returns:
-        dict: 光线分析结果
+        dict: {'kind', 'size', 'preprocessed', 'cropped'}
     """
-    try:
-        # 读取图片
-        img = cv2.imread(image_path)
-        if img is None:
-            return {'status': 'error', 'message': '无法读取图片'}
+    height, width = gray.shape[:2]
+    return {'kind': kind, 'size': [width, height], 'preprocessed': False, 'cropped': False}
+
+
+def run_analysis_pipeline(image_bytes: bytes, client_id: str):
+    """
+    拍照分析流水线：一次解码得到缩小的灰度工作图，光线、清晰度、指纹和内容预检共用该图
+
+    Args:
+        image_bytes: 上传的原始图片字节
+        client_id: 客户端标识
+
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    report = {}
+    analysis_id = None
+    gray = image_processor.build_analysis_frame(image_bytes, report)
+    if gray is None:
+        return {
+            'success': False,
+            'error': '无法解码图片',
+            'error_code': 'DECODE_FAILED'
+        }, 400
+    timings = report['timings_ms']
+
+    # 0. 近重复帧检测：指纹直接取自工作图，与该客户端上一帧几乎相同则复用分析结果
+    fingerprint = None
+    reused = None
+    if frame_index:
+        start = time.perf_counter()
+        fingerprint = image_processor.compute_dhash(gray)
+        timings['fingerprint'] = round((time.perf_counter() - start) * 1000, 2)
+        reused = frame_index.lookup(client_id, fingerprint, 'analysis')
+
+    if reused:
+        logger.info(f"复用近重复帧分析结果, 汉明距离: {reused['distance']}")
+        return {
+            'success': True,
+            'analysis': reused['result'],
+            'analysis_id': reused['result'].get('analysis_id'),
+            'frame_reuse': {'distance': reused['distance'], 'age': reused['age']},
+            'timings_ms': timings
+        }, 200
+
+    # 1. 光线与图像质量检测（亮度、对比度、清晰度均在工作图上计算）
+    metrics = image_processor.measure_analysis_metrics(gray, timings)
+    source_width, source_height = report['decode']['source_size']
+    light_analysis = analyze_lighting(metrics['brightness'], metrics['contrast'])
+    quality_analysis = analyze_image_quality(metrics['sharpness'], source_width * source_height)
+
+    # 2. 本地文字检测：没有文字或文字太小时不调用远程OCR
+    text_detection = None
+    if text_detector:
+        text_detection = text_detector.detect(gray)
+        timings['text_detection'] = text_detection['elapsed_ms']
+
+    if text_detection and not text_detection['text_large_enough']:
+        content_analysis = gated_content_analysis(text_detection)
+    else:
+        # 3. 内容预检测（提交缩小后的工作图做快速OCR），OCR结果留给随后的识别请求复用
+        start = time.perf_counter()
+        ocr_result = ocr_service.recognize_image_bytes(image_processor.encode_analysis_frame(gray))
+        content_analysis = quick_content_analysis(ocr_result)
+        timings['content'] = round((time.perf_counter() - start) * 1000, 2)
+
+        if analysis_store and ocr_result.get('success'):
+            analysis_id = analysis_store.save(analysis_store.make_image_key(image_bytes), ocr_result,
+                                              analysis_frame_source('analysis_frame', gray))
+
+    content_analysis['ocr_called'] = 'content' in timings
+    content_analysis['text_detection'] = text_detection
+
+    # 4. 生成拍照指导
+    guidance = generate_photo_guidance(light_analysis, quality_analysis, content_analysis)
+
+    analysis = {
+        'lighting': light_analysis,
+        'quality': quality_analysis,
+        'content': content_analysis,
+        'guidance': guidance,
+        'analysis_id': analysis_id
+    }
+
+    if fingerprint is not None:
+        frame_index.record(client_id, fingerprint, 'analysis', analysis)
+
+    return {
+        'success': True,
+        'analysis': analysis,
+        'analysis_id': analysis_id,
+        'frame_reuse': None,
+        'decode': report['decode'],
+        'timings_ms': timings
+    }, 200
+
+
+def run_recognition_pipeline(image_bytes: bytes, client_id: str, analysis_id: str = None,
+                             session_id: str = None, reuse_frames: bool = True, fusion_sources: list = None,
+                             new_shot: bool = True):
+    """
+    内存识别流水线：分析结果复用 -> 指纹查重 -> 预处理 -> OCR -> 多帧融合 -> 信息提取 -> 会话合并 -> 完整性验证
+
+    Args:
+        image_bytes: 上传的原始图片字节
+        client_id: 客户端标识
+        analysis_id: /api/analyze-image返回的分析ID（可选）
+        session_id: 多面拍摄会话ID（可选，为空时新建会话并在响应中返回）
+        reuse_frames: 是否复用近重复帧的OCR结果（连拍补充识别次优帧时关闭）
+        fusion_sources: 同一标签其他帧的OCR结果（可选），会话内最近的OCR结果会自动加入
+        new_shot: 合并到会话时是否算作新的一次拍摄（连拍次优帧与最优帧是同一次拍摄）
+
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    # 0. 拍照分析阶段已对字节完全相同的这张照片做过OCR：直接复用（analysis_id与照片不符时不复用）
+    stored = None
+    if analysis_store:
+        stored = analysis_store.lookup(analysis_id, analysis_store.make_image_key(image_bytes))
+
+    # 近重复帧检测：与该客户端刚识别过的帧几乎相同则复用OCR结果
+    fingerprint = None
+    reused = None
+    if not stored and reuse_frames:
+        fingerprint = get_frame_fingerprint(image_bytes)
+        if fingerprint is not None:
+            reused = frame_index.lookup(client_id, fingerprint, 'ocr')
+
+    processed_bytes = None
+    preprocess_report = {}
+    if stored:
+        logger.info(f"复用拍照分析OCR结果: {stored['analysis_id']}, 匹配方式: {stored['matched_by']}, "
+                    f"来源: {stored['source']}")
+        ocr_result = stored['ocr_result']
+    elif reused:
+        logger.info(f"复用近重复帧OCR结果, 汉明距离: {reused['distance']}")
+        ocr_result = reused['result']
+    else:
+        # 1. 图像预处理（失败时使用原图）
+        processed_bytes = image_processor.preprocess_image_bytes(image_bytes, preprocess_report)
+        logger.info(f"图像预处理完成, 阶段耗时: {preprocess_report.get('timings_ms')}")
+
+        # 2. OCR文字识别（直接提交内存中的图片字节）
+        logger.info("开始OCR识别...")
+        ocr_result = ocr_service.recognize_image_bytes(processed_bytes or image_bytes)
+
+        if not ocr_result.get('success'):
+            logger.error(f"OCR识别失败: {ocr_result.get('error')}，错误码: {ocr_result.get('error_code')}")
+            return {
+                'success': False,
+                'error': ocr_result.get('error', 'OCR识别失败'),
+                'error_code': ocr_result.get('error_code', 'OCR_FAILED'),
+                'voice_guidance': '识别失败，请重试'
+            }, 500
+
+        # OCR只识别了裁剪后的文字区域：文本块位置映射回原始照片（frame_location）
+        if preprocess_report.get('crop'):
+            ocr_result = dict(ocr_result, text_blocks=image_processor.map_blocks_to_frame(
+                ocr_result['text_blocks'], preprocess_report['crop']))
+
+        if fingerprint is not None:
+            frame_index.record(client_id, fingerprint, 'ocr', ocr_result)
+
+    # 3. 多帧融合：与同一标签的其他OCR结果按行对齐后逐字投票（拍的是另一面时不融合）
+    shot_ocr_result = ocr_result
+    if ocr_fusion:
+        sources = list(fusion_sources or [])
+        if capture_sessions:
+            sources += capture_sessions.recent_ocr_results(session_id)
+        if sources:
+            ocr_result = ocr_fusion.fuse(ocr_result, sources)
+
+    # 4. 药品信息提取
+    drug_info = drug_extractor.extract_drug_info(ocr_result)
+
+    # 5. 多面拍摄：本次结果按字段置信度合并到会话，完整性验证和语音播报基于合并后的记录；
+    #    复用的OCR结果（分析阶段、近重复帧、OCR缓存）不是新的观测，不加入融合历史，以免同一次识别重复投票
+    session = None
+    if capture_sessions:
+        fresh_ocr = not stored and not reused and not shot_ocr_result.get('cache_hit')
+        session = capture_sessions.merge(session_id, drug_info, shot_ocr_result if fresh_ocr else None,
+                                         new_shot=new_shot)
+        drug_info = session['drug_info']
+
+    # 6. 验证药品信息完整性
+    validation_result = validate_drug_info(drug_info)
+    voice_guidance = generate_voice_guidance(drug_info, validation_result)
+    if session and session['conflict']:
+        # 药名与本次会话之前拍到的不一致：不播报可能混杂两盒药的信息，提示用户确认
+        voice_guidance = '药品名称与之前拍摄的不一致，如已更换药品请结束本次拍摄后重新开始，否则请对准药品名称重新拍照'
+
+    # 7. 构建响应
+    response_data = {
+        'success': True,
+        'drug_info': drug_info,
+        'ocr_confidence': ocr_result.get('words_result_num', 0),
+        'processing_time': datetime.now().isoformat(),
+        'image_processed': processed_bytes is not None,
+        'preprocessing': preprocess_report or None,
+        'validation': validation_result,
+        'voice_guidance': voice_guidance,
+        'raw_ocr_result': ocr_result.get('raw_result'),  # 新增：返回OCR原始结果
+        'ocr_cache_hit': ocr_result.get('cache_hit', False),
+        'ocr_fusion': ocr_result.get('fusion'),
+        'frame_reuse': {'distance': reused['distance'], 'age': reused['age']} if reused else None,
+        'analysis_reuse': {
+            'analysis_id': stored['analysis_id'],
+            'matched_by': stored['matched_by'],
+            'source': stored['source'],
+            'age': stored['age']
+        } if stored else None,
+        'session': {
+            'session_id': session['session_id'],
+            'shots': session['shots'],
+            'updated_fields': session['updated_fields'],
+            'field_sources': session['field_sources'],
+            'restarted': session['restarted'],
+            'conflict': session['conflict']
+        } if session else None
+    }
+
+    logger.info(f"药品识别成功: {drug_info.get('drug_name', '未知药品')}")
+    return response_data, 200
 
-        # 转换为灰度图
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-        # 计算平均亮度
-        mean_brightness = np.mean(gray)
+def run_burst_pipeline(frames: list, client_id: str, session_id: str = None, try_runner_up: bool = True):
+    """
+    连拍识别流水线：评分选帧 -> 最优帧识别 -> （结果不完整时）次优帧识别
+
+    Args:
+        frames: 各帧原始图片字节（读取失败的为None）
+        client_id: 客户端标识
+        session_id: 多面拍摄会话ID（可选）
+        try_runner_up: 最优帧结果不完整时是否识别次优帧
 
-        # 计算亮度标准差（对比度）
-        brightness_std = np.std(gray)
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    ranking = burst_selector.rank([frame or b'' for frame in frames])
+    if not ranking['order']:
+        return {
+            'success': False,
+            'error': '连拍图片均无法解码',
+            'error_code': 'DECODE_FAILED',
+            'voice_guidance': '拍照失败，请重试'
+        }, 400
+
+    best = ranking['order'][0]
+    logger.info(f"连拍选帧完成: {len(frames)}帧, 最优帧{best}, 耗时{ranking['elapsed_ms']}ms")
+    response_data, status_code = run_recognition_pipeline(frames[best], client_id, None, session_id)
+    selected = [best]
+
+    # 最优帧信息不完整时补充识别次优帧，两帧OCR结果融合；会话开启时融合来源和提取结果都取自会话
+    runner_up = burst_selector.runner_up(ranking) if try_runner_up else None
+    if status_code == 200 and not response_data['validation']['is_complete'] and runner_up is not None:
+        fusion_sources = None
+        if response_data.get('session'):
+            session_id = response_data['session']['session_id']
+        elif response_data.get('raw_ocr_result'):
+            fusion_sources = [{'success': True, 'text_blocks': response_data['raw_ocr_result']['words_result']}]
+        second_data, second_status = run_recognition_pipeline(frames[runner_up], client_id, None, session_id,
+                                                              reuse_frames=False, fusion_sources=fusion_sources,
+                                                              new_shot=False)
+        selected.append(runner_up)
+        if (second_status == 200 and second_data['validation']['completeness_score'] >
+                response_data['validation']['completeness_score']):
+            response_data = second_data
+
+    response_data['burst'] = {
+        'frames': len(frames),
+        'selected': selected,
+        'ocr_frames': len(selected),
+        'scores': ranking['frames'],
+        'scoring_ms': ranking['elapsed_ms']
+    }
+    return response_data, status_code
+
+
+def analyze_lighting(mean_brightness: float, brightness_std: float) -> dict:
+    """
+    分析图像光线条件
+
+    Args:
+        mean_brightness: 平均亮度
+        brightness_std: 亮度标准差（对比度）
 
+    Returns:
+        dict: 光线分析结果
+    """
+    try:
         # 判断光线条件
         if mean_brightness < 80:
             light_condition = 'dark'
@@ -376,37 +908,28 @@ def analyze_lighting(image_path: str) -> dict:
         return {'status': 'error', 'message': f'光线分析失败: {str(e)}'}
 
 
-def analyze_image_quality(image_path: str) -> dict:
+def analyze_image_quality(laplacian_var: float, total_pixels: int) -> dict:
     """
     分析图像质量
 
+    清晰度在最长边不超过ANALYSIS_MAX_SIDE的工作图上测量。INTER_AREA缩小会把原图中几个像素宽的
+    模糊压到一个像素以内，拉普拉斯方差随之成倍增大，原先按全分辨率标定的100/200在工作图上几乎都会判为清晰；
+    SHARPNESS_BLURRY/SHARPNESS_FAIR按1024工作图重新标定（约对应工作图上1.5/1像素的高斯模糊），
+    调整ANALYSIS_MAX_SIDE时需要同步调整。
+
     Args:
-        image_path: 图片路径
+        laplacian_var: 工作图的拉普拉斯方差（清晰度）
+        total_pixels: 原图像素数
 
     Returns:
         dict: 图像质量分析结果
     """
     try:
-        # 读取图片
-        img = cv2.imread(image_path)
-        if img is None:
-            return {'status': 'error', 'message': '无法读取图片'}
-
-        # 转换为灰度图
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-        # 计算拉普拉斯方差（清晰度）
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-
-        # 计算图像尺寸
-        height, width = gray.shape
-        total_pixels = height * width
-
         # 判断图像质量
-        if laplacian_var < 100:
+        if laplacian_var < config.SHARPNESS_BLURRY:
             quality = 'blurry'
             message = '图像模糊，请保持稳定重新拍照'
-        elif laplacian_var < 200:
+        elif laplacian_var < config.SHARPNESS_FAIR:
             quality = 'fair'
             message = '图像质量一般，建议重新拍照'
         elif total_pixels < 100000:  # 小于100万像素
@@ -429,20 +952,17 @@ def analyze_image_quality(image_path: str) -> dict:
         return {'status': 'error', 'message': f'图像质量分析失败: {str(e)}'}
 
 
-def quick_content_analysis(image_path: str) -> dict:
+def quick_content_analysis(ocr_result: dict) -> dict:
     """
     快速内容分析 - 检测是否包含药品信息
 
     Args:
-        image_path: 图片路径
+        ocr_result: 工作图的快速OCR结果
 
     Returns:
         dict: 内容分析结果
     """
     try:
-        # 使用快速OCR进行内容检测
-        ocr_result = ocr_service.recognize_text(image_path, force_call=True)  # 强制调用OCR
-        
         if not ocr_result.get('success'):
             return {
                 'status': 'error',
@@ -454,18 +974,11 @@ def quick_content_analysis(image_path: str) -> dict:
         text_blocks = ocr_result.get('text_blocks', [])
         full_text = ' '.join([block['words'] for block in text_blocks])
         
-        # 检测药品关键词
-        drug_keywords = ['片', '胶囊', '颗粒', '丸', '口服液', '注射液', '用法', '用量', '有效期', '生产日期']
-        found_keywords = [keyword for keyword in drug_keywords if keyword in full_text]
-        
-        # 检测关键信息
-        has_drug_name = any(keyword in full_text for keyword in ['片', '胶囊', '颗粒', '丸', '口服液', '注射液'])
-        has_usage = any(keyword in full_text for keyword in ['用法', '服用', '口服', '外用'])
-        has_dosage = any(keyword in full_text for keyword in ['用量', '剂量', '一次', '一日'])
-        has_expiry = any(keyword in full_text for keyword in ['有效期', '失效期', '生产日期'])
+        # 检测药品关键词（与信息提取共用关键词自动机，一遍扫描）
+        keywords = drug_extractor.detect_content_keywords(full_text)
         
         # 判断是否包含药品信息
-        has_drug_info = has_drug_name and (has_usage or has_dosage)
+        has_drug_info = keywords['has_drug_name'] and (keywords['has_usage'] or keywords['has_dosage'])
         
         if has_drug_info:
             message = '检测到药品信息，开始识别，保持不动'
@@ -475,11 +988,11 @@ def quick_content_analysis(image_path: str) -> dict:
         return {
             'status': 'success',
             'has_drug_info': has_drug_info,
-            'found_keywords': found_keywords,
-            'has_drug_name': has_drug_name,
-            'has_usage': has_usage,
-            'has_dosage': has_dosage,
-            'has_expiry': has_expiry,
+            'found_keywords': keywords['found_keywords'],
+            'has_drug_name': keywords['has_drug_name'],
+            'has_usage': keywords['has_usage'],
+            'has_dosage': keywords['has_dosage'],
+            'has_expiry': keywords['has_expiry'],
             'message': message,
             'text_length': len(full_text)
         }
@@ -493,6 +1006,34 @@ def quick_content_analysis(image_path: str) -> dict:
         }
 
 
+def gated_content_analysis(text_detection: dict) -> dict:
+    """
+    本地文字检测未通过时的内容分析结果（不调用OCR）
+
+    Args:
+        text_detection: 文字检测结果
+
+    Returns:
+        dict: 与quick_content_analysis结构一致的内容分析结果
+    """
+    if text_detection['has_text']:
+        message = '文字太小，请靠近药品标签拍照'
+    else:
+        message = '未检测到文字，请对准药品标签重新拍照'
+
+    return {
+        'status': 'success',
+        'has_drug_info': False,
+        'found_keywords': [],
+        'has_drug_name': False,
+        'has_usage': False,
+        'has_dosage': False,
+        'has_expiry': False,
+        'message': message,
+        'text_length': 0
+    }
+
+
 def validate_drug_info(drug_info: dict) -> dict:
     """
     验证药品信息完整性
@@ -0,0 +1,255 @@
+"""
+流式拍照分析接口
+自动拍摄时客户端通过WebSocket持续推送预览帧，服务端逐帧返回光线、清晰度和文字检测指导，
+连接内保存上一帧、平滑后的指标和最近一次OCR结果
+"""
+
+import json
+import time
+import uuid
+from typing import Dict, Optional
+
+from api.routes import (
+    api_bp, config, image_processor, ocr_service, text_detector, analysis_store,
+    analyze_lighting, analyze_image_quality, quick_content_analysis,
+    gated_content_analysis, generate_photo_guidance, analysis_frame_source
+)
+from services.frame_index import hamming_distance
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# flask-sock为可选依赖，未安装时不注册流式接口，轮询/api/analyze-image仍可使用
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+sock = Sock() if Sock and config.STREAM_ENABLED else None
+
+
+class StreamSession:
+    """
+    单个WebSocket连接的分析状态
+
+    光线和清晰度指标做指数平滑，避免单帧抖动导致语音指导来回切换；
+    画面与上次OCR的帧相近且未超过OCR间隔时复用上次的内容分析结果。
+    """
+
+    def __init__(self, stream_config: Dict):
+        """
+        初始化连接状态
+
+        Args:
+            stream_config: 流式分析配置，包含smoothing, ocr_interval, ocr_change_threshold
+        """
+        self.config = stream_config
+        self.session_id = uuid.uuid4().hex
+        self.smoothed = None
+        self.last_fingerprint = None
+        self.last_ocr_fingerprint = None
+        self.last_ocr_time = 0.0
+        self.last_content = None
+        self.last_action = None
+        self.analysis_id = None
+
+        self.frames_received = 0
+        self.frames_analyzed = 0
+        self.frames_dropped = 0
+        self.ocr_calls = 0
+
+    def smooth(self, metrics: Dict) -> Dict:
+        """
+        对亮度、对比度、清晰度做指数平滑
+
+        Args:
+            metrics: 当前帧指标
+
+        Returns:
+            Dict: 平滑后的指标
+        """
+        alpha = self.config['smoothing']
+        if self.smoothed is None:
+            self.smoothed = dict(metrics)
+        else:
+            for key, value in metrics.items():
+                self.smoothed[key] = alpha * value + (1 - alpha) * self.smoothed[key]
+        return {key: round(value, 2) for key, value in self.smoothed.items()}
+
+    def need_ocr(self, fingerprint: int) -> bool:
+        """
+        判断当前帧是否需要重新OCR
+
+        Args:
+            fingerprint: 当前帧指纹
+
+        Returns:
+            bool: 尚无OCR结果、画面明显变化且距上次OCR超过间隔时返回True
+        """
+        if self.last_content is None or self.last_ocr_fingerprint is None:
+            return True
+        if time.monotonic() - self.last_ocr_time < self.config['ocr_interval']:
+            return False
+        return hamming_distance(fingerprint, self.last_ocr_fingerprint) > self.config['ocr_change_threshold']
+
+    def get_stats(self) -> Dict:
+        """连接统计"""
+        return {
+            'frames_received': self.frames_received,
+            'frames_analyzed': self.frames_analyzed,
+            'frames_dropped': self.frames_dropped,
+            'ocr_calls': self.ocr_calls
+        }
+
+
+def parse_frame(message) -> Optional[bytes]:
+    """
+    解析客户端消息中的图片数据
+
+    二进制消息直接视为JPEG/PNG字节；文本消息为JSON：{"type": "frame", "image": "base64..."}
+
+    Args:
+        message: WebSocket消息
+
+    Returns:
+        bytes: 图片字节，非图片消息返回None
+    """
+    if isinstance(message, (bytes, bytearray)):
+        return bytes(message)
+
+    try:
+        data = json.loads(message)
+    except (TypeError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get('type') != 'frame' or not data.get('image'):
+        return None
+    return image_processor.decode_base64_image(data['image'])
+
+
+def analyze_stream_frame(session: StreamSession, image_bytes: bytes) -> Dict:
+    """
+    分析一帧预览图
+
+    Args:
+        session: 连接状态
+        image_bytes: 预览帧字节
+
+    Returns:
+        Dict: 推送给客户端的分析消息
+    """
+    report = {}
+    gray = image_processor.build_analysis_frame(image_bytes, report)
+    if gray is None:
+        return {'type': 'error', 'error': '无法解码图片', 'error_code': 'DECODE_FAILED'}
+    timings = report['timings_ms']
+
+    fingerprint = image_processor.compute_dhash(gray)
+    frame_distance = (hamming_distance(fingerprint, session.last_fingerprint)
+                      if session.last_fingerprint is not None else None)
+    session.last_fingerprint = fingerprint
+
+    # 1. 光线与清晰度按平滑后的指标判断
+    smoothed = session.smooth(image_processor.measure_analysis_metrics(gray, timings))
+    source_width, source_height = report['decode']['source_size']
+    light_analysis = analyze_lighting(smoothed['brightness'], smoothed['contrast'])
+    quality_analysis = analyze_image_quality(smoothed['sharpness'], source_width * source_height)
+
+    # 2. 本地文字检测，每帧都做
+    text_detection = text_detector.detect(gray) if text_detector else None
+    if text_detection:
+        timings['text_detection'] = text_detection['elapsed_ms']
+
+    # 3. 内容预检：文字足够大且画面有变化时才调用OCR，否则沿用本连接上次的结果
+    ocr_called = False
+    if text_detection and not text_detection['text_large_enough']:
+        content_analysis = gated_content_analysis(text_detection)
+    elif session.need_ocr(fingerprint):
+        start = time.perf_counter()
+        ocr_result = ocr_service.recognize_image_bytes(image_processor.encode_analysis_frame(gray))
+        content_analysis = quick_content_analysis(ocr_result)
+        timings['content'] = round((time.perf_counter() - start) * 1000, 2)
+
+        ocr_called = True
+        session.ocr_calls += 1
+        session.last_ocr_time = time.monotonic()
+        session.last_ocr_fingerprint = fingerprint
+        session.last_content = content_analysis
+        if analysis_store and ocr_result.get('success'):
+            session.analysis_id = analysis_store.save(analysis_store.make_image_key(image_bytes), ocr_result,
+                                                      analysis_frame_source('stream_preview', gray))
+    else:
+        content_analysis = dict(session.last_content)
+
+    content_analysis['ocr_called'] = ocr_called
+    content_analysis['text_detection'] = text_detection
+
+    guidance = generate_photo_guidance(light_analysis, quality_analysis, content_analysis)
+    changed = guidance['action'] != session.last_action
+    session.last_action = guidance['action']
+
+    return {
+        'type': 'analysis',
+        'analysis': {
+            'lighting': light_analysis,
+            'quality': quality_analysis,
+            'content': content_analysis,
+            'guidance': guidance
+        },
+        'guidance_changed': changed,
+        'smoothed_metrics': smoothed,
+        'frame_distance': frame_distance,
+        'analysis_id': session.analysis_id,
+        'timings_ms': timings
+    }
+
+
+if sock:
+    @sock.route('/stream', bp=api_bp)
+    def analysis_stream(ws):
+        """
+        流式拍照分析（WebSocket /api/stream）
+
+        客户端推送预览帧（二进制JPEG或JSON base64）；服务端每分析完一帧推送一条JSON。
+        分析期间积压的旧帧直接丢弃，只分析最新一帧。
+        """
+        session = StreamSession(config.stream_config)
+        logger.info(f"流式分析连接建立: {session.session_id}")
+        ws.send(json.dumps({'type': 'ready', 'session_id': session.session_id}, ensure_ascii=False))
+
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    continue
+                session.frames_received += 1
+
+                # 丢弃分析期间积压的旧帧，只保留最新一帧
+                while True:
+                    newer = ws.receive(timeout=0)
+                    if newer is None:
+                        break
+                    session.frames_received += 1
+                    session.frames_dropped += 1
+                    message = newer
+
+                image_bytes = parse_frame(message)
+                if not image_bytes:
+                    ws.send(json.dumps({
+                        'type': 'error',
+                        'error': '无效的帧数据',
+                        'error_code': 'INVALID_FRAME'
+                    }, ensure_ascii=False))
+                    continue
+
+                try:
+                    result = analyze_stream_frame(session, image_bytes)
+                except Exception as e:
+                    logger.error(f"流式帧分析失败: {str(e)}")
+                    result = {'type': 'error', 'error': f'帧分析失败: {str(e)}', 'error_code': 'ANALYSIS_ERROR'}
+
+                session.frames_analyzed += 1
+                result['stats'] = session.get_stats()
+                ws.send(json.dumps(result, ensure_ascii=False))
+        finally:
+            logger.info(f"流式分析连接关闭: {session.session_id}, 统计: {session.get_stats()}")
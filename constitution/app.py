@@ -35,10 +35,6 @@ except ImportError:
 
     config = DefaultConfig()
 
-# 导入服务
-from services.ocr_service import BaiduOCRService
-from services.drug_extractor import DrugInfoExtractor
-from services.image_processor import ImageProcessor
 from utils.logger import setup_logger
 
 # 初始化Flask应用
@@ -52,14 +48,20 @@ app.config['UPLOAD_FOLDER'] = 'tmp'
 # 设置日志
 logger = setup_logger('app', 'INFO')
 
-# 初始化服务
-ocr_service = BaiduOCRService(config.baidu_ocr_config)
-drug_extractor = DrugInfoExtractor()
-image_processor = ImageProcessor()
+# 注册API路由（OCR等服务实例由api.routes统一创建，每个进程只有一份）
+from api.routes import api_bp, config as api_config
+# 流式分析路由挂在api_bp上，必须在注册蓝图之前导入
+from api.stream import sock
 
+if sock:
+    app.config['SOCK_SERVER_OPTIONS'] = {
+        'max_message_size': api_config.STREAM_MAX_FRAME_BYTES,
+        'ping_interval': 25
+    }
+    sock.init_app(app)
+else:
+    logger.warning("未安装flask-sock或已关闭流式分析，/api/stream不可用")
 
-# 注册API路由
-from api.routes import api_bp
 app.register_blueprint(api_bp)
 
 
@@ -0,0 +1,429 @@
+"""
+药品信息提取基准测试
+对比逐字段多次正则扫描的原始实现与单遍规则引擎（不分段/按【】分段），并校验不分段时输出一致
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_drug_extractor.py [--prose 60] [--rounds 20]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.drug_extractor import DrugInfoExtractor  # noqa: E402
+
+
+class LegacyDrugInfoExtractor(DrugInfoExtractor):
+    """原始实现：每个字段逐条正则在全文上search/findall，药品名称每次调用重新编译后缀正则"""
+
+    # 原始实现之后新增的字段（如批准文号）不参与一致性比较
+    FIELDS = ('drug_name', 'usage', 'dosage', 'side_effects', 'contraindications', 'allergens',
+              'storage', 'manufacturer', 'expiry_date', 'batch_number')
+
+    @classmethod
+    def comparable(cls, fields: dict) -> dict:
+        """规则引擎输出中原始实现也提取的字段"""
+        return {field: fields[field] for field in cls.FIELDS}
+
+    def extract_fields(self, text: str) -> dict:
+        return {
+            'drug_name': self._extract_drug_name(text),
+            'usage': self._extract_usage(text),
+            'dosage': self._extract_dosage(text),
+            'side_effects': self._extract_side_effects(text),
+            'contraindications': self._extract_contraindications(text),
+            'allergens': self._extract_allergens(text),
+            'storage': self._extract_storage(text),
+            'manufacturer': self._extract_manufacturer(text),
+            'expiry_date': self._extract_expiry_date(text),
+            'batch_number': self._extract_batch_number(text)
+        }
+
+    def _extract_drug_name(self, text: str) -> str:
+        """
+        提取药品名称
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 药品名称
+        """
+        # 方法1: 查找药品名称常见后缀
+        for suffix in self.drug_keywords['drug_names']:
+            pattern = r'([\u4e00-\u9fa5a-zA-Z0-9]+' + re.escape(suffix) + ')'
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        # 方法2: 查找"通用名称"、"商品名称"等关键词
+        name_patterns = [
+            r'通用名称[：:]?\s*([^\s，。]+)',
+            r'商品名称[：:]?\s*([^\s，。]+)',
+            r'药品名称[：:]?\s*([^\s，。]+)',
+            r'【([^】]*)】',
+            r'品名[：:]?\s*([^\s，。]+)',
+            r'名称[：:]?\s*([^\s，。]+)'
+        ]
+
+        for pattern in name_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        # 方法3: 查找第一个可能的中文药品名
+        chinese_pattern = r'([\u4e00-\u9fa5]{2,8}(?:片|胶囊|颗粒|丸|口服液|注射液|软膏|滴眼液))'
+        match = re.search(chinese_pattern, text)
+        if match:
+            return match.group(1)
+
+        return "未知药品"
+
+    def _extract_usage(self, text: str) -> str:
+        """
+        提取用法
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 用法信息
+        """
+        usage_patterns = [
+            r'用法[：:]?\s*([^。]+?)(?=用量|$|。)',
+            r'服用方法[：:]?\s*([^。]+)',
+            r'给药途径[：:]?\s*([^。]+)',
+            r'(口服|外用|静脉注射|肌肉注射|皮下注射|舌下含服|直肠给药|阴道给药|滴眼|滴耳|滴鼻|吸入)'
+        ]
+
+        results = []
+        for pattern in usage_patterns:
+            matches = re.findall(pattern, text)
+            if matches:
+                results.extend(matches)
+
+        return '；'.join(results) if results else ""
+
+    def _extract_dosage(self, text: str) -> str:
+        """
+        提取用量
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 用量信息
+        """
+        dosage_patterns = [
+            r'用量[：:]?\s*([^。]+)',
+            r'剂量[：:]?\s*([^。]+)',
+            r'一次\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[片粒支mg毫升g])',
+            r'一日\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[次回])',
+            r'每次\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[片粒支mg毫升g])',
+            r'每日\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[次回])'
+        ]
+
+        results = []
+        for pattern in dosage_patterns:
+            matches = re.findall(pattern, text)
+            if matches:
+                results.extend(matches)
+
+        return '；'.join(results) if results else ""
+
+    def _extract_side_effects(self, text: str) -> str:
+        """
+        提取不良反应
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 不良反应信息
+        """
+        side_effect_patterns = [
+            r'不良反应[：:]?\s*([^。]+?)(?=禁忌|注意事项|$)',
+            r'副作用[：:]?\s*([^。]+)',
+            r'常见不良反应[：:]?\s*([^。]+)',
+            r'可能引起[：:]?\s*([^。]+)'
+        ]
+
+        for pattern in side_effect_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_contraindications(self, text: str) -> str:
+        """
+        提取禁忌
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 禁忌信息
+        """
+        contraindication_patterns = [
+            r'禁忌[：:]?\s*([^。]+?)(?=注意事项|$)',
+            r'禁用[：:]?\s*([^。]+)',
+            r'禁忌症[：:]?\s*([^。]+)',
+            r'不宜[：:]?\s*([^。]+)',
+            r'慎用[：:]?\s*([^。]+)'
+        ]
+
+        for pattern in contraindication_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_allergens(self, text: str) -> str:
+        """
+        提取过敏源
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 过敏源信息
+        """
+        allergen_patterns = [
+            r'过敏[：:]?\s*([^。]+)',
+            r'过敏者[^。]+',
+            r'对本品过敏者[^。]+',
+            r'过敏体质[^。]+'
+        ]
+
+        for pattern in allergen_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_storage(self, text: str) -> str:
+        """
+        提取贮藏信息
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 贮藏信息
+        """
+        storage_patterns = [
+            r'贮藏[：:]?\s*([^。]+)',
+            r'保存[：:]?\s*([^。]+)',
+            r'储存[：:]?\s*([^。]+)',
+            r'存放[：:]?\s*([^。]+)'
+        ]
+
+        for pattern in storage_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_manufacturer(self, text: str) -> str:
+        """
+        提取生产厂家信息
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 生产厂家信息
+        """
+        manufacturer_patterns = [
+            r'生产厂家[：:]?\s*([^。]+)',
+            r'生产企业[：:]?\s*([^。]+)',
+            r'制造商[：:]?\s*([^。]+)',
+            r'([^。]*(?:有限公司|股份有限公司|制药厂|制药有限公司)[^。]*)'
+        ]
+
+        for pattern in manufacturer_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_expiry_date(self, text: str) -> str:
+        """
+        提取有效期信息
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 有效期信息
+        """
+        expiry_patterns = [
+            r'有效期[：:]?\s*([^。]+)',
+            r'失效期[：:]?\s*([^。]+)',
+            r'有效期至[：:]?\s*([^。]+)',
+            r'失效日期[：:]?\s*([^。]+)'
+        ]
+
+        for pattern in expiry_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+    def _extract_batch_number(self, text: str) -> str:
+        """
+        提取批号信息
+        
+        Args:
+            text: 完整文本
+            
+        Returns:
+            str: 批号信息
+        """
+        batch_patterns = [
+            r'批号[：:]?\s*([^。]+)',
+            r'生产批号[：:]?\s*([^。]+)',
+            r'产品批号[：:]?\s*([^。]+)'
+        ]
+
+        for pattern in batch_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return match.group(1)
+
+        return ""
+
+
+SECTIONS = [
+    '【药品名称】通用名称：阿莫西林胶囊 商品名称：阿莫仙 英文名称：Amoxicillin Capsules',
+    '【成份】本品主要成份为阿莫西林，辅料为淀粉、硬脂酸镁',
+    '【性状】本品内容物为白色或类白色粉末',
+    '【适应症】适用于敏感菌所致的呼吸道感染、泌尿生殖道感染',
+    '【规格】0.25g',
+    '【用法用量】口服。成人一次0.5g，每6～8小时1次，一日剂量不超过4g',
+    '【不良反应】常见不良反应为恶心、呕吐、腹泻及假膜性肠炎等胃肠道反应',
+    '【禁忌】青霉素过敏及青霉素皮肤试验阳性患者禁用',
+    '【注意事项】用药前必须详细询问药物过敏史并进行青霉素皮肤试验',
+    '【孕妇及哺乳期妇女用药】孕妇及哺乳期妇女慎用',
+    '【药物相互作用】丙磺舒竞争性地减少本品的肾小管分泌',
+    '【药理毒理】',
+    '【药代动力学】',
+    '【贮藏】遮光，密封保存',
+    '【有效期】24个月',
+    '【批准文号】国药准字H44021351',
+    '【生产企业】企业名称：某某制药有限公司 生产地址：某省某市'
+]
+
+# 说明书正文（药理、药代动力学等长段落）中的常见短语
+PROSE = [
+    '本品为青霉素类抗生素', '对肺炎链球菌、溶血性链球菌等需氧革兰阳性球菌具有良好的抗菌活性',
+    '通过抑制细菌细胞壁合成而发挥杀菌作用', '临床研究表明', '血药浓度达峰时间为1至2小时',
+    '主要经肾脏排泄', '血消除半衰期约为1小时', '在体内分布广泛', '可透过胎盘',
+    '与血浆蛋白结合率约为20%', '动物实验结果显示', '大鼠经口给予本品后', '未见明显异常',
+    '肝功能减退者应根据情况调整', '老年患者的肾功能常有减退', '尚不明确', '请遵医嘱'
+]
+
+
+def make_insert(rng: random.Random, prose_sentences: int) -> str:
+    """按说明书结构拼接各段，药理、药代动力学等段落填充长正文，模拟长说明书的OCR文本"""
+    parts = []
+    for section in SECTIONS:
+        body = section
+        if section.endswith('】'):
+            body += '，'.join(rng.choice(PROSE) for _ in range(prose_sentences))
+        parts.append(body + '。')
+    return ' '.join(parts)
+
+
+def make_dense_text(rng: random.Random, sections: int) -> str:
+    """随机重复的说明书段落，字段关键词密集，用于一致性校验"""
+    parts = [rng.choice(SECTIONS + EXTRA_SECTIONS) for _ in range(sections)]
+    return ' '.join(part + rng.choice(['。', '', ' ']) for part in parts)
+
+
+EXTRA_SECTIONS = [
+    '用法：口服 用量：一次2片，一日3次',
+    '每次1～2粒，每日2次，饭后服用',
+    '偶见皮疹、药物热和哮喘等过敏反应',
+    '孕妇及哺乳期妇女慎用，不宜与避孕药同服',
+    '有效期至2027年05月 生产批号：230512',
+    '外用，滴眼，一次1～2滴，一日3～4次',
+    '给药途径：静脉注射或肌肉注射',
+    '副作用：可能引起头晕、乏力',
+    '失效日期2026-12 产品批号A2301',
+    '对本品过敏者禁用，过敏体质者慎用',
+    '布洛芬缓释胶囊 复方甘草片 板蓝根颗粒'
+]
+
+
+def make_fragment_text(rng: random.Random) -> str:
+    """由触发词与随机字符组成的短文本，覆盖触发词重叠、相邻等边界情况"""
+    pieces = ['用法', '用量', '法用', '口服', '服用方法', '不良反应', '常见不良反应', '禁忌', '禁忌症',
+              '过敏', '过敏者', '有效期', '有效期至', '批号', '生产批号', '制药有限公司', '有限公司',
+              '片', '胶囊', '颗粒', '【', '】', '名称', '品名', '一次', '2片', '一日', '3次', '。', '：',
+              ' ', 'A', '药', '1']
+    return ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 40)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='药品信息提取基准测试')
+    parser.add_argument('--prose', type=int, default=60, help='每个长段落的正文句数')
+    parser.add_argument('--texts', type=int, default=50, help='说明书份数')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [make_insert(rng, args.prose) for _ in range(args.texts)]
+
+    extractor = DrugInfoExtractor()
+    legacy = LegacyDrugInfoExtractor()
+
+    # 不分段时规则引擎与原始实现逐字段一致
+    checks = (texts + [make_dense_text(rng, 40) for _ in range(200)] +
+              [make_fragment_text(rng) for _ in range(5000)])
+    for text in checks:
+        assert legacy.extract_fields(text) == legacy.comparable(extractor._extract_fields(text)), \
+            f'两种实现输出不一致: {text}'
+
+    def sectioned(text):
+        sections = extractor.segmenter.segment(text)
+        return extractor._extract_fields(text, extractor.segmenter.field_spans(text, sections))
+
+    funcs = (('legacy', legacy.extract_fields), ('engine', extractor._extract_fields), ('sections', sectioned))
+
+    average_chars = sum(len(text) for text in texts) / len(texts)
+    print(f"说明书: {len(texts)}份, 平均{average_chars:.0f}字, 轮数: {args.rounds}, 一致性校验: {len(checks)}条")
+    for name, func in funcs:
+        latency = measure(func, texts, args.rounds)
+        print(f"{name:>8}: {latency:8.3f} ms/份, {1000 / latency:9.1f} 份/秒")
+
+    # 最坏情况：触发词反复出现且没有句号和结束词，原始实现的惰性匹配在每个触发词处扫描到文本结尾
+    print('最坏情况（无句号的长文本）:')
+    for repeats in (250, 500, 1000):
+        text = '不良反应偶见头晕' * repeats
+        timings = '  '.join(f"{name} {measure(func, [text], 3):8.2f} ms" for name, func in funcs)
+        print(f"  {len(text):>6}字: {timings}")
+
+
+def measure(func, texts: list, rounds: int) -> float:
+    """平均每份文本的耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - start) * 1000 / (rounds * len(texts))
+
+
+if __name__ == '__main__':
+    main()
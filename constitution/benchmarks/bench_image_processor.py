@@ -0,0 +1,170 @@
+"""
+图像预处理基准测试
+对比逐阶段分配的原始流水线与复用工作区（CLAHE+缓冲区）的流水线
+
+单线程测量之外，并发测量模拟Flask threaded=True：每个请求在新建的线程中处理，
+并发数由--concurrency指定，每帧尺寸随机抖动（模拟文字区域裁剪后尺寸各不相同）。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_image_processor.py [--size 3000x4000] [--rounds 20] [--concurrency 4]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.image_processor import ImageProcessor  # noqa: E402
+
+
+def legacy_preprocess(img: np.ndarray, config: dict) -> np.ndarray:
+    """原始实现：每次新建CLAHE和锐化核，每个阶段分配新数组"""
+    height, width = img.shape[:2]
+    if width > config['max_width'] or height > config['max_height']:
+        scale = min(config['max_width'] / width, config['max_height'] / height)
+        img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=config['clahe_clip_limit'], tileGridSize=config['clahe_tile_size'])
+    enhanced = clahe.apply(gray)
+    denoised = cv2.medianBlur(enhanced, 3)
+    kernel = np.array([[-1, -1, -1],
+                       [-1,  9, -1],
+                       [-1, -1, -1]])
+    sharpened = cv2.filter2D(denoised, -1, kernel)
+    return np.clip(sharpened, 0, 255).astype(np.uint8)
+
+
+def make_test_image(height: int, width: int) -> np.ndarray:
+    """生成带文字的合成测试图像"""
+    rng = np.random.default_rng(0)
+    img = np.full((height, width, 3), 200, dtype=np.uint8)
+    for row in range(40, height - 40, max(height // 30, 20)):
+        cv2.putText(img, 'Amoxicillin 0.25g x 24', (40, row), cv2.FONT_HERSHEY_SIMPLEX,
+                    height / 1500, (30, 30, 30), 2)
+    noise = rng.integers(-12, 12, img.shape, dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def measure(func, img: np.ndarray, rounds: int) -> dict:
+    """测量平均耗时和每次调用的内存分配峰值"""
+    func(img)  # 预热（创建工作区和缓冲区）
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(img)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / rounds
+
+    tracemalloc.start()
+    func(img)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'latency_ms': elapsed_ms, 'peak_alloc_mb': peak / 1024 / 1024}
+
+
+def measure_concurrent(func, frames: list, concurrency: int) -> dict:
+    """
+    每个请求一个新线程、最多concurrency个同时运行，测量吞吐和平均延迟
+
+    Args:
+        func: 处理函数
+        frames: 各请求的输入帧
+        concurrency: 同时运行的请求数
+
+    Returns:
+        dict: {'throughput', 'latency_ms'}
+    """
+    slots = threading.Semaphore(concurrency)
+    latencies = []
+    lock = threading.Lock()
+
+    def handle(frame):
+        try:
+            start = time.perf_counter()
+            func(frame)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+        finally:
+            slots.release()
+
+    threads = []
+    start = time.perf_counter()
+    for frame in frames:
+        slots.acquire()
+        thread = threading.Thread(target=handle, args=(frame,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {'throughput': len(frames) / elapsed, 'latency_ms': sum(latencies) / len(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图像预处理基准测试')
+    parser.add_argument('--size', default='3000x4000', help='测试图像尺寸，高x宽')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4, help='并发测量时同时处理的请求数')
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split('x'))
+    img = make_test_image(height, width)
+
+    processor = ImageProcessor({'upload_folder': os.path.join('tmp', 'bench')})
+    out = np.empty(0, dtype=np.uint8)
+
+    def pooled(frame):
+        nonlocal out
+        out = processor.preprocess_array(frame, out=out)
+        return out
+
+    def pooled_request(frame):
+        # 与/api/recognize相同：结果写入工作区输出缓冲区，with块内消费
+        with processor._preprocessed(frame) as processed:
+            return int(processed[0, 0])
+
+    legacy_result = legacy_preprocess(img, processor.config)
+    pooled_result = pooled(img)
+    assert np.array_equal(legacy_result, pooled_result), '两种实现输出不一致'
+
+    results = {
+        'legacy': measure(lambda frame: legacy_preprocess(frame, processor.config), img, args.rounds),
+        'pooled': measure(pooled, img, args.rounds)
+    }
+
+    print(f"图像尺寸: {width}x{height}, 轮数: {args.rounds}")
+    for name, result in results.items():
+        print(f"{name:>8}: {result['latency_ms']:8.2f} ms/张, 内存分配峰值 {result['peak_alloc_mb']:7.2f} MB")
+
+    # 并发：每个请求一个新线程，帧尺寸各不相同
+    rng = np.random.default_rng(1)
+    frames = []
+    for _ in range(args.rounds * args.concurrency):
+        crop_height = int(height * rng.uniform(0.6, 1.0))
+        crop_width = int(width * rng.uniform(0.6, 1.0))
+        frames.append(np.ascontiguousarray(img[:crop_height, :crop_width]))
+
+    concurrent = {
+        'legacy': measure_concurrent(lambda frame: legacy_preprocess(frame, processor.config), frames,
+                                     args.concurrency),
+        'pooled': measure_concurrent(pooled_request, frames, args.concurrency)
+    }
+
+    print(f"\n并发: 每请求一个新线程, 并发数 {args.concurrency}, 请求数 {len(frames)}（尺寸随机裁剪）")
+    for name, result in concurrent.items():
+        print(f"{name:>8}: {result['throughput']:8.2f} 张/秒, 平均延迟 {result['latency_ms']:8.2f} ms")
+    print(f"工作区: {processor.get_workspace_stats()}")
+
+
+if __name__ == '__main__':
+    main()
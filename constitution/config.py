@@ -40,6 +40,62 @@ class Config:
     MAX_IMAGE_HEIGHT = 1600
     CLAHE_CLIP_LIMIT = 3.0               # 增强对比度适应不同光线
     CLAHE_TILE_SIZE = (8, 8)
+    JPEG_REDUCED_DECODE = os.getenv('JPEG_REDUCED_DECODE', 'True').lower() == 'true'  # 超大JPEG按1/2~1/8缩小解码
+    PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'full')  # full: 全部阶段; adaptive: 按图像统计跳过不需要的阶段
+    PREPROCESS_BACKEND = os.getenv('PREPROCESS_BACKEND', 'thread')  # thread: 请求线程; process: 进程池 + 共享内存
+    PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', 0))     # 0表示按可用核数自动确定
+    ANALYSIS_MAX_SIDE = int(os.getenv('ANALYSIS_MAX_SIDE', 1024))    # 拍照分析工作图最长边
+    SHARPNESS_BLURRY = float(os.getenv('SHARPNESS_BLURRY', 300))     # 工作图拉普拉斯方差低于该值判为模糊（按1024标定）
+    SHARPNESS_FAIR = float(os.getenv('SHARPNESS_FAIR', 800))         # 低于该值判为质量一般
+    CROP_TEXT_REGION = os.getenv('CROP_TEXT_REGION', 'True').lower() == 'true'  # OCR前裁剪到标签/文字区域并做透视校正
+    ENCODE_BUDGET_BYTES = int(os.getenv('ENCODE_BUDGET_BYTES', 200 * 1024))  # OCR上传图片体积预算（Base64后），0表示不限制
+    ENCODE_MIN_QUALITY = int(os.getenv('ENCODE_MIN_QUALITY', 60))            # 按预算编码时的JPEG质量下限
+    ENCODE_MIN_TEXT_HEIGHT = int(os.getenv('ENCODE_MIN_TEXT_HEIGHT', 16))    # 按预算缩小时文字高度下限（像素）
+
+    # 本地文字检测（引导帧检测到足够大的文字后才调用远程OCR）
+    TEXT_GATE_ENABLED = os.getenv('TEXT_GATE_ENABLED', 'True').lower() == 'true'
+    TEXT_MIN_HEIGHT_RATIO = float(os.getenv('TEXT_MIN_HEIGHT_RATIO', 0.018))  # 文字行高度占画面高度下限
+    TEXT_DETECTOR_EAST_MODEL = os.getenv('TEXT_DETECTOR_EAST_MODEL', '')      # 离线EAST模型路径，为空时使用经典检测
+
+    # 拍照分析结果复用（/api/recognize携带analysis_id或提交同一张照片时复用分析阶段的OCR结果）
+    ANALYSIS_STORE_ENABLED = os.getenv('ANALYSIS_STORE_ENABLED', 'True').lower() == 'true'
+    ANALYSIS_STORE_MAX_ENTRIES = int(os.getenv('ANALYSIS_STORE_MAX_ENTRIES', 512))
+    ANALYSIS_STORE_TTL = int(os.getenv('ANALYSIS_STORE_TTL', 120))    # 秒
+
+    # 多面拍摄会话（/api/recognize携带session_id时各面的识别结果按字段置信度合并）
+    CAPTURE_SESSION_ENABLED = os.getenv('CAPTURE_SESSION_ENABLED', 'True').lower() == 'true'
+    CAPTURE_SESSION_MAX_ENTRIES = int(os.getenv('CAPTURE_SESSION_MAX_ENTRIES', 1024))
+    CAPTURE_SESSION_TTL = int(os.getenv('CAPTURE_SESSION_TTL', 300))  # 两次拍摄间隔超过该秒数会话过期
+    CAPTURE_SESSION_MAX_BYTES = int(os.getenv('CAPTURE_SESSION_MAX_BYTES', 32 * 1024 * 1024))  # 会话存储字节上限
+
+    # 多帧OCR融合（连拍、同一会话内对同一面的重拍按行对齐，按行置信度加权逐字投票）
+    OCR_FUSION_ENABLED = os.getenv('OCR_FUSION_ENABLED', 'True').lower() == 'true'
+    OCR_FUSION_HISTORY = int(os.getenv('OCR_FUSION_HISTORY', 3))       # 每个会话保留的最近OCR结果数
+
+    # 连拍识别（/api/recognize/burst一次上传多帧，按清晰度、曝光和文字存在性只识别最优帧）
+    BURST_MIN_FRAMES = int(os.getenv('BURST_MIN_FRAMES', 3))
+    BURST_MAX_FRAMES = int(os.getenv('BURST_MAX_FRAMES', 8))
+    BURST_SCORE_SIDE = int(os.getenv('BURST_SCORE_SIDE', 480))        # 评分工作图最长边
+    BURST_TRY_RUNNER_UP = os.getenv('BURST_TRY_RUNNER_UP', 'True').lower() == 'true'  # 最优帧结果不完整时识别次优帧
+
+    # 流式拍照分析（WebSocket /api/stream，需要安装flask-sock）
+    STREAM_ENABLED = os.getenv('STREAM_ENABLED', 'True').lower() == 'true'
+    STREAM_MAX_FRAME_BYTES = int(os.getenv('STREAM_MAX_FRAME_BYTES', 2 * 1024 * 1024))  # 单帧消息上限
+    STREAM_SMOOTHING = float(os.getenv('STREAM_SMOOTHING', 0.4))                 # 指标指数平滑系数
+    STREAM_OCR_INTERVAL = float(os.getenv('STREAM_OCR_INTERVAL', 1.0))           # 同一连接两次OCR最短间隔（秒）
+    STREAM_OCR_CHANGE_THRESHOLD = int(os.getenv('STREAM_OCR_CHANGE_THRESHOLD', 10))  # 画面变化超过该汉明距离才重新OCR
+
+    # 药品名称词库（本地药品名录 + 删除变体索引，把OCR识别的药名校正为最接近的真实药品）
+    DRUG_LEXICON_PATH = os.getenv('DRUG_LEXICON_PATH', '')                         # 名录文件(.txt每行一个名称或.csv)，为空时不启用
+    DRUG_LEXICON_INDEX_DIR = os.getenv('DRUG_LEXICON_INDEX_DIR', 'tmp/lexicon')    # 内存映射索引目录
+    DRUG_LEXICON_MAX_DISTANCE = int(os.getenv('DRUG_LEXICON_MAX_DISTANCE', 2))     # 最大编辑距离
+    DRUG_LEXICON_RELOAD_INTERVAL = float(os.getenv('DRUG_LEXICON_RELOAD_INTERVAL', 60))  # 名录文件检查间隔（秒），0表示不热加载
+
+    # 药品知识库（本地SQLite + FTS5，识别出药名后补全、核对用法、用量和禁忌）
+    DRUG_KB_ENABLED = os.getenv('DRUG_KB_ENABLED', 'True').lower() == 'true'
+    DRUG_KB_PATH = os.getenv('DRUG_KB_PATH', 'tmp/drug_knowledge.db')   # SQLite数据库文件
+    DRUG_KB_SEED = os.getenv('DRUG_KB_SEED', '')                         # 导入用CSV，文件变化后启动时重新导入
+    DRUG_KB_CACHE_ENTRIES = int(os.getenv('DRUG_KB_CACHE_ENTRIES', 1024))  # 热点药品进程内缓存条数
     
     # ==================== 文件处理配置 ====================
     UPLOAD_FOLDER = 'tmp'
@@ -47,9 +103,36 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
     # ==================== 性能配置 ====================
-    OCR_TIMEOUT = 30
+    OCR_TIMEOUT = int(os.getenv('OCR_TIMEOUT', 30))
     MAX_RETRY_COUNT = 3
-    REQUEST_TIMEOUT = 10
+    REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 10))
+
+    # HTTP连接池：复用到百度云的keep-alive连接，避免每次请求重新握手
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 10))   # 建议不小于并发请求线程数
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 1))      # 仅重试连接失败
+
+    # access_token后台刷新：到期前自动续期，请求线程不等待token接口（注册API蓝图时启动，导入模块时不启动）
+    TOKEN_AUTO_REFRESH = os.getenv('TOKEN_AUTO_REFRESH', 'True').lower() == 'true'
+    TOKEN_REFRESH_AHEAD = int(os.getenv('TOKEN_REFRESH_AHEAD', 6 * 3600))
+    TOKEN_STORE_PATH = os.getenv('TOKEN_STORE_PATH', 'tmp/baidu_token.db')
+
+    # OCR结果缓存：键为预处理后图片字节+OCR参数的哈希
+    OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'True').lower() == 'true'
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', 256))
+    OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', 3600))          # 秒
+    OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', '')                  # 为空时不启用磁盘层
+
+    # 近重复帧复用：自动拍摄相邻帧dHash汉明距离不超过阈值时复用上次结果
+    FRAME_DEDUP_ENABLED = os.getenv('FRAME_DEDUP_ENABLED', 'True').lower() == 'true'
+    FRAME_DEDUP_THRESHOLD = int(os.getenv('FRAME_DEDUP_THRESHOLD', 6))
+    FRAME_DEDUP_MAX_AGE = float(os.getenv('FRAME_DEDUP_MAX_AGE', 10))   # 秒
+    FRAME_DEDUP_HISTORY = int(os.getenv('FRAME_DEDUP_HISTORY', 8))
+
+    # 识别流水线全程在内存中处理，仅调试时落盘保存原图和处理结果
+    DEBUG_SAVE_IMAGES = os.getenv('DEBUG_SAVE_IMAGES', str(DEBUG)).lower() == 'true'
     
     # ==================== 日志配置 ====================
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -70,7 +153,25 @@ class Config:
             'api_key': self.BAIDU_API_KEY,
             'secret_key': self.BAIDU_SECRET_KEY,
             'token_url': self.BAIDU_TOKEN_URL,
-            'ocr_url': self.BAIDU_OCR_URL
+            'ocr_url': self.BAIDU_OCR_URL,
+            'token_timeout': self.REQUEST_TIMEOUT,
+            'ocr_timeout': self.OCR_TIMEOUT,
+            'token_refresh_ahead': self.TOKEN_REFRESH_AHEAD,
+            'token_store_path': self.TOKEN_STORE_PATH or None,
+            'http_pool': {
+                'pool_connections': self.HTTP_POOL_CONNECTIONS,
+                'pool_maxsize': self.HTTP_POOL_MAXSIZE,
+                'max_retries': self.HTTP_MAX_RETRIES,
+                'connect_timeout': self.HTTP_CONNECT_TIMEOUT,
+                'read_timeout': self.OCR_TIMEOUT
+            },
+            'cache': {
+                'enabled': self.OCR_CACHE_ENABLED,
+                'max_entries': self.OCR_CACHE_MAX_ENTRIES,
+                'max_bytes': self.OCR_CACHE_MAX_BYTES,
+                'ttl': self.OCR_CACHE_TTL,
+                'disk_dir': self.OCR_CACHE_DIR or None
+            }
         }
 
 # 创建全局配置实例
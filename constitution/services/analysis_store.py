@@ -0,0 +1,143 @@
+"""
+拍照分析结果存储
+/api/analyze-image的内容预检已经做过一次OCR，保存结果并返回analysis_id，
+随后/api/recognize提交同一张照片时直接复用，不再重复预处理和OCR
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from typing import Dict, Optional
+
+from utils.lru_cache import TTLLRUCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AnalysisResultStore:
+    """
+    有界的分析结果存储
+
+    主表按analysis_id保存OCR结果及原图sha256，辅助索引按原图sha256映射到analysis_id，
+    两者都是带TTL的LRU，过期或淘汰后自然失效。只有字节完全相同的照片才会命中。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化分析结果存储
+
+        Args:
+            config: 配置字典，可包含max_entries, max_bytes, ttl
+        """
+        self.config = {
+            'max_entries': 512,
+            'max_bytes': 16 * 1024 * 1024,   # 16MB
+            'ttl': 120                       # 拍照分析到识别通常在几秒内完成
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._results = TTLLRUCache(
+            max_entries=self.config['max_entries'],
+            max_bytes=self.config['max_bytes'],
+            ttl=self.config['ttl'],
+            size_func=lambda entry: entry['_size']
+        )
+        self._by_image = TTLLRUCache(max_entries=self.config['max_entries'], ttl=self.config['ttl'])
+        self._mismatches = 0
+
+        logger.info(
+            f"分析结果存储初始化完成: max_entries={self.config['max_entries']}, "
+            f"ttl={self.config['ttl']}s"
+        )
+
+    @staticmethod
+    def make_image_key(image_bytes: bytes) -> str:
+        """
+        计算原图字节的sha256
+
+        Args:
+            image_bytes: 上传的原始图片字节
+
+        Returns:
+            str: 十六进制摘要
+        """
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def save(self, image_key: str, ocr_result: Dict, source: Optional[Dict] = None) -> str:
+        """
+        保存分析阶段的OCR结果
+
+        Args:
+            image_key: 原图sha256
+            ocr_result: 成功的OCR结果
+            source: OCR所用图像的说明（如缩小的分析工作图、实时预览帧），复用时随结果返回
+
+        Returns:
+            str: analysis_id
+        """
+        analysis_id = uuid.uuid4().hex
+        size = len(json.dumps(ocr_result, ensure_ascii=False).encode('utf-8'))
+        self._results.set(analysis_id, {
+            'ocr_result': ocr_result,
+            'image_key': image_key,
+            'source': source,
+            'created': time.monotonic(),
+            '_size': size
+        })
+        self._by_image.set(image_key, analysis_id)
+        return analysis_id
+
+    def lookup(self, analysis_id: Optional[str], image_key: str) -> Optional[Dict]:
+        """
+        查找同一张照片的分析结果
+
+        analysis_id只用于定位，结果必须属于字节完全相同的照片：客户端带着过期或别的照片的
+        analysis_id提交时不复用（否则会播报上一张照片、甚至另一盒药的内容），再按原图哈希查找。
+
+        Args:
+            analysis_id: 分析接口返回的ID（可选）
+            image_key: 本次上传原图的sha256
+
+        Returns:
+            Dict: {'analysis_id', 'ocr_result', 'matched_by', 'source', 'age'}，未找到返回None
+        """
+        matched_by = 'analysis_id'
+        entry = self._results.get(analysis_id) if analysis_id else None
+        if entry is not None and entry['image_key'] != image_key:
+            self._mismatches += 1
+            entry = None
+
+        if entry is None:
+            matched_by = 'image_hash'
+            analysis_id = self._by_image.get(image_key)
+            entry = self._results.get(analysis_id) if analysis_id else None
+            if entry is not None and entry['image_key'] != image_key:
+                entry = None
+
+        if entry is None:
+            return None
+
+        return {
+            'analysis_id': analysis_id,
+            'ocr_result': entry['ocr_result'],
+            'matched_by': matched_by,
+            'source': entry['source'],
+            'age': round(time.monotonic() - entry['created'], 3)
+        }
+
+    def get_stats(self) -> Dict:
+        """
+        获取存储统计信息
+
+        Returns:
+            Dict: 主表与哈希索引的命中统计，以及analysis_id与照片不符而未复用的次数
+        """
+        return {
+            'results': self._results.get_stats(),
+            'image_index': self._by_image.get_stats(),
+            'id_mismatches': self._mismatches
+        }
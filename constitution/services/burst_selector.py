@@ -0,0 +1,171 @@
+"""
+连拍选帧服务
+一次请求上传3~8张连拍照片，在缩小的灰度图上一次性计算各帧清晰度、曝光和文字存在性，
+只对最好的一帧做预处理和OCR，模糊帧不再消耗一次往返和一次OCR调用
+"""
+
+import threading
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BurstFrameSelector:
+    """
+    连拍帧评分器
+
+    各帧按score_side缩小解码为灰度图，保持各自的宽高比缩放到相同的最长边：
+    1. 清晰度：按帧计算4邻域拉普拉斯方差，再除以本组最大值归一化；
+    2. 曝光：按帧的平均亮度是否过暗，以及欠曝/过曝像素占比（白底标签整体偏亮属于正常曝光）；
+    3. 文字：本地文字检测器判断是否有文字、文字是否足够大（未启用检测器时不参与排序）。
+    三项加权求和得到总分。
+    """
+
+    def __init__(self, image_processor, text_detector=None, config: Dict = None):
+        """
+        初始化连拍选帧器
+
+        Args:
+            image_processor: ImageProcessor，用于缩小解码
+            text_detector: TextPresenceDetector（可选）
+            config: 配置字典，可包含score_side, weights, min_brightness, clip_low, clip_high,
+                    runner_up_min_ratio
+        """
+        self.config = {
+            'score_side': 480,             # 评分工作图最长边
+            'weights': {'sharpness': 0.5, 'exposure': 0.2, 'text': 0.3},
+            'min_brightness': 70,          # 平均亮度低于该值按比例扣分
+            'clip_low': 10,                # 低于该灰度视为欠曝像素
+            'clip_high': 245,              # 高于该灰度视为过曝像素
+            'runner_up_min_ratio': 0.6     # 次优帧总分不低于最优帧的该比例才值得补充识别
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self.image_processor = image_processor
+        self.text_detector = text_detector
+
+        self._stats_lock = threading.Lock()
+        self.bursts = 0
+        self.frames_scored = 0
+
+    def _decode_frames(self, frames: List[bytes]):
+        """
+        缩小解码各帧，每帧按自身宽高比缩放到最长边score_side
+
+        不把各帧拉伸到同一尺寸：连拍中途转动手机时宽高比不同，拉伸会改变拉普拉斯和曝光统计；
+        各帧都以INTER_AREA缩到相同的最长边，来自不同分辨率的帧也按同一尺度比较。
+
+        Returns:
+            Tuple[List[np.ndarray], List[int]]: (各帧uint8灰度图, 可解码帧下标)
+        """
+        side = self.config['score_side']
+        grays, valid = [], []
+        for index, image_bytes in enumerate(frames):
+            gray, _ = self.image_processor.decode_for_processing(image_bytes, grayscale=True,
+                                                                 max_size=(side, side))
+            if gray is None:
+                continue
+            height, width = gray.shape[:2]
+            if max(height, width) > side:
+                scale = side / max(height, width)
+                gray = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                                  interpolation=cv2.INTER_AREA)
+            grays.append(gray)
+            valid.append(index)
+        return grays, valid
+
+    def rank(self, frames: List[bytes]) -> Dict:
+        """
+        为连拍帧评分并排序
+
+        Args:
+            frames: 各帧原始图片字节
+
+        Returns:
+            Dict: {'order': 按总分从高到低的帧下标（不含无法解码的帧）,
+                   'frames': [{'index', 'score', 'sharpness', 'exposure', 'text', 'brightness'}],
+                   'elapsed_ms'}
+        """
+        start = time.perf_counter()
+        grays, valid = self._decode_frames(frames)
+        if not grays:
+            return {'order': [], 'frames': [], 'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+        # 清晰度：各帧在自身尺寸上计算拉普拉斯方差，再除以本组最大值归一化
+        sharpness = np.array([float(cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))[1][0][0]) ** 2
+                              for gray in grays])
+        sharpness_score = sharpness / max(float(sharpness.max()), 1e-6)
+
+        # 曝光：不过暗、欠曝/过曝像素少的帧得分高
+        brightness = np.array([float(gray.mean()) for gray in grays])
+        clipped = np.array([float(((gray < self.config['clip_low']) | (gray > self.config['clip_high'])).mean())
+                            for gray in grays])
+        exposure_score = np.clip(brightness / self.config['min_brightness'], 0, 1) * (1 - clipped)
+
+        # 文字存在性
+        text_score = np.zeros(len(grays))
+        if self.text_detector is not None:
+            for position, gray in enumerate(grays):
+                detection = self.text_detector.detect(gray)
+                text_score[position] = 0.5 * detection['has_text'] + 0.5 * detection['text_large_enough']
+
+        weights = self.config['weights']
+        score = (weights['sharpness'] * sharpness_score + weights['exposure'] * exposure_score +
+                 weights['text'] * text_score)
+
+        order = np.argsort(-score, kind='stable')
+        with self._stats_lock:
+            self.bursts += 1
+            self.frames_scored += len(grays)
+
+        return {
+            'order': [valid[position] for position in order],
+            'frames': [{
+                'index': valid[position],
+                'score': round(float(score[position]), 4),
+                'sharpness': round(float(sharpness[position]), 2),
+                'exposure': round(float(exposure_score[position]), 4),
+                'text': round(float(text_score[position]), 2),
+                'brightness': round(float(brightness[position]), 2)
+            } for position in range(len(grays))],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def runner_up(self, ranking: Dict):
+        """
+        取值得补充识别的次优帧
+
+        Args:
+            ranking: rank()的结果
+
+        Returns:
+            int: 次优帧下标，没有或总分过低时返回None
+        """
+        if len(ranking['order']) < 2:
+            return None
+        scores = {frame['index']: frame['score'] for frame in ranking['frames']}
+        best, second = ranking['order'][0], ranking['order'][1]
+        if scores[second] < scores[best] * self.config['runner_up_min_ratio']:
+            return None
+        return second
+
+    def get_stats(self) -> Dict:
+        """
+        获取选帧统计信息
+
+        Returns:
+            Dict: 连拍请求数和评分帧数
+        """
+        with self._stats_lock:
+            return {
+                'bursts': self.bursts,
+                'frames_scored': self.frames_scored
+            }
@@ -0,0 +1,269 @@
+"""
+多面拍摄会话
+视障用户转动药盒逐面拍摄时，每次/api/recognize的提取结果按字段置信度合并到同一会话，
+完整性验证和语音播报基于合并后的记录，已经拍到的面不需要重拍
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from services.drug_lexicon import edit_distance, normalize_name
+from utils.lru_cache import TTLLRUCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 参与合并的字段
+MERGE_FIELDS = ('drug_name', 'usage', 'dosage', 'side_effects', 'contraindications', 'allergens',
+                'storage', 'manufacturer', 'expiry_date', 'batch_number', 'approval_number')
+
+# 提取失败时的默认药名不参与合并
+UNKNOWN_DRUG_NAME = '未知药品'
+
+
+def field_confidence(drug_info: Dict) -> Dict[str, float]:
+    """
+    计算单次提取结果中各字段的置信度
+
+    以该次OCR的平均置信度为基础：知识库补全的字段、在药品名录中找到的药名视为可靠；
+    与知识库冲突的字段、名录中找不到的药名适当降低。
+
+    Args:
+        drug_info: extract_drug_info的结果
+
+    Returns:
+        Dict[str, float]: 字段 -> 置信度（0~1），空字段不包含在内
+    """
+    base = float(drug_info.get('confidence') or 0.5)
+    knowledge = drug_info.get('knowledge') or {}
+    trusted = set(knowledge.get('filled', ()))
+    conflicts = set(knowledge.get('conflicts', ()))
+
+    confidences = {}
+    for field in MERGE_FIELDS:
+        value = drug_info.get(field)
+        if not value or not str(value).strip() or (field == 'drug_name' and value == UNKNOWN_DRUG_NAME):
+            continue
+
+        confidence = base
+        if field in trusted:
+            confidence = max(base, 0.99)
+        elif field in conflicts:
+            confidence = base * 0.8
+
+        if field == 'drug_name' and 'drug_name_verified' in drug_info:
+            confidence = max(base, 0.99) if drug_info['drug_name_verified'] else base * 0.8
+
+        confidences[field] = round(min(confidence, 1.0), 4)
+    return confidences
+
+
+def same_drug_name(a: str, b: str, ratio: float) -> bool:
+    """
+    两次识别出的药名是否可能是同一个药（OCR错字不算换药）
+
+    Args:
+        a, b: 药品名称
+        ratio: 允许的编辑距离占较长名称长度的比例
+
+    Returns:
+        bool: 规范化后的编辑距离在允许范围内
+    """
+    a, b = normalize_name(a), normalize_name(b)
+    limit = int(max(len(a), len(b)) * ratio)
+    return edit_distance(a, b, limit) <= limit
+
+
+class CaptureSessionStore:
+    """
+    有界的拍摄会话存储
+
+    会话保存在带TTL和字节上限的LRU中，用户停止拍摄后自然过期。每个字段保留置信度最高的一次结果，
+    置信度相同时保留内容更完整（更长）的一次。换药的判断不看OCR置信度：两次药名都在名录中找到且不同时
+    视为换了一盒药，重新开始会话；否则药名差异超出OCR错字的范围时无法确定是否换药，本次结果不合并，
+    只返回冲突标记。供融合的OCR历史只保存文本块，不保存原始响应。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化会话存储
+
+        Args:
+            config: 配置字典，可包含max_entries, max_bytes, ttl, ocr_history, name_distance_ratio
+        """
+        self.config = {
+            'max_entries': 1024,
+            'max_bytes': 32 * 1024 * 1024,   # 32MB
+            'ttl': 300,                      # 两次拍摄之间超过该时间（秒）会话过期
+            'ocr_history': 3,                # 每个会话保留的最近OCR结果数，供多帧融合
+            'name_distance_ratio': 0.34      # 药名编辑距离不超过较长名称长度的该比例时视为OCR错字（同一个药）
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._sessions = TTLLRUCache(
+            max_entries=self.config['max_entries'],
+            max_bytes=self.config['max_bytes'],
+            ttl=self.config['ttl'],
+            size_func=lambda session: session['_size']
+        )
+        # 同一会话的并发请求按顺序合并
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'merged': 0, 'restarted': 0, 'conflicts': 0}
+
+        logger.info(
+            f"拍摄会话存储初始化完成: max_entries={self.config['max_entries']}, "
+            f"ttl={self.config['ttl']}s"
+        )
+
+    def _new_session(self, session_id: str = None) -> Dict:
+        self._stats['created'] += 1
+        return {
+            'session_id': session_id or uuid.uuid4().hex,
+            'created_at': time.time(),
+            'shots': 0,
+            'fields': {},
+            'ocr_results': [],
+            '_size': 0
+        }
+
+    @staticmethod
+    def _session_size(session: Dict) -> int:
+        """会话占用字节数的估计（字段值和OCR文本块按JSON编码计）"""
+        return len(json.dumps([session['fields'], session['ocr_results']], ensure_ascii=False).encode('utf-8'))
+
+    def merge(self, session_id: Optional[str], drug_info: Dict, ocr_result: Dict = None,
+              new_shot: bool = True) -> Dict:
+        """
+        把一次拍摄的提取结果合并到会话
+
+        Args:
+            session_id: 会话ID，为空或已过期时新建会话
+            drug_info: extract_drug_info的结果（提取失败的结果只计入拍摄次数）
+            ocr_result: 本次拍摄（融合前）新识别的OCR结果，保留最近几次的文本块供后续拍摄融合；
+                        复用的OCR结果不是独立的观测，应传None
+            new_shot: 是否算作新的一次拍摄；连拍补充识别的次优帧与最优帧是同一次拍摄，不增加拍摄次数
+
+        Returns:
+            Dict: {'session_id', 'shots', 'drug_info': 合并后的药品信息,
+                   'updated_fields': 本次更新的字段, 'field_sources': {字段: 来自第几次拍摄}, 'restarted',
+                   'conflict': 药名与会话不一致且无法确定是否换药（此时drug_info只是本次的提取结果，会话不变）}
+        """
+        confidences = field_confidence(drug_info) if not drug_info.get('error') else {}
+        verified = bool(drug_info.get('drug_name_verified'))
+
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = self._new_session(session_id)
+
+            restarted = conflict = False
+            previous_name = session['fields'].get('drug_name')
+            if previous_name and 'drug_name' in confidences:
+                name = drug_info['drug_name'].strip()
+                if previous_name.get('verified') and verified:
+                    # 两次药名都在名录中找到且不同：用户换了一盒药
+                    restarted = normalize_name(previous_name['value']) != normalize_name(name)
+                else:
+                    conflict = not same_drug_name(previous_name['value'], name,
+                                                  self.config['name_distance_ratio'])
+
+            if conflict:
+                # 无法确定是OCR误识别还是换了药：不把本次的字段混进会话记录
+                self._stats['conflicts'] += 1
+                logger.info(f"药名与会话不一致，本次结果不合并: {previous_name['value']} / {drug_info['drug_name']}")
+                return {
+                    'session_id': session['session_id'],
+                    'shots': session['shots'],
+                    'drug_info': {key: value for key, value in drug_info.items() if key not in ('error', 'error_code')},
+                    'updated_fields': [],
+                    'field_sources': {},
+                    'restarted': False,
+                    'conflict': True
+                }
+
+            if restarted:
+                session = self._new_session(session['session_id'])
+                self._stats['restarted'] += 1
+
+            if new_shot or session['shots'] == 0:
+                session['shots'] += 1
+            updated = []
+            for field, confidence in confidences.items():
+                value = drug_info[field].strip()
+                current = session['fields'].get(field)
+                if (current is None or confidence > current['confidence'] or
+                        (confidence == current['confidence'] and len(value) > len(current['value']))):
+                    session['fields'][field] = {'value': value, 'confidence': confidence, 'shot': session['shots']}
+                    if field == 'drug_name':
+                        session['fields'][field]['verified'] = verified
+                    updated.append(field)
+
+            if ocr_result and ocr_result.get('success') and self.config['ocr_history'] > 0:
+                history_entry = {'success': True, 'text_blocks': ocr_result.get('text_blocks') or []}
+                session['ocr_results'] = (session['ocr_results'] + [history_entry])[-self.config['ocr_history']:]
+
+            session['updated_at'] = time.time()
+            session['_size'] = self._session_size(session)
+            self._sessions.set(session['session_id'], session)
+            self._stats['merged'] += 1
+
+            fields = {field: dict(entry) for field, entry in session['fields'].items()}
+            shots = session['shots']
+            session_id = session['session_id']
+
+        merged = {key: value for key, value in drug_info.items() if key not in ('error', 'error_code')}
+        merged.setdefault('drug_name', UNKNOWN_DRUG_NAME)
+        merged.update({field: entry['value'] for field, entry in fields.items()})
+        merged['field_confidence'] = {field: entry['confidence'] for field, entry in fields.items()}
+
+        return {
+            'session_id': session_id,
+            'shots': shots,
+            'drug_info': merged,
+            'updated_fields': updated,
+            'field_sources': {field: entry['shot'] for field, entry in fields.items()},
+            'restarted': restarted,
+            'conflict': False
+        }
+
+    def recent_ocr_results(self, session_id: Optional[str]) -> List[Dict]:
+        """
+        取会话最近几次拍摄的OCR结果
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            List[Dict]: OCR结果列表（从旧到新，只含success和text_blocks），会话不存在时为空
+        """
+        session = self._sessions.get(session_id) if session_id else None
+        return list(session['ocr_results']) if session else []
+
+    def end(self, session_id: str) -> bool:
+        """
+        结束会话
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            bool: 会话是否存在
+        """
+        return self._sessions.pop(session_id) is not None
+
+    def get_stats(self) -> Dict:
+        """
+        获取会话统计信息
+
+        Returns:
+            Dict: 会话缓存统计及新建/合并/重新开始/药名冲突次数
+        """
+        return {
+            'sessions': self._sessions.get_stats(),
+            **self._stats
+        }
@@ -3,23 +3,136 @@
 从OCR识别结果中提取药品相关信息
 """
 
+import bisect
 import re
 import logging
 from typing import Dict, List, Optional
+from services.label_segmenter import LabelSegmenter
+from services.layout_analyzer import LayoutAnalyzer
+from utils.aho_corasick import KeywordAutomaton
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 药品名称允许的字符（中文、英文字母、数字）
+WORD_CHARS = r'[\u4e00-\u9fa5a-zA-Z0-9]'
+WORD_CHAR_PATTERN = re.compile(WORD_CHARS)
+WORD_RUN_PATTERN = re.compile(WORD_CHARS + '*')
+SPACE_PATTERN = re.compile(r'\s*')
+
+# 数字（含中文数字），用于用量规则
+NUMBER_CHARS = r'[0-9一二三四五六七八九十]'
+
+# 字段规则表：字段 -> (匹配方式, 默认值, 按优先级排列的规则)
+# 匹配方式 first: 取优先级最高且能匹配的规则，同一规则取文本中最靠前的匹配
+#          all:   按规则顺序收集每条规则的全部不重叠匹配，用'；'连接
+# 规则 (类型, 触发词, 参数)，在触发词出现的位置锚定匹配；各类型的匹配耗时都与匹配长度成正比，
+# 不会在长文本上回溯：
+#   rest:        触发词[：:]?\s* 之后到句号为止，等价于 触发词[：:]?\s*([^。]+)
+#   until:       触发词[：:]?\s* 之后到参数中最先出现的结束词（'。'表示句号）或文本结尾为止，
+#                中间不能跨过句号，等价于 触发词[：:]?\s*([^。]+?)(?=结束词|$)
+#   regex:       触发词处锚定匹配参数中的正则，有捕获组时取第一组，否则取整个匹配
+#   enclosed:    触发词之后到参数中的闭合符号为止，如 【([^】]*)】
+#   word_suffix: 触发词为剂型后缀（取自drug_keywords[触发词]，每个后缀一条规则），
+#                值为以该后缀结尾的连续中英文数字词
+#   segment:     值为触发词所在的整句（两个句号之间）
+FIELD_RULES = {
+    'drug_name': ('first', '未知药品', [
+        ('word_suffix', 'drug_names', None),
+        ('regex', ['通用名称'], r'通用名称[：:]?\s*([^\s，。]+)'),
+        ('regex', ['商品名称'], r'商品名称[：:]?\s*([^\s，。]+)'),
+        ('regex', ['药品名称'], r'药品名称[：:]?\s*([^\s，。]+)'),
+        ('enclosed', ['【'], '】'),
+        ('regex', ['品名'], r'品名[：:]?\s*([^\s，。]+)'),
+        ('regex', ['名称'], r'名称[：:]?\s*([^\s，。]+)')
+    ]),
+    'usage': ('all', '', [
+        ('until', ['用法'], ['用量', '。']),
+        ('rest', ['服用方法'], None),
+        ('rest', ['给药途径'], None),
+        ('regex', ['口服', '外用', '静脉注射', '肌肉注射', '皮下注射', '舌下含服',
+                   '直肠给药', '阴道给药', '滴眼', '滴耳', '滴鼻', '吸入'],
+         r'(口服|外用|静脉注射|肌肉注射|皮下注射|舌下含服|直肠给药|阴道给药|滴眼|滴耳|滴鼻|吸入)')
+    ]),
+    'dosage': ('all', '', [
+        ('rest', ['用量'], None),
+        ('rest', ['剂量'], None),
+        ('regex', ['一次'], r'一次\s*(' + NUMBER_CHARS + r'+(?:[～~\-]' + NUMBER_CHARS + r'*)?[片粒支mg毫升g])'),
+        ('regex', ['一日'], r'一日\s*(' + NUMBER_CHARS + r'+(?:[～~\-]' + NUMBER_CHARS + r'*)?[次回])'),
+        ('regex', ['每次'], r'每次\s*(' + NUMBER_CHARS + r'+(?:[～~\-]' + NUMBER_CHARS + r'*)?[片粒支mg毫升g])'),
+        ('regex', ['每日'], r'每日\s*(' + NUMBER_CHARS + r'+(?:[～~\-]' + NUMBER_CHARS + r'*)?[次回])')
+    ]),
+    'side_effects': ('first', '', [
+        ('until', ['不良反应'], ['禁忌', '注意事项']),
+        ('rest', ['副作用'], None),
+        ('rest', ['常见不良反应'], None),
+        ('rest', ['可能引起'], None)
+    ]),
+    'contraindications': ('first', '', [
+        ('until', ['禁忌'], ['注意事项']),
+        ('rest', ['禁用'], None),
+        ('rest', ['禁忌症'], None),
+        ('rest', ['不宜'], None),
+        ('rest', ['慎用'], None)
+    ]),
+    'allergens': ('first', '', [
+        ('rest', ['过敏'], None),
+        ('regex', ['过敏者'], r'过敏者[^。]+'),
+        ('regex', ['对本品过敏者'], r'对本品过敏者[^。]+'),
+        ('regex', ['过敏体质'], r'过敏体质[^。]+')
+    ]),
+    'storage': ('first', '', [
+        ('rest', ['贮藏'], None),
+        ('rest', ['保存'], None),
+        ('rest', ['储存'], None),
+        ('rest', ['存放'], None)
+    ]),
+    'manufacturer': ('first', '', [
+        ('rest', ['生产厂家'], None),
+        ('rest', ['生产企业'], None),
+        ('rest', ['制造商'], None),
+        ('segment', ['有限公司', '股份有限公司', '制药厂', '制药有限公司'], None)
+    ]),
+    'expiry_date': ('first', '', [
+        ('rest', ['有效期'], None),
+        ('rest', ['失效期'], None),
+        ('rest', ['有效期至'], None),
+        ('rest', ['失效日期'], None)
+    ]),
+    'batch_number': ('first', '', [
+        ('rest', ['批号'], None),
+        ('rest', ['生产批号'], None),
+        ('rest', ['产品批号'], None)
+    ]),
+    'approval_number': ('first', '', [
+        ('regex', ['国药准字'], r'国药准字\s*[A-Za-z]\s*\d{8}'),
+        ('rest', ['批准文号'], None)
+    ])
+}
+
+# 拍照内容预检使用的关键词类别（与drug_keywords一起构建进同一个关键词自动机）
+CONTENT_KEYWORDS = {
+    'content_summary': ['片', '胶囊', '颗粒', '丸', '口服液', '注射液', '用法', '用量', '有效期', '生产日期'],
+    'content_drug_name': ['片', '胶囊', '颗粒', '丸', '口服液', '注射液'],
+    'content_usage': ['用法', '服用', '口服', '外用'],
+    'content_dosage': ['用量', '剂量', '一次', '一日'],
+    'content_expiry': ['有效期', '失效期', '生产日期']
+}
+
 
 class DrugInfoExtractor:
     """药品信息提取类"""
 
-    def __init__(self, config: Dict = None):
+    def __init__(self, config: Dict = None, lexicon=None, knowledge_base=None):
         """
         初始化药品信息提取器
         
         Args:
-            config: 配置字典，包含药品关键词等
+            config: 配置字典，可包含drug_keywords, content_keywords（追加关键词），
+                    segment_sections（是否按【】标题分段，默认开启）, section_aliases, section_fields,
+                    layout（版面分析配置）
+            lexicon: 药品名称词库（DrugLexicon），提供时把提取出的药名校正为名录中最接近的名称
+            knowledge_base: 药品知识库（DrugKnowledgeBase），提供时按药名补全、核对用法、用量和禁忌
         """
         # 药品知识库 - 可根据需要扩展
         self.drug_keywords = {
@@ -59,11 +172,36 @@ class DrugInfoExtractor:
             ]
         }
         
+        self.content_keywords = {key: list(value) for key, value in CONTENT_KEYWORDS.items()}
+
         # 合并配置中的关键词
         if config and 'drug_keywords' in config:
             for key, value in config['drug_keywords'].items():
                 if key in self.drug_keywords:
                     self.drug_keywords[key].extend(value)
+        if config and 'content_keywords' in config:
+            for key, value in config['content_keywords'].items():
+                if key in self.content_keywords:
+                    self.content_keywords[key].extend(value)
+
+        # 规则表在构造时编译一次
+        self._compile_rules()
+
+        # 所有关键词类别和字段规则触发词/结束词构建为一个自动机，提取和内容预检都只扫描文本一遍
+        self.keyword_automaton = KeywordAutomaton({
+            **self.drug_keywords,
+            **self.content_keywords,
+            'field_trigger': list(self._rules_by_trigger),
+            'field_stop': list(self._stop_keywords)
+        })
+
+        self.layout_analyzer = LayoutAnalyzer((config or {}).get('layout'))
+
+        # 说明书按【】标题分段，字段只在各自段落内提取
+        self.segmenter = LabelSegmenter(config) if (config or {}).get('segment_sections', True) else None
+
+        self.lexicon = lexicon
+        self.knowledge_base = knowledge_base
 
         logger.info("药品信息提取器初始化完成")
 
@@ -84,8 +222,10 @@ class DrugInfoExtractor:
             }
 
         try:
-            # 提取所有文本
-            full_text = self._combine_text_blocks(ocr_result['text_blocks'])
+            # 按版面分析的阅读顺序提取所有文本
+            text_blocks = ocr_result['text_blocks']
+            layout = self.layout_analyzer.analyze(text_blocks)
+            full_text = self._combine_text_blocks(text_blocks, layout)
             
             if not full_text.strip():
                 return {
@@ -93,21 +233,29 @@ class DrugInfoExtractor:
                     'error_code': 'NO_TEXT'
                 }
 
-            # 提取各类信息
-            drug_info = {
-                'drug_name': self._extract_drug_name(full_text),
-                'usage': self._extract_usage(full_text),
-                'dosage': self._extract_dosage(full_text),
-                'side_effects': self._extract_side_effects(full_text),
-                'contraindications': self._extract_contraindications(full_text),
-                'allergens': self._extract_allergens(full_text),
-                'storage': self._extract_storage(full_text),
-                'manufacturer': self._extract_manufacturer(full_text),
-                'expiry_date': self._extract_expiry_date(full_text),
-                'batch_number': self._extract_batch_number(full_text),
+            # 分段后单遍提取各类信息
+            sections = self.segmenter.segment(full_text) if self.segmenter else []
+            field_spans = self.segmenter.field_spans(full_text, sections) if sections else None
+            drug_info = self._extract_fields(full_text, field_spans)
+
+            # 键值分开排版（如表格中键在上、值在下）时按几何邻接取值，段落正文仍然优先
+            for field, value in self._layout_values(text_blocks, layout).items():
+                if not (field_spans and field in field_spans['body']):
+                    drug_info[field] = value
+
+            # OCR错字会让语音播报念出错误药名，按名录校正为最接近的真实药品
+            if self.lexicon is not None:
+                self._snap_drug_name(drug_info)
+
+            # 知识库收录的药品只需拍到药名，其余字段由知识库补全或核对
+            if self.knowledge_base is not None and drug_info['drug_name'] != FIELD_RULES['drug_name'][1]:
+                drug_info['knowledge'] = self.knowledge_base.enrich(drug_info)
+
+            drug_info.update({
+                'sections': [section['title'] for section in sections],
                 'raw_text': full_text,  # 返回原始文本用于调试
                 'confidence': self._calculate_confidence(ocr_result)
-            }
+            })
 
             logger.info(f"药品信息提取完成: {drug_info['drug_name']}")
             return drug_info
@@ -119,286 +267,273 @@ class DrugInfoExtractor:
                 'error_code': 'EXTRACTION_ERROR'
             }
 
-    def _combine_text_blocks(self, text_blocks: List[Dict]) -> str:
+    def _snap_drug_name(self, drug_info: Dict):
+        """
+        用药品名称词库校正drug_name
+
+        校正后原始识别结果保存在drug_name_raw；drug_name_verified表示药名是否在名录中找到。
+
+        Args:
+            drug_info: 提取结果，原地修改
+        """
+        name = drug_info.get('drug_name')
+        default = FIELD_RULES['drug_name'][1]
+        match = self.lexicon.lookup(name) if name and name != default else None
+
+        drug_info['drug_name_verified'] = match is not None
+        if match and match['name'] != name:
+            drug_info['drug_name_raw'] = name
+            drug_info['drug_name'] = match['name']
+
+    def _combine_text_blocks(self, text_blocks: List[Dict], layout: Dict = None) -> str:
         """
         合并所有文本块
         
         Args:
             text_blocks: OCR识别的文本块列表
+            layout: 版面分析结果，未提供时现场分析
             
         Returns:
-            str: 合并后的完整文本
+            str: 按阅读顺序（栏从左到右、行从上到下）合并后的完整文本
         """
         if not text_blocks:
             return ""
-        
-        # 按位置排序文本块
-        sorted_blocks = sorted(text_blocks, key=lambda x: (
-            x.get('location', {}).get('top', 0),
-            x.get('location', {}).get('left', 0)
-        ))
-        
-        return ' '.join([block['words'] for block in sorted_blocks])
 
-    def _extract_drug_name(self, text: str) -> str:
-        """
-        提取药品名称
-        
-        Args:
-            text: 完整文本
-            
-        Returns:
-            str: 药品名称
-        """
-        # 方法1: 查找药品名称常见后缀
-        for suffix in self.drug_keywords['drug_names']:
-            pattern = r'([\u4e00-\u9fa5a-zA-Z0-9]+' + re.escape(suffix) + ')'
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        # 方法2: 查找"通用名称"、"商品名称"等关键词
-        name_patterns = [
-            r'通用名称[：:]?\s*([^\s，。]+)',
-            r'商品名称[：:]?\s*([^\s，。]+)',
-            r'药品名称[：:]?\s*([^\s，。]+)',
-            r'【([^】]*)】',
-            r'品名[：:]?\s*([^\s，。]+)',
-            r'名称[：:]?\s*([^\s，。]+)'
-        ]
-
-        for pattern in name_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        # 方法3: 查找第一个可能的中文药品名
-        chinese_pattern = r'([\u4e00-\u9fa5]{2,8}(?:片|胶囊|颗粒|丸|口服液|注射液|软膏|滴眼液))'
-        match = re.search(chinese_pattern, text)
-        if match:
-            return match.group(1)
-
-        return "未知药品"
-
-    def _extract_usage(self, text: str) -> str:
-        """
-        提取用法
-        
-        Args:
-            text: 完整文本
-            
-        Returns:
-            str: 用法信息
-        """
-        usage_patterns = [
-            r'用法[：:]?\s*([^。]+?)(?=用量|$|。)',
-            r'服用方法[：:]?\s*([^。]+)',
-            r'给药途径[：:]?\s*([^。]+)',
-            r'(口服|外用|静脉注射|肌肉注射|皮下注射|舌下含服|直肠给药|阴道给药|滴眼|滴耳|滴鼻|吸入)'
-        ]
-
-        results = []
-        for pattern in usage_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                results.extend(matches)
-
-        return '；'.join(results) if results else ""
-
-    def _extract_dosage(self, text: str) -> str:
-        """
-        提取用量
-        
-        Args:
-            text: 完整文本
-            
-        Returns:
-            str: 用量信息
-        """
-        dosage_patterns = [
-            r'用量[：:]?\s*([^。]+)',
-            r'剂量[：:]?\s*([^。]+)',
-            r'一次\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[片粒支mg毫升g])',
-            r'一日\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[次回])',
-            r'每次\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[片粒支mg毫升g])',
-            r'每日\s*([0-9一二三四五六七八九十]+[～~\-]?[0-9一二三四五六七八九十]*[次回])'
-        ]
-
-        results = []
-        for pattern in dosage_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                results.extend(matches)
-
-        return '；'.join(results) if results else ""
-
-    def _extract_side_effects(self, text: str) -> str:
-        """
-        提取不良反应
-        
-        Args:
-            text: 完整文本
-            
-        Returns:
-            str: 不良反应信息
-        """
-        side_effect_patterns = [
-            r'不良反应[：:]?\s*([^。]+?)(?=禁忌|注意事项|$)',
-            r'副作用[：:]?\s*([^。]+)',
-            r'常见不良反应[：:]?\s*([^。]+)',
-            r'可能引起[：:]?\s*([^。]+)'
-        ]
+        if layout is None:
+            layout = self.layout_analyzer.analyze(text_blocks)
+        return ' '.join(line['text'] for line in layout['lines'])
 
-        for pattern in side_effect_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
+    def _layout_values(self, text_blocks: List[Dict], layout: Dict) -> Dict[str, str]:
+        """
+        按键值邻接关系取字段值
 
-        return ""
+        文本块内容恰好是某个字段的键（如“批号”、“有效期至：”）时，
+        取同一行右侧或正下方的文本块作为值。
 
-    def _extract_contraindications(self, text: str) -> str:
-        """
-        提取禁忌
-        
         Args:
-            text: 完整文本
-            
-        Returns:
-            str: 禁忌信息
-        """
-        contraindication_patterns = [
-            r'禁忌[：:]?\s*([^。]+?)(?=注意事项|$)',
-            r'禁用[：:]?\s*([^。]+)',
-            r'禁忌症[：:]?\s*([^。]+)',
-            r'不宜[：:]?\s*([^。]+)',
-            r'慎用[：:]?\s*([^。]+)'
-        ]
-
-        for pattern in contraindication_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        return ""
-
-    def _extract_allergens(self, text: str) -> str:
-        """
-        提取过敏源
-        
-        Args:
-            text: 完整文本
-            
+            text_blocks: OCR识别的文本块列表
+            layout: 版面分析结果
+
         Returns:
-            str: 过敏源信息
+            Dict[str, str]: 字段名 -> 值
         """
-        allergen_patterns = [
-            r'过敏[：:]?\s*([^。]+)',
-            r'过敏者[^。]+',
-            r'对本品过敏者[^。]+',
-            r'过敏体质[^。]+'
-        ]
-
-        for pattern in allergen_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        return ""
+        def key_field(words: str) -> Optional[str]:
+            return self._key_fields.get((words or '').strip().rstrip('：:').strip())
+
+        values = {}
+        for line in layout['lines']:
+            for block_index in line['blocks']:
+                field = key_field(text_blocks[block_index].get('words'))
+                if field is None or field in values:
+                    continue
+                value = LayoutAnalyzer.neighbor_value(text_blocks, layout, block_index,
+                                                      is_key=lambda words: key_field(words) is not None)
+                if value and value.strip():
+                    values[field] = value.strip().lstrip('：:').strip()
+        return values
 
-    def _extract_storage(self, text: str) -> str:
+    def _compile_rules(self):
         """
-        提取贮藏信息
-        
-        Args:
-            text: 完整文本
-            
-        Returns:
-            str: 贮藏信息
+        把字段规则表编译为按触发词索引的规则列表
         """
-        storage_patterns = [
-            r'贮藏[：:]?\s*([^。]+)',
-            r'保存[：:]?\s*([^。]+)',
-            r'储存[：:]?\s*([^。]+)',
-            r'存放[：:]?\s*([^。]+)'
-        ]
-
-        for pattern in storage_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
+        self._rules = []
+        rules_by_trigger = {}
+        stop_keywords = set()
+
+        for field, (mode, _, rules) in FIELD_RULES.items():
+            for kind, triggers, param in rules:
+                if kind == 'word_suffix':
+                    # 每个剂型后缀单独成为一条规则，保持后缀列表顺序即优先级
+                    expanded = [([suffix], re.compile(WORD_CHARS + '+' + re.escape(suffix)))
+                                for suffix in dict.fromkeys(self.drug_keywords[triggers])]
+                elif kind == 'regex':
+                    expanded = [(triggers, re.compile(param))]
+                elif kind == 'until':
+                    stops = tuple(stop for stop in param if stop != '。')
+                    stop_keywords.update(stops)
+                    expanded = [(triggers, (stops, '。' in param))]
+                else:
+                    expanded = [(triggers, param)]
+
+                for rule_triggers, rule_param in expanded:
+                    group = 1 if kind == 'regex' and rule_param.groups else 0
+                    for trigger in rule_triggers:
+                        # (规则序号, 字段, 是否收集全部匹配, 类型, 参数, 取值分组, 触发词长度)
+                        rule = (len(self._rules), field, mode == 'all', kind, rule_param, group, len(trigger))
+                        rules_by_trigger.setdefault(trigger, []).append(rule)
+                    self._rules.append((len(self._rules), field))
+
+        self._rules_by_trigger = {trigger: tuple(rules) for trigger, rules in rules_by_trigger.items()}
+        self._stop_keywords = frozenset(stop_keywords)
+
+        # 单值字段的键（rest/until规则的触发词），用于按版面邻接取值
+        self._key_fields = {}
+        for field, (mode, _, rules) in FIELD_RULES.items():
+            if mode == 'first':
+                for kind, triggers, _ in rules:
+                    if kind in ('rest', 'until'):
+                        for trigger in triggers:
+                            self._key_fields.setdefault(trigger, field)
+
+    def _extract_fields(self, text: str, field_spans: Dict = None) -> Dict[str, str]:
+        """
+        按字段规则表提取所有字段
 
-        return ""
+        一遍扫描得到所有触发词位置后逐个应用规则：first字段只保留优先级最高的规则的首个匹配，
+        更低优先级的规则命中后直接跳过；all字段按findall语义记录每条规则的不重叠匹配。
+        提供field_spans时，body字段直接取段落正文，rules字段只匹配所在段落内的触发词。
 
-    def _extract_manufacturer(self, text: str) -> str:
-        """
-        提取生产厂家信息
-        
         Args:
             text: 完整文本
-            
+            field_spans: LabelSegmenter.field_spans()的结果
+
         Returns:
-            str: 生产厂家信息
+            Dict[str, str]: 字段名 -> 提取结果
         """
-        manufacturer_patterns = [
-            r'生产厂家[：:]?\s*([^。]+)',
-            r'生产企业[：:]?\s*([^。]+)',
-            r'制造商[：:]?\s*([^。]+)',
-            r'([^。]*(?:有限公司|股份有限公司|制药厂|制药有限公司)[^。]*)'
-        ]
+        bodies = field_spans['body'] if field_spans else {}
+        spans = field_spans['rules'] if field_spans else {}
 
-        for pattern in manufacturer_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
+        hits = self.keyword_automaton.find_all(text)
+        index = _TextIndex(text, hits, self._stop_keywords)
 
-        return ""
+        rules_by_trigger = self._rules_by_trigger
+        first_matches = {}    # 字段 -> (规则序号, 值)
+        all_matches = {}      # 规则序号 -> [值]
+        next_start = {}       # 规则序号 -> 下一次匹配的最小起点
+
+        for position, keyword in hits:
+            for rule in rules_by_trigger.get(keyword, ()):
+                rule_id, field, collect = rule[0], rule[1], rule[2]
+                if field in bodies:
+                    continue
+                if collect:
+                    if position < next_start.get(rule_id, 0):
+                        continue
+                else:
+                    found = first_matches.get(field)
+                    if found is not None and found[0] <= rule_id:
+                        continue
+
+                begin, end = 0, len(text)
+                if field in spans:
+                    span = next((span for span in spans[field] if span[0] <= position < span[1]), None)
+                    if span is None:
+                        continue
+                    begin, end = span
+
+                span = self._match_rule(rule, index, position, begin, end)
+                if span is None:
+                    continue
 
-    def _extract_expiry_date(self, text: str) -> str:
+                if collect:
+                    all_matches.setdefault(rule_id, []).append(span[0])
+                    next_start[rule_id] = span[1]
+                else:
+                    first_matches[field] = (rule_id, span[0])
+
+        fields = {}
+        for field, (mode, default, _) in FIELD_RULES.items():
+            if field in bodies:
+                fields[field] = bodies[field]
+            elif mode == 'first':
+                found = first_matches.get(field)
+                fields[field] = found[1] if found is not None else default
+            else:
+                values = [value for rule_id, rule_field in self._rules if rule_field == field
+                          for value in all_matches.get(rule_id, ())]
+                fields[field] = '；'.join(values) if values else default
+        return fields
+
+    def _match_rule(self, rule: tuple, index: '_TextIndex', position: int,
+                    begin: int, end: int) -> Optional[tuple]:
         """
-        提取有效期信息
-        
+        在触发词位置应用一条规则
+
         Args:
-            text: 完整文本
-            
+            rule: 编译后的规则
+            index: 文本索引
+            position: 触发词起点
+            begin: 匹配范围起点（段落起点或0）
+            end: 匹配范围终点（段落终点或文本长度）
+
         Returns:
-            str: 有效期信息
+            tuple: (值, 匹配结束位置)，不匹配返回None
         """
-        expiry_patterns = [
-            r'有效期[：:]?\s*([^。]+)',
-            r'失效期[：:]?\s*([^。]+)',
-            r'有效期至[：:]?\s*([^。]+)',
-            r'失效日期[：:]?\s*([^。]+)'
-        ]
-
-        for pattern in expiry_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        return ""
-
-    def _extract_batch_number(self, text: str) -> str:
+        kind, param, group, trigger_length = rule[3], rule[4], rule[5], rule[6]
+        text = index.text
+        if position + trigger_length > end:
+            return None
+
+        if kind == 'regex':
+            match = param.match(text, position, end)
+            if match is None:
+                return None
+            return match.group(group), match.end()
+
+        if kind in ('rest', 'until'):
+            base = position + trigger_length
+            start = index.skip_separator(base, end)
+            if kind == 'rest':
+                # rest只会在正文为空时失败，直接向后查找句号，总扫描量与提取出的正文长度相当
+                dot = text.find('。', start, end)
+                if dot < 0:
+                    dot = end
+                if dot > start:
+                    return text[start:dot], dot
+                # 正文为空时正则会回溯，把前面的冒号或空白作为正文
+                return (text[start - 1:dot], dot) if start > base else None
+
+            # until可能在同一句内的多个触发词处反复失败，句号位置用二分查找
+            dot = index.next_char('。', start, end)
+            stops, stop_at_dot = param
+            # 正文至少一个字符，结束位置不能越过句号
+            stop = index.next_stop(stops, stop_at_dot, start + 1, min(dot, end), end)
+            if stop is not None:
+                return text[start:stop], stop
+            # 同上，回溯时正文为冒号或空白后紧跟结束词
+            for stop in range(start, base, -1):
+                if index.is_stop(stops, stop_at_dot, stop, end):
+                    return text[stop - 1:stop], stop
+            return None
+
+        if kind == 'enclosed':
+            close = index.next_char(param, position + trigger_length, end)
+            if close >= end:
+                return None
+            return text[position + trigger_length:close], close + 1
+
+        if kind == 'segment':
+            start = max(index.previous_char('。', position) + 1, begin)
+            stop = index.next_char('。', position, end)
+            return text[start:stop], stop
+
+        # word_suffix: 后缀所在连续词的起点，后缀前至少要有一个字符
+        start = max(index.word_start(position), begin)
+        if start == position:
+            return None
+        match = param.match(text, start, end)
+        return match.group(group), match.end()
+
+    def detect_content_keywords(self, text: str) -> Dict:
         """
-        提取批号信息
-        
+        拍照内容预检：一遍扫描判断文本中是否包含药品名称、用法、用量、有效期等关键词
+
         Args:
-            text: 完整文本
-            
+            text: OCR文本
+
         Returns:
-            str: 批号信息
+            Dict: found_keywords及has_drug_name, has_usage, has_dosage, has_expiry
         """
-        batch_patterns = [
-            r'批号[：:]?\s*([^。]+)',
-            r'生产批号[：:]?\s*([^。]+)',
-            r'产品批号[：:]?\s*([^。]+)'
-        ]
-
-        for pattern in batch_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-
-        return ""
+        found = self.keyword_automaton.find_categories(text)
+        summary = found.get('content_summary', ())
+        return {
+            'found_keywords': [keyword for keyword in dict.fromkeys(self.content_keywords['content_summary'])
+                               if keyword in summary],
+            'has_drug_name': 'content_drug_name' in found,
+            'has_usage': 'content_usage' in found,
+            'has_dosage': 'content_dosage' in found,
+            'has_expiry': 'content_expiry' in found
+        }
 
     def _calculate_confidence(self, ocr_result: Dict) -> float:
         """
@@ -431,3 +566,89 @@ class DrugInfoExtractor:
             return 0.5  # 默认中等置信度
         
         return min(total_confidence / valid_blocks, 1.0)
+
+
+class _TextIndex:
+    """
+    单次提取用的文本索引
+
+    句号、闭合括号的位置按需各扫描一次，结束词位置取自关键词自动机的命中，
+    规则通过二分查找定位，不会从每个触发词位置重新扫描到文本结尾。
+    """
+
+    def __init__(self, text: str, hits: List[tuple], stop_keywords: frozenset):
+        self.text = text
+        self._chars = {}
+        self._stops = {}
+        for position, keyword in hits:
+            if keyword in stop_keywords:
+                self._stops.setdefault(keyword, []).append(position)
+        self._word_run = (0, 0)
+
+    def _positions(self, char: str) -> List[int]:
+        positions = self._chars.get(char)
+        if positions is None:
+            positions = [match.start() for match in re.finditer(re.escape(char), self.text)]
+            self._chars[char] = positions
+        return positions
+
+    def next_char(self, char: str, start: int, end: int) -> int:
+        """start之后第一个char的位置，没有时返回end"""
+        positions = self._positions(char)
+        index = bisect.bisect_left(positions, start)
+        return min(positions[index], end) if index < len(positions) else end
+
+    def previous_char(self, char: str, position: int) -> int:
+        """position之前最后一个char的位置，没有时返回-1"""
+        positions = self._positions(char)
+        index = bisect.bisect_left(positions, position)
+        return positions[index - 1] if index else -1
+
+    def skip_separator(self, position: int, end: int) -> int:
+        """跳过触发词后的冒号和空白"""
+        if position < end and self.text[position] in '：:':
+            position += 1
+        return SPACE_PATTERN.match(self.text, position, end).end()
+
+    def is_stop(self, stops: tuple, stop_at_dot: bool, position: int, end: int) -> bool:
+        """position处是否为结束位置：文本结尾、句号或结束词"""
+        text = self.text
+        if position == end or (position == end - 1 and text[position] == '\n'):
+            return True
+        if stop_at_dot and position < end and text[position] == '。':
+            return True
+        return any(text.startswith(stop, position) and position + len(stop) <= end for stop in stops)
+
+    def next_stop(self, stops: tuple, stop_at_dot: bool, start: int, limit: int, end: int) -> Optional[int]:
+        """[start, limit]内最早的结束位置"""
+        best = None
+        for stop in stops:
+            positions = self._stops.get(stop, ())
+            index = bisect.bisect_left(positions, start)
+            while index < len(positions) and positions[index] + len(stop) > end:
+                index += 1
+            if index < len(positions) and positions[index] <= limit:
+                best = positions[index] if best is None else min(best, positions[index])
+
+        if stop_at_dot and limit < end and limit >= start:
+            best = limit if best is None else min(best, limit)
+        if best is None:
+            # 文本（段落）结尾，$也匹配结尾换行符之前的位置
+            if end - 1 >= start and end - 1 <= limit and self.text[end - 1] == '\n':
+                return end - 1
+            if limit == end and end >= start:
+                return end
+        return best
+
+    def word_start(self, position: int) -> int:
+        """position所在连续中英文数字词的起点（同一词内的后续查询直接复用）"""
+        run_start, run_end = self._word_run
+        if run_start <= position < run_end:
+            return run_start
+
+        text = self.text
+        start = position
+        while start > 0 and WORD_CHAR_PATTERN.match(text, start - 1):
+            start -= 1
+        self._word_run = (start, WORD_RUN_PATTERN.match(text, position).end())
+        return start
@@ -0,0 +1,404 @@
+"""
+药品知识库服务
+本地SQLite保存常用药品的用法、用量、禁忌等说明，按药名和生产企业全文检索，
+识别出药名后即可补全或核对OCR提取的字段，包装盒只拍到药名一面也能完整播报
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional
+
+from utils.lru_cache import TTLLRUCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 知识库字段
+RECORD_FIELDS = ('name', 'manufacturer', 'usage', 'dosage', 'contraindications',
+                 'side_effects', 'storage', 'approval_number')
+
+# 导入CSV时各字段可用的列名
+COLUMN_ALIASES = {
+    'name': ('name', '通用名称', '药品名称', '产品名称'),
+    'manufacturer': ('manufacturer', '生产企业', '生产厂家', '生产单位'),
+    'usage': ('usage', '用法'),
+    'dosage': ('dosage', '用量', '用法用量'),
+    'contraindications': ('contraindications', '禁忌', '禁忌症'),
+    'side_effects': ('side_effects', '不良反应'),
+    'storage': ('storage', '贮藏'),
+    'approval_number': ('approval_number', '批准文号')
+}
+
+# 可由知识库补全或核对的提取字段
+ENRICH_FIELDS = ('usage', 'dosage', 'contraindications')
+
+# 缓存中表示“知识库没有该药品”的占位值，避免反复查询未收录的药名
+_NOT_FOUND = {}
+
+
+def name_key(text: str) -> str:
+    """规范化名称（去空白、英文转小写），用于精确匹配"""
+    return ''.join((text or '').split()).lower()
+
+
+def bigrams(text: str) -> str:
+    """
+    把文本切为以空格分隔的二元组，作为FTS索引内容
+
+    中文没有词边界，FTS5默认分词器会把整串汉字当作一个词；
+    按二元组索引后部分匹配（OCR漏字、多字）也能检索到。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        str: 如 "阿莫 莫西 西林"
+    """
+    key = name_key(text)
+    if len(key) < 2:
+        return key
+    return ' '.join(key[index:index + 2] for index in range(len(key) - 1))
+
+
+def text_similarity(a: str, b: str) -> float:
+    """两段文本的相似度（0~1，忽略空白和英文大小写）"""
+    a, b = name_key(a), name_key(b)
+    if not a or not b:
+        return 0.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() == 0:
+        return 0.0
+    return matcher.ratio()
+
+
+class DrugKnowledgeBase:
+    """
+    药品知识库
+
+    drugs表保存药品说明，drugs_fts为药名、生产企业二元组的FTS5全文索引；
+    查询先按规范化药名精确匹配，未命中时全文检索并按相似度过滤。
+    常用药品的查询结果（含未收录的结果）保存在进程内LRU中，热点药品不再访问数据库。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化药品知识库
+
+        Args:
+            config: 配置字典，可包含db_path, seed_path（CSV，变化时重新导入）,
+                    cache_entries, cache_ttl, min_name_similarity
+        """
+        self.config = {
+            'db_path': 'tmp/drug_knowledge.db',
+            'seed_path': None,
+            'cache_entries': 1024,
+            'cache_ttl': 3600,
+            'min_name_similarity': 0.75    # 全文检索结果与药名的相似度下限（仅lookup使用，enrich只认精确匹配）
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._local = threading.local()
+        self._cache = TTLLRUCache(max_entries=self.config['cache_entries'], ttl=self.config['cache_ttl'])
+        self._stats = {'lookups': 0, 'exact': 0, 'fulltext': 0, 'not_found': 0, 'ambiguous': 0}
+
+        db_dir = os.path.dirname(os.path.abspath(self.config['db_path']))
+        os.makedirs(db_dir, exist_ok=True)
+        self.fts_enabled = self._create_schema()
+
+        if self.config['seed_path']:
+            self.import_seed(self.config['seed_path'])
+
+        logger.info(f"药品知识库初始化完成: {self.config['db_path']}, {self.count()}条药品, "
+                    f"全文索引={'开启' if self.fts_enabled else '不可用'}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """当前线程的数据库连接（每个线程复用一个连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.config['db_path'], timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> bool:
+        """建表；SQLite未编译FTS5时只做药名精确匹配"""
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS drugs ('
+            ' id INTEGER PRIMARY KEY,'
+            ' name TEXT NOT NULL,'
+            ' name_key TEXT NOT NULL,'
+            ' manufacturer TEXT,'
+            ' usage TEXT,'
+            ' dosage TEXT,'
+            ' contraindications TEXT,'
+            ' side_effects TEXT,'
+            ' storage TEXT,'
+            ' approval_number TEXT,'
+            ' updated_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_drugs_name_key ON drugs (name_key)')
+        conn.execute('CREATE TABLE IF NOT EXISTS kb_meta (key TEXT PRIMARY KEY, value TEXT)')
+        try:
+            conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS drugs_fts USING fts5(name, manufacturer)')
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite不支持FTS5，知识库仅按药名匹配: {str(e)}")
+            return False
+
+    def count(self) -> int:
+        """知识库药品条数"""
+        return self._connect().execute('SELECT COUNT(*) FROM drugs').fetchone()[0]
+
+    def import_seed(self, path: str) -> int:
+        """
+        从CSV导入药品知识（文件与上次导入相同时跳过）
+
+        Args:
+            path: CSV文件路径，表头按COLUMN_ALIASES识别
+
+        Returns:
+            int: 导入条数，跳过或失败时为0
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.warning(f"药品知识库导入文件不存在: {path}")
+            return 0
+
+        fingerprint = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        row = self._connect().execute("SELECT value FROM kb_meta WHERE key = 'seed'").fetchone()
+        if row and row[0] == fingerprint:
+            return 0
+
+        try:
+            records = self._read_csv(path, 'utf-8-sig')
+        except UnicodeDecodeError:
+            records = self._read_csv(path, 'gbk')
+
+        count = self.upsert(records, replace=True)
+        self._connect().execute("INSERT OR REPLACE INTO kb_meta (key, value) VALUES ('seed', ?)", (fingerprint,))
+        logger.info(f"药品知识库导入完成: {path}, {count}条")
+        return count
+
+    @staticmethod
+    def _read_csv(path: str, encoding: str) -> List[Dict]:
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            rows = csv.DictReader(f)
+            columns = {}
+            for field, aliases in COLUMN_ALIASES.items():
+                column = next((alias for alias in aliases if alias in (rows.fieldnames or ())), None)
+                if column:
+                    columns[field] = column
+            return [{field: (row.get(column) or '').strip() for field, column in columns.items()}
+                    for row in rows]
+
+    def upsert(self, records: Iterable[Dict], replace: bool = False) -> int:
+        """
+        写入药品知识
+
+        Args:
+            records: 记录列表，字段见RECORD_FIELDS，name必填
+            replace: 是否先清空知识库（整表导入）
+
+        Returns:
+            int: 写入条数
+        """
+        conn = self._connect()
+        now = time.time()
+        count = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if replace:
+                conn.execute('DELETE FROM drugs')
+                if self.fts_enabled:
+                    conn.execute('DELETE FROM drugs_fts')
+
+            for record in records:
+                name = (record.get('name') or '').strip()
+                if not name:
+                    continue
+                manufacturer = (record.get('manufacturer') or '').strip()
+                existing = conn.execute(
+                    'SELECT id FROM drugs WHERE name_key = ? AND IFNULL(manufacturer, \'\') = ?',
+                    (name_key(name), manufacturer)
+                ).fetchone()
+                values = [record.get(field) or None for field in RECORD_FIELDS[2:]]
+
+                if existing:
+                    drug_id = existing[0]
+                    conn.execute(
+                        'UPDATE drugs SET name = ?, usage = ?, dosage = ?, contraindications = ?, '
+                        'side_effects = ?, storage = ?, approval_number = ?, updated_at = ? WHERE id = ?',
+                        [name] + values + [now, drug_id]
+                    )
+                else:
+                    drug_id = conn.execute(
+                        'INSERT INTO drugs (name, name_key, manufacturer, usage, dosage, contraindications, '
+                        'side_effects, storage, approval_number, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [name, name_key(name), manufacturer or None] + values + [now]
+                    ).lastrowid
+
+                if self.fts_enabled:
+                    conn.execute('DELETE FROM drugs_fts WHERE rowid = ?', (drug_id,))
+                    conn.execute('INSERT INTO drugs_fts (rowid, name, manufacturer) VALUES (?, ?, ?)',
+                                 (drug_id, bigrams(name), bigrams(manufacturer)))
+                count += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._cache.clear()
+        return count
+
+    def lookup(self, name: str, manufacturer: str = None, approval_number: str = None,
+               exact: bool = False) -> Optional[Dict]:
+        """
+        查询药品知识
+
+        Args:
+            name: 药品名称
+            manufacturer: 生产企业（可选，同名药品有多个厂家时用于选择）
+            approval_number: 批准文号（可选，同名药品有多条记录时优先按其选择）
+            exact: 是否只接受规范化药名完全相同、且同名记录能唯一确定的结果
+                   （不做全文检索，同名多条且生产企业、批准文号都对不上时视为未收录）
+
+        Returns:
+            Dict: 知识库记录（RECORD_FIELDS及id），未收录时返回None
+        """
+        key = name_key(name)
+        if not key:
+            return None
+
+        self._stats['lookups'] += 1
+        cache_key = f"{key}|{name_key(manufacturer)}|{name_key(approval_number)}|{int(exact)}"
+        record = self._cache.get(cache_key)
+        if record is None:
+            record = self._query(key, manufacturer, approval_number, exact) or _NOT_FOUND
+            self._cache.set(cache_key, record)
+        if record is _NOT_FOUND:
+            self._stats['not_found'] += 1
+            return None
+        return dict(record)
+
+    def _query(self, key: str, manufacturer: str = None, approval_number: str = None,
+               exact: bool = False) -> Optional[Dict]:
+        """先精确匹配药名，再全文检索（exact时不检索）"""
+        conn = self._connect()
+        rows = conn.execute('SELECT * FROM drugs WHERE name_key = ?', (key,)).fetchall()
+        if rows:
+            if exact:
+                rows = self._disambiguate(rows, manufacturer, approval_number)
+                if len(rows) != 1:
+                    self._stats['ambiguous'] += 1
+                    return None
+            self._stats['exact'] += 1
+            return self._pick(rows, manufacturer)
+
+        if exact or not self.fts_enabled or len(key) < 2:
+            return None
+
+        # 药名二元组任一命中即为候选，按bm25取前若干条后再按相似度过滤
+        query = f'name : ({self._match_terms(key)})'
+        if manufacturer and len(name_key(manufacturer)) >= 2:
+            query = f'{query} OR manufacturer : ({self._match_terms(manufacturer)})'
+        rows = conn.execute(
+            'SELECT drugs.* FROM drugs_fts JOIN drugs ON drugs.id = drugs_fts.rowid '
+            'WHERE drugs_fts MATCH ? ORDER BY bm25(drugs_fts, 1.0, 0.3) LIMIT 20',
+            (query,)
+        ).fetchall()
+
+        similar = [row for row in rows if text_similarity(key, row['name']) >= self.config['min_name_similarity']]
+        if not similar:
+            return None
+        self._stats['fulltext'] += 1
+        best_similarity = max(text_similarity(key, row['name']) for row in similar)
+        return self._pick([row for row in similar if text_similarity(key, row['name']) == best_similarity],
+                          manufacturer)
+
+    @staticmethod
+    def _match_terms(text: str) -> str:
+        """FTS5查询：二元组逐个加引号后OR连接（引号本身不参与检索）"""
+        return ' OR '.join(f'"{gram}"' for gram in sorted(set(bigrams(text.replace('"', '')).split())))
+
+    @staticmethod
+    def _disambiguate(rows: List[sqlite3.Row], manufacturer: str = None,
+                      approval_number: str = None) -> List[sqlite3.Row]:
+        """同名多条记录时按批准文号、生产企业（规范化后完全相同）筛选；只有一条时原样返回"""
+        if len(rows) <= 1:
+            return rows
+        if name_key(approval_number):
+            matched = [row for row in rows if name_key(row['approval_number']) == name_key(approval_number)]
+            if matched:
+                return matched
+        if name_key(manufacturer):
+            return [row for row in rows if name_key(row['manufacturer']) == name_key(manufacturer)]
+        return rows
+
+    @staticmethod
+    def _pick(rows: List[sqlite3.Row], manufacturer: str = None) -> Dict:
+        """同名药品中取生产企业最接近的一条"""
+        if manufacturer and len(rows) > 1:
+            rows = sorted(rows, key=lambda row: -text_similarity(manufacturer, row['manufacturer'] or ''))
+        row = rows[0]
+        return {key: row[key] for key in ('id',) + RECORD_FIELDS}
+
+    def enrich(self, drug_info: Dict) -> Optional[Dict]:
+        """
+        用知识库补全并核对提取结果中的用法、用量、禁忌
+
+        只在规范化药名完全相同（同名多条时再按批准文号或生产企业唯一确定）时使用知识库记录：
+        OCR没有提取到的字段用知识库内容补全；OCR读到的内容一律保留，与知识库不同时记为冲突。
+        包装上印的剂量、规格才是这一盒药的真实信息，哪怕只差一个数字或单位也不能用知识库改写。
+
+        Args:
+            drug_info: extract_drug_info的结果，原地修改
+
+        Returns:
+            Dict: {'id', 'name', 'filled', 'conflicts'}，知识库未收录或无法唯一确定时返回None
+        """
+        record = self.lookup(drug_info.get('drug_name'), drug_info.get('manufacturer'),
+                             drug_info.get('approval_number'), exact=True)
+        if record is None:
+            return None
+
+        filled, conflicts = [], []
+        for field in ENRICH_FIELDS:
+            known = record.get(field)
+            if not known:
+                continue
+            value = (drug_info.get(field) or '').strip()
+            if not value:
+                drug_info[field] = known
+                filled.append(field)
+            elif name_key(value) != name_key(known):
+                conflicts.append(field)
+
+        return {
+            'id': record['id'],
+            'name': record['name'],
+            'filled': filled,
+            'conflicts': conflicts
+        }
+
+    def get_stats(self) -> Dict:
+        """
+        获取知识库统计信息
+
+        Returns:
+            Dict: 药品条数、查询次数及缓存命中统计
+        """
+        return {
+            'drugs': self.count(),
+            'fts_enabled': self.fts_enabled,
+            **self._stats,
+            'cache': self._cache.get_stats()
+        }
@@ -0,0 +1,427 @@
+"""
+药品名称词库服务
+从本地药品名录（如导出的注册批件列表）加载通用名/商品名，建立SymSpell删除索引，
+OCR识别出的含噪声药名在微秒级内校正为最接近的真实药品名称
+"""
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# CSV名录中按顺序尝试的名称列，都没有时取第一列
+NAME_COLUMNS = ('通用名称', '药品名称', '产品名称', 'name')
+
+INDEX_FILES = ('keys', 'ids', 'offsets', 'blob')
+
+# 构建中的临时目录名标记：<version>.building-<pid>-<tid>
+BUILDING_MARKER = '.building-'
+
+
+def normalize_name(name: str) -> str:
+    """
+    规范化药品名称（去空白、英文转小写）
+
+    Args:
+        name: 原始名称
+
+    Returns:
+        str: 规范化后的名称
+    """
+    return ''.join((name or '').split()).lower()
+
+
+def delete_variants(word: str, max_distance: int, prefix_length: int) -> set:
+    """
+    生成SymSpell删除变体：前prefix_length个字符删除0~max_distance个字符的所有结果
+
+    Args:
+        word: 规范化后的名称
+        max_distance: 最大删除字符数
+        prefix_length: 参与删除的前缀长度，限制长名称的变体数量
+
+    Returns:
+        set: 删除变体集合（含前缀本身）
+    """
+    prefix = word[:prefix_length]
+    variants = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        # 在上一轮结果上再删一个字符，集合去重避免重复展开
+        frontier = {variant[:index] + variant[index + 1:] for variant in frontier for index in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def variant_hash(variant: str) -> int:
+    """删除变体的稳定64位哈希（跨进程一致，可落盘）"""
+    return int.from_bytes(hashlib.blake2b(variant.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein编辑距离，超过limit时提前返回limit + 1
+
+    Args:
+        a, b: 待比较字符串
+        limit: 距离上限
+
+    Returns:
+        int: 编辑距离（超过上限时为limit + 1）
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class _LexiconIndex:
+    """
+    一个版本的只读索引
+
+    keys为删除变体哈希（升序uint64），ids为对应的名称编号；名称以UTF-8拼接在blob中，
+    offsets给出各名称的起止位置。四个数组都从.npy文件以内存映射方式打开，
+    多个进程共享同一份页缓存，加载几乎不花时间。
+    """
+
+    def __init__(self, directory: str, meta: Dict):
+        self.directory = directory
+        self.meta = meta
+        # np.asarray去掉memmap子类的额外开销，数据仍然映射自文件
+        self.keys, self.ids, self.offsets, self.blob = (
+            np.asarray(np.load(os.path.join(directory, f'{key}.npy'), mmap_mode='r'))
+            for key in INDEX_FILES
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def name(self, name_id: int) -> str:
+        start, end = int(self.offsets[name_id]), int(self.offsets[name_id + 1])
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+    def candidates(self, variants: Iterable[str]) -> set:
+        """删除变体哈希对应的全部候选名称编号（去重）"""
+        hashes = np.fromiter((variant_hash(variant) for variant in variants), dtype=np.uint64)
+        lower = np.searchsorted(self.keys, hashes, side='left')
+        upper = np.searchsorted(self.keys, hashes, side='right')
+        ranges = [(low, high) for low, high in zip(lower.tolist(), upper.tolist()) if high > low]
+        if not ranges:
+            return set()
+        return set(np.concatenate([self.ids[low:high] for low, high in ranges]).tolist())
+
+
+class DrugLexicon:
+    """
+    药品名称词库
+
+    名录文件每行一个名称（.txt），或为带表头的CSV（按NAME_COLUMNS取名称列）。
+    索引按名录文件的修改时间、大小和参数生成版本目录，重启时直接内存映射已有版本；
+    后台线程定期检查名录文件，变化时在后台构建新版本，构建完成后替换当前索引引用，
+    查询线程始终读取一个完整的快照，不会被重建阻塞。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化药品名称词库
+
+        Args:
+            config: 配置字典，可包含path, index_dir, max_distance, prefix_length,
+                    distance_ratio, reload_interval
+        """
+        self.config = {
+            'path': None,
+            'index_dir': 'tmp/lexicon',
+            'max_distance': 2,         # 最大编辑距离
+            'prefix_length': 7,        # 参与删除变体的前缀长度
+            'distance_ratio': 0.34,    # 允许的编辑距离不超过候选名称长度的该比例，短名称只做精确或单字纠错
+            'reload_interval': 60      # 名录文件检查间隔（秒），0表示不自动重载
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._index = None
+        self._build_lock = threading.Lock()
+        self._reloader_stop = threading.Event()
+        self._reloader_thread = None
+        self._stats = {'lookups': 0, 'matches': 0, 'corrections': 0, 'reloads': 0}
+
+        if self.config['path']:
+            self.reload()
+            if self.config['reload_interval'] > 0:
+                self.start_reloader()
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def _source_fingerprint(self) -> Optional[Dict]:
+        """名录文件指纹（修改时间、大小、索引参数），文件不存在时返回None"""
+        try:
+            stat = os.stat(self.config['path'])
+        except OSError:
+            return None
+        return {
+            'source': os.path.abspath(self.config['path']),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'max_distance': self.config['max_distance'],
+            'prefix_length': self.config['prefix_length']
+        }
+
+    @staticmethod
+    def _version_of(fingerprint: Dict) -> str:
+        return hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        名录文件有变化时重建并切换索引（在调用线程中执行，查询不受影响）
+
+        Args:
+            force: 即使名录未变化也重新加载
+
+        Returns:
+            bool: 是否切换到了新索引
+        """
+        with self._build_lock:
+            fingerprint = self._source_fingerprint()
+            if fingerprint is None:
+                logger.warning(f"药品名录文件不存在: {self.config['path']}")
+                return False
+
+            version = self._version_of(fingerprint)
+            current = self._index
+            if current is not None and current.meta['version'] == version and not force:
+                return False
+
+            try:
+                index = self._load_or_build(version, fingerprint)
+            except Exception as e:
+                logger.error(f"药品名称索引构建失败: {str(e)}")
+                return False
+
+            self._index = index
+            self._stats['reloads'] += 1
+            logger.info(f"药品名称索引已加载: version={version}, names={len(index)}")
+            self._remove_stale_versions(keep={version, current.meta['version'] if current else version})
+            return True
+
+    def _load_or_build(self, version: str, fingerprint: Dict) -> _LexiconIndex:
+        """内存映射已有版本，没有时构建到临时目录后原子改名"""
+        directory = os.path.join(self.config['index_dir'], version)
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return _LexiconIndex(directory, json.load(f))
+
+        start = time.time()
+        names = self._read_names(self.config['path'])
+        arrays = self._build_arrays(names)
+
+        os.makedirs(self.config['index_dir'], exist_ok=True)
+        # 构建目录名带本进程、本线程标识，只有构建者自己会删除它
+        building = f"{directory}{BUILDING_MARKER}{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(building, ignore_errors=True)
+        try:
+            os.makedirs(building)
+            for key in INDEX_FILES:
+                np.save(os.path.join(building, f'{key}.npy'), arrays[key])
+            meta = dict(fingerprint, version=version, names=len(names), built_at=time.time())
+            with open(os.path.join(building, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(building, directory)
+        except OSError:
+            # 其他进程已构建好同一版本（改名失败），或写入失败：都只清理自己的构建目录
+            shutil.rmtree(building, ignore_errors=True)
+            if not os.path.exists(meta_path):
+                raise
+
+        logger.info(f"药品名称索引构建完成: {len(names)}个名称, "
+                    f"{len(arrays['keys'])}个删除变体, 耗时{time.time() - start:.2f}s")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return _LexiconIndex(directory, json.load(f))
+
+    def _remove_stale_versions(self, keep: set):
+        """
+        清理旧版本目录（仍被内存映射的文件在部分系统上无法删除，忽略失败）
+
+        只删除已构建完成（含meta.json）的版本目录；其他进程正在写入的*.building-*目录
+        由各自的构建者清理，这里不动，多个进程同时重载时不会互相破坏。
+        """
+        index_dir = self.config['index_dir']
+        try:
+            entries = os.listdir(index_dir)
+        except OSError:
+            return
+        for entry in entries:
+            if entry in keep or BUILDING_MARKER in entry:
+                continue
+            path = os.path.join(index_dir, entry)
+            if os.path.isfile(os.path.join(path, 'meta.json')):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _read_names(path: str) -> List[str]:
+        """
+        读取名录文件中的名称（去重，保持首次出现顺序）
+
+        Args:
+            path: .txt（每行一个名称）或.csv文件路径
+
+        Returns:
+            List[str]: 名称列表
+        """
+        def read(encoding: str) -> List[str]:
+            with open(path, 'r', encoding=encoding, newline='') as f:
+                if not path.lower().endswith('.csv'):
+                    return [line.strip() for line in f]
+                rows = csv.reader(f)
+                header = next(rows, [])
+                header = [column.strip() for column in header]
+                column = next((header.index(name) for name in NAME_COLUMNS if name in header), None)
+                if column is None:
+                    # 没有可识别的表头时第一行也是数据
+                    return [header[0] if header else ''] + [row[0] for row in rows if row]
+                return [row[column] for row in rows if len(row) > column]
+
+        try:
+            raw_names = read('utf-8-sig')
+        except UnicodeDecodeError:
+            # 从国内系统导出的名录常为GBK编码
+            raw_names = read('gbk')
+
+        names = {}
+        for name in raw_names:
+            name = name.strip()
+            if name and normalize_name(name) not in names:
+                names[normalize_name(name)] = name
+        return list(names.values())
+
+    def _build_arrays(self, names: List[str]) -> Dict[str, np.ndarray]:
+        """构建删除变体哈希表和名称存储"""
+        keys, ids = [], []
+        for name_id, name in enumerate(names):
+            for variant in delete_variants(normalize_name(name), self.config['max_distance'],
+                                           self.config['prefix_length']):
+                keys.append(variant_hash(variant))
+                ids.append(name_id)
+
+        keys = np.array(keys, dtype=np.uint64)
+        ids = np.array(ids, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+
+        encoded = [name.encode('utf-8') for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+
+        return {
+            'keys': keys[order],
+            'ids': ids[order],
+            'offsets': offsets,
+            'blob': np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        }
+
+    def lookup(self, candidate: str) -> Optional[Dict]:
+        """
+        查找与候选名称最接近的真实药品名称
+
+        Args:
+            candidate: OCR提取的药品名称
+
+        Returns:
+            Dict: {'name': 名录中的名称, 'distance': 编辑距离, 'candidate': 原候选名称}，
+                  词库未加载或没有足够接近的名称时返回None
+        """
+        index = self._index
+        query = normalize_name(candidate)
+        if index is None or not query:
+            return None
+
+        self._stats['lookups'] += 1
+        max_distance = min(self.config['max_distance'], int(len(query) * self.config['distance_ratio']))
+        variants = delete_variants(query, max_distance, self.config['prefix_length'])
+
+        best = None
+        for name_id in index.candidates(variants):
+            name = index.name(name_id)
+            distance = edit_distance(query, normalize_name(name), max_distance if best is None else best[0])
+            if distance > max_distance:
+                continue
+            # 距离相同时取长度更接近的名称
+            rank = (distance, abs(len(name) - len(candidate)), name)
+            if best is None or rank < best:
+                best = rank
+
+        if best is None:
+            return None
+
+        self._stats['matches'] += 1
+        if best[0] > 0:
+            self._stats['corrections'] += 1
+        return {'name': best[2], 'distance': best[0], 'candidate': candidate}
+
+    def start_reloader(self):
+        """启动后台热加载线程"""
+        if self._reloader_thread and self._reloader_thread.is_alive():
+            return
+
+        self._reloader_stop.clear()
+        self._reloader_thread = threading.Thread(
+            target=self._reloader_loop,
+            name='drug-lexicon-reloader',
+            daemon=True
+        )
+        self._reloader_thread.start()
+
+    def stop_reloader(self):
+        """停止后台热加载线程"""
+        self._reloader_stop.set()
+        if self._reloader_thread:
+            self._reloader_thread.join(timeout=5)
+            self._reloader_thread = None
+
+    def _reloader_loop(self):
+        """定期检查名录文件，变化时重建索引"""
+        while not self._reloader_stop.wait(self.config['reload_interval']):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"药品名称索引热加载异常: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """
+        获取词库统计信息
+
+        Returns:
+            Dict: 名称数、索引版本及查询/纠错次数
+        """
+        index = self._index
+        return {
+            'loaded': index is not None,
+            'names': len(index) if index is not None else 0,
+            'variants': len(index.keys) if index is not None else 0,
+            'version': index.meta['version'] if index is not None else None,
+            'built_at': index.meta['built_at'] if index is not None else None,
+            **self._stats
+        }
@@ -0,0 +1,145 @@
+"""
+近重复帧索引
+按客户端保存最近若干帧的感知哈希，自动拍摄时相邻帧可直接复用上一次的分析/识别结果
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    计算两个64位指纹的汉明距离
+
+    Args:
+        a: 指纹A
+        b: 指纹B
+
+    Returns:
+        int: 不同的比特数
+    """
+    return bin(a ^ b).count('1')
+
+
+class RecentFrameIndex:
+    """
+    按客户端划分的近期帧指纹索引
+
+    每个客户端保留最近history_size帧，每帧记录指纹、时间和各类结果
+    （如'analysis'、'ocr'），汉明距离不超过阈值且未过期即视为同一画面。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化帧索引
+
+        Args:
+            config: 配置字典，可包含threshold, max_age, history_size, max_clients
+        """
+        self.config = {
+            'threshold': 6,          # 64位dHash允许的最大汉明距离
+            'max_age': 10,           # 结果复用的最长时间（秒）
+            'history_size': 8,       # 每个客户端保留的帧数
+            'max_clients': 1024      # 最多跟踪的客户端数
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        logger.info(f"近重复帧索引初始化完成: threshold={self.config['threshold']}")
+
+    def lookup(self, client_id: str, fingerprint: int, kind: str) -> Optional[Dict]:
+        """
+        查找与当前帧近似的历史结果
+
+        Args:
+            client_id: 客户端标识
+            fingerprint: 当前帧指纹
+            kind: 结果类型，如'analysis'或'ocr'
+
+        Returns:
+            Dict: {'result': 结果, 'distance': 汉明距离, 'age': 距今秒数}，未找到返回None
+        """
+        now = time.monotonic()
+        best = None
+
+        with self._lock:
+            frames = self._clients.get(client_id)
+            if frames:
+                self._clients.move_to_end(client_id)
+                for frame in reversed(frames):
+                    age = now - frame['time']
+                    if age > self.config['max_age'] or kind not in frame['results']:
+                        continue
+                    distance = hamming_distance(fingerprint, frame['fingerprint'])
+                    if distance <= self.config['threshold'] and (best is None or distance < best['distance']):
+                        best = {
+                            'result': frame['results'][kind],
+                            'distance': distance,
+                            'age': round(age, 3)
+                        }
+
+            if best:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return best
+
+    def record(self, client_id: str, fingerprint: int, kind: str, result: Any):
+        """
+        记录当前帧的结果
+
+        Args:
+            client_id: 客户端标识
+            fingerprint: 当前帧指纹
+            kind: 结果类型
+            result: 结果数据
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            frames = self._clients.get(client_id)
+            if frames is None:
+                frames = deque(maxlen=self.config['history_size'])
+                self._clients[client_id] = frames
+                while len(self._clients) > self.config['max_clients']:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(client_id)
+
+            # 同一指纹的帧合并结果，避免重复占用历史位
+            for frame in frames:
+                if frame['fingerprint'] == fingerprint:
+                    frame['results'][kind] = result
+                    frame['time'] = now
+                    return
+
+            frames.append({'fingerprint': fingerprint, 'time': now, 'results': {kind: result}})
+
+    def get_stats(self) -> Dict:
+        """
+        获取索引统计信息
+
+        Returns:
+            Dict: 客户端数与复用命中率
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'clients': len(self._clients),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'threshold': self.config['threshold']
+            }
@@ -6,14 +6,86 @@
 import cv2
 import numpy as np
 import os
+import atexit
 import base64
 import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 from typing import Optional, Tuple
+from services.payload_encoder import PayloadEncoder
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# JPEG缩小解码标志：按1/2、1/4、1/8比例在DCT阶段直接缩小
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+# 完整预处理模式下依次执行的增强阶段
+FULL_STAGES = ('clahe', 'denoise', 'sharpen')
+
+# Immerkær快速噪声估计卷积核
+NOISE_KERNEL = np.array([[1, -2, 1],
+                         [-2, 4, -2],
+                         [1, -2, 1]], dtype=np.float32)
+
+# 锐化卷积核（只读，各线程共享）
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1,  9, -1],
+                           [-1, -1, -1]], dtype=np.float32)
+
+# 携带图像尺寸的JPEG SOF标记（排除DHT/JPG/DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class _Workspace:
+    """
+    一组预处理可复用对象：CLAHE和按用途复用的缓冲区
+
+    CLAHE对象不是线程安全的，工作区同一时刻只借给一个请求。缓冲区按用途各保留一块一维底层数组，
+    容量按bucket_bytes向上取整，尺寸不超过容量的帧直接取其前缀视图，
+    裁剪后每帧尺寸都不同也能复用，且每个工作区的内存不超过最大帧所需。
+    """
+
+    def __init__(self, config: dict):
+        self.clahe = cv2.createCLAHE(
+            clipLimit=config['clahe_clip_limit'],
+            tileGridSize=config['clahe_tile_size']
+        )
+        self.bucket_bytes = max(int(config['buffer_bucket_bytes']), 1)
+        self.buffers = {}
+
+    def buffer(self, shape: tuple, name: str) -> np.ndarray:
+        """
+        获取指定形状的uint8缓冲区（底层数组容量不足时按桶大小扩容）
+
+        Args:
+            shape: 缓冲区形状
+            name: 缓冲区用途（同一次处理中区分不同阶段）
+
+        Returns:
+            np.ndarray: 可被覆盖写入的C连续缓冲区
+        """
+        size = int(np.prod(shape))
+        backing = self.buffers.get(name)
+        if backing is None or backing.size < size:
+            capacity = -(-size // self.bucket_bytes) * self.bucket_bytes
+            backing = np.empty(capacity, dtype=np.uint8)
+            self.buffers[name] = backing
+        return backing[:size].reshape(shape)
+
 
 class ImageProcessor:
     """图像处理服务类"""
@@ -33,15 +105,68 @@ class ImageProcessor:
             'clahe_tile_size': (8, 8),
             'upload_folder': 'tmp',
             'max_file_size': 16 * 1024 * 1024,  # 16MB
-            'allowed_extensions': {'.png', '.jpg', '.jpeg', '.bmp'}
+            'allowed_extensions': {'.png', '.jpg', '.jpeg', '.bmp'},
+            'output_format': '.jpg',             # 内存流水线的编码格式
+            'debug_save': False,                 # 调试时将原图和处理结果落盘
+            'reduced_decode': True,              # 超大JPEG按1/2、1/4、1/8缩小解码
+            'full_decode_ms_per_mp': 8.0,        # 全尺寸解码耗时初始估计（毫秒/百万像素）
+            'workspace_pool_size': 4,            # 保留的预处理工作区（CLAHE+缓冲区）数量，超出的并发请求临时创建
+            'buffer_bucket_bytes': 256 * 1024,   # 工作区缓冲区容量按该大小向上取整
+            'preprocess_mode': 'full',           # full: 全部阶段; adaptive: 按图像统计选择阶段
+            'preprocess_backend': 'thread',      # thread: 请求线程内处理; process: 进程池 + 共享内存
+            'preprocess_workers': 0,             # 进程池工作进程数，0表示按可用核数自动确定
+            'preprocess_task_timeout': 30,       # 进程池单帧处理超时（秒）
+            'analysis_max_side': 1024,           # 拍照分析工作图的最长边
+            'analysis_jpeg_quality': 90,         # 拍照分析内容预检OCR图片的JPEG质量
+            'stats_max_side': 512,               # 统计图像指标时的工作图最长边
+            'crop_text_region': True,            # OCR前裁剪到标签/文字区域（必要时透视校正）
+            'crop_work_side': 800,               # 定位文字区域的工作图最长边
+            'crop_min_quad_ratio': 0.2,          # 标签/盒面四边形占画面面积下限
+            'crop_max_area_ratio': 0.85,         # 区域超过画面该比例时不裁剪（节省有限）
+            'crop_min_text_lines': 2,            # 按文字行聚类裁剪所需的最少文字行
+            'crop_min_cluster_ratio': 0.02,      # 文字面积不低于全部文字该比例的簇都保留在裁剪区域内
+            'encode_budget_bytes': 200 * 1024,   # OCR上传图片的体积预算（Base64编码后），0表示不限制
+            'encode_min_quality': 60,            # 按预算编码时的JPEG质量下限
+            'encode_min_text_height': 16,        # 按预算缩小时文字高度下限（像素）
+            'adaptive_thresholds': {
+                'min_brightness': 70,            # 平均亮度低于该值需要增强对比度
+                'min_contrast': 25,              # 灰度标准差低于该值需要增强对比度
+                'min_dynamic_range': 140,        # 2%~98%分位灰度差低于该值需要增强对比度（含过曝）
+                'max_noise': 3.0,                # 噪声标准差估计高于该值需要降噪
+                'min_sharpness': 4000            # 工作图拉普拉斯方差低于该值需要锐化
+            }
         }
         
         # 合并用户配置
         if config:
+            thresholds = {**self.config['adaptive_thresholds'], **config.get('adaptive_thresholds', {})}
             self.config.update(config)
+            self.config['adaptive_thresholds'] = thresholds
         
         # 确保上传目录存在
         self._ensure_upload_folder()
+
+        # 全尺寸解码速度（毫秒/百万像素）的滑动平均，用于估算缩小解码节省的时间
+        self._decode_rate_lock = threading.Lock()
+        self._full_decode_ms_per_mp = self.config['full_decode_ms_per_mp']
+
+        # 预处理工作区池：请求线程按需借出、用完归还，Flask每个请求一个新线程也能复用
+        self._workspaces = []
+        self._workspace_lock = threading.Lock()
+        self._workspace_stats = {'checkouts': 0, 'reused': 0, 'created': 0, 'discarded': 0}
+
+        # OCR上传图片按体积预算编码
+        self.payload_encoder = None
+        if self.config['encode_budget_bytes']:
+            self.payload_encoder = PayloadEncoder({
+                'budget_bytes': self.config['encode_budget_bytes'],
+                'min_quality': self.config['encode_min_quality'],
+                'min_text_height': self.config['encode_min_text_height']
+            })
+
+        # 进程池后端在首次预处理时启动
+        self._preprocess_pool = None
+        self._pool_lock = threading.Lock()
         
         logger.info("图像处理器初始化完成")
 
@@ -135,6 +260,898 @@ class ImageProcessor:
             logger.error(f"保存Base64图片异常: {str(e)}")
             return None
 
+    def read_image_bytes(self, image_file) -> Optional[bytes]:
+        """
+        读取上传图片的字节数据（不落盘）
+
+        Args:
+            image_file: 上传的图片文件
+
+        Returns:
+            bytes: 图片数据，失败返回None
+        """
+        try:
+            image_bytes = image_file.read()
+
+            if not image_bytes:
+                logger.error("上传图片为空")
+                return None
+
+            if len(image_bytes) > self.config['max_file_size']:
+                logger.warning(f"文件过大: {len(image_bytes)} bytes")
+                return None
+
+            return image_bytes
+
+        except Exception as e:
+            logger.error(f"读取上传图片异常: {str(e)}")
+            return None
+
+    def decode_base64_image(self, image_base64: str) -> Optional[bytes]:
+        """
+        解码Base64图片数据（不落盘）
+
+        Args:
+            image_base64: Base64编码的图片数据
+
+        Returns:
+            bytes: 图片数据，失败返回None
+        """
+        try:
+            # 移除data:image前缀（如果存在）
+            if ',' in image_base64:
+                image_base64 = image_base64.split(',')[1]
+
+            image_bytes = base64.b64decode(image_base64)
+
+            if not image_bytes or len(image_bytes) > self.config['max_file_size']:
+                logger.warning(f"Base64图片大小无效: {len(image_bytes)} bytes")
+                return None
+
+            return image_bytes
+
+        except Exception as e:
+            logger.error(f"解码Base64图片异常: {str(e)}")
+            return None
+
+    def decode_image(self, image_bytes: bytes, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+        """
+        从内存字节解码图像
+
+        Args:
+            image_bytes: 编码后的图片字节
+            flags: cv2.imdecode解码标志
+
+        Returns:
+            np.ndarray: 图像，解码失败返回None
+        """
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        return cv2.imdecode(buffer, flags)
+
+    def encode_image(self, img: np.ndarray, ext: str = None, params: list = None) -> Optional[bytes]:
+        """
+        将图像编码为字节
+
+        Args:
+            img: 图像
+            ext: 编码格式扩展名，默认使用output_format
+            params: cv2.imencode编码参数，如[cv2.IMWRITE_JPEG_QUALITY, 90]
+
+        Returns:
+            bytes: 编码后的字节，失败返回None
+        """
+        success, encoded = cv2.imencode(ext or self.config['output_format'], img, params or [])
+        return encoded.tobytes() if success else None
+
+    def encode_for_ocr(self, img: np.ndarray, report: dict = None) -> Optional[bytes]:
+        """
+        编码OCR上传图片：启用体积预算时按预算选择格式、质量和尺寸，否则按output_format默认参数编码
+
+        Args:
+            img: 预处理后的灰度图像
+            report: 可选字典，写入编码信息（见PayloadEncoder.encode），实际尺寸写入size
+
+        Returns:
+            bytes: 编码后的字节，失败返回None
+        """
+        report = report if report is not None else {}
+        if self.payload_encoder is not None:
+            return self.payload_encoder.encode(img, report)
+
+        encoded = self.encode_image(img)
+        report['size'] = [img.shape[1], img.shape[0]]
+        return encoded
+
+    def get_workspace_stats(self) -> dict:
+        """
+        获取预处理工作区池统计信息
+
+        Returns:
+            dict: 借出、复用、新建、丢弃次数及空闲工作区数
+        """
+        with self._workspace_lock:
+            return {**self._workspace_stats, 'idle': len(self._workspaces),
+                    'pool_size': self.config['workspace_pool_size']}
+
+    def get_payload_encoder_stats(self) -> Optional[dict]:
+        """
+        获取上传图片编码统计信息
+
+        Returns:
+            dict: 编码统计，未启用体积预算返回None
+        """
+        return self.payload_encoder.get_stats() if self.payload_encoder else None
+
+    def preprocess_image_bytes(self, image_bytes: bytes, report: dict = None) -> Optional[bytes]:
+        """
+        内存图像预处理：imdecode -> numpy预处理 -> imencode，全程不落盘
+
+        Args:
+            image_bytes: 原始图片字节
+            report: 可选字典，写入各阶段耗时(timings_ms)和解码信息(decode)
+
+        Returns:
+            bytes: 处理后的图片字节，失败返回None
+        """
+        report = report if report is not None else {}
+        timings = report.setdefault('timings_ms', {})
+
+        try:
+            start = time.perf_counter()
+            img, decode_info = self.decode_for_processing(image_bytes)
+            timings['decode'] = round((time.perf_counter() - start) * 1000, 2)
+            if img is None:
+                logger.warning("无法解码图片数据")
+                return None
+
+            decode_info.update(self._estimate_decode_saving(decode_info, timings['decode']))
+            report['decode'] = decode_info
+            logger.info(
+                f"原始图片尺寸: {decode_info['source_size'][0]}x{decode_info['source_size'][1]}, "
+                f"解码比例: 1/{decode_info['scale']}"
+            )
+
+            # 裁剪到标签/文字区域，只上传文字部分
+            region = None
+            if self.config['crop_text_region']:
+                start = time.perf_counter()
+                img, region = self.crop_text_region(img)
+                timings['crop'] = self._elapsed_ms(start)
+
+            start = time.perf_counter()
+            # 结果立即编码，输出使用池化缓冲区或进程池的共享内存
+            with self._preprocessed(img, report) as processed:
+                timings['preprocess'] = round((time.perf_counter() - start) * 1000, 2)
+
+                # 按体积预算编码，可能缩小尺寸：OCR坐标以实际编码尺寸为准
+                start = time.perf_counter()
+                encoding = report.setdefault('encoding', {})
+                processed_bytes = self.encode_for_ocr(processed, encoding)
+                timings['encode'] = round((time.perf_counter() - start) * 1000, 2)
+
+            if processed_bytes is None:
+                logger.error("编码处理后的图片失败")
+                return None
+            if region is not None:
+                report['crop'] = self._crop_report(region, img, tuple(encoding['size']), decode_info)
+
+            logger.info(
+                f"内存图像预处理完成, 输出大小: {len(processed_bytes)} 字节, "
+                f"节省: {encoding.get('bytes_saved', 0)} 字节(Base64)"
+            )
+
+            if self.config['debug_save']:
+                self._save_debug_images(image_bytes, processed_bytes)
+
+            return processed_bytes
+
+        except Exception as e:
+            logger.error(f"内存图像预处理失败: {str(e)}")
+            return None
+
+    def crop_text_region(self, img: np.ndarray) -> Tuple[np.ndarray, Optional[dict]]:
+        """
+        定位标签/文字区域并裁剪
+
+        1. 边缘轮廓中面积足够大的凸四边形视为标签或盒面，透视校正为正视矩形；
+        2. 否则按文字行聚类，取文字面积最大的一簇的外接框（留出一行高的边距）；
+        3. 区域接近整幅画面时不裁剪。
+
+        Args:
+            img: 解码后的图像
+
+        Returns:
+            Tuple[np.ndarray, dict]: (裁剪后的图像, 区域信息{'method', 'matrix', 'region', 'area_ratio'})，
+                                     不裁剪时返回(原图, None)；matrix把裁剪图坐标映射回解码图坐标
+        """
+        height, width = img.shape[:2]
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        scale = min(self.config['crop_work_side'] / max(height, width), 1.0)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+
+        quad = self._find_label_quad(gray)
+        if quad is not None:
+            quad = quad / scale
+            top_width = np.linalg.norm(quad[1] - quad[0])
+            bottom_width = np.linalg.norm(quad[2] - quad[3])
+            left_height = np.linalg.norm(quad[3] - quad[0])
+            right_height = np.linalg.norm(quad[2] - quad[1])
+            out_width, out_height = int(max(top_width, bottom_width)), int(max(left_height, right_height))
+            area_ratio = cv2.contourArea(quad.astype(np.float32)) / float(width * height)
+            if out_width > 0 and out_height > 0 and area_ratio < self.config['crop_max_area_ratio']:
+                target = np.array([[0, 0], [out_width - 1, 0], [out_width - 1, out_height - 1],
+                                   [0, out_height - 1]], dtype=np.float32)
+                transform = cv2.getPerspectiveTransform(quad.astype(np.float32), target)
+                warped = cv2.warpPerspective(img, transform, (out_width, out_height),
+                                             flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+                return warped, {
+                    'method': 'perspective',
+                    'matrix': np.linalg.inv(transform),
+                    'region': quad,
+                    'area_ratio': area_ratio
+                }
+
+        box = self._find_text_box(gray)
+        if box is not None:
+            x, y, box_width, box_height = (np.array(box) / scale).astype(int)
+            x, y = max(x, 0), max(y, 0)
+            box_width, box_height = min(box_width, width - x), min(box_height, height - y)
+            area_ratio = box_width * box_height / float(width * height)
+            if box_width > 0 and box_height > 0 and area_ratio < self.config['crop_max_area_ratio']:
+                return np.ascontiguousarray(img[y:y + box_height, x:x + box_width]), {
+                    'method': 'text_box',
+                    'matrix': np.array([[1, 0, x], [0, 1, y], [0, 0, 1]], dtype=np.float64),
+                    'region': np.array([[x, y], [x + box_width, y], [x + box_width, y + box_height],
+                                        [x, y + box_height]], dtype=np.float64),
+                    'area_ratio': area_ratio
+                }
+
+        return img, None
+
+    def _find_label_quad(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        找出标签/盒面的四边形
+
+        Returns:
+            np.ndarray: (4, 2) 顶点，按左上、右上、右下、左下排列；找不到返回None
+        """
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), dtype=np.uint8))
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        frame_area = float(gray.shape[0] * gray.shape[1])
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            area = cv2.contourArea(contour)
+            if area < frame_area * self.config['crop_min_quad_ratio']:
+                break
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4 and cv2.isContourConvex(approx):
+                points = approx.reshape(4, 2).astype(np.float64)
+                # 左上点x+y最小、右下点最大；右上点y-x最小、左下点最大
+                sums, diffs = points.sum(axis=1), np.diff(points, axis=1).ravel()
+                return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                                 points[np.argmax(sums)], points[np.argmax(diffs)]])
+        return None
+
+    def _find_text_box(self, gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        按文字行聚类找出文字区域
+
+        形态学梯度 + Otsu阈值得到笔画边缘，水平闭运算连成文字行；文字行按中位行高膨胀后
+        连通的归为一簇。单独印刷的批号/有效期往往自成一簇，所以取所有文字面积不低于
+        crop_min_cluster_ratio的簇的并集，只去掉零星的噪点簇。
+
+        Returns:
+            Tuple[int, int, int, int]: 工作图上的 (x, y, 宽, 高)，文字行不足时返回None
+        """
+        height, width = gray.shape[:2]
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT,
+                                    cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        joined = cv2.morphologyEx(binary, cv2.MORPH_CLOSE,
+                                  cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 60, 3), 1)))
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(joined)
+        boxes = stats[1:, :4]
+        line_height = boxes[:, 3]
+        lines = boxes[(line_height >= 5) & (line_height <= height * 0.2) &
+                      (boxes[:, 2] >= boxes[:, 3] * 1.5)]
+        if len(lines) < self.config['crop_min_text_lines']:
+            return None
+
+        # 文字行膨胀后连通的归为一簇
+        median_height = int(np.median(lines[:, 3]))
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for x, y, box_width, box_height in lines:
+            mask[y:y + box_height, x:x + box_width] = 255
+        mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (median_height * 3, median_height * 2)))
+        _, labels, _, _ = cv2.connectedComponentsWithStats(mask)
+
+        centers_x = lines[:, 0] + lines[:, 2] // 2
+        centers_y = lines[:, 1] + lines[:, 3] // 2
+        cluster = labels[centers_y, centers_x]
+        text_area = np.bincount(cluster, weights=lines[:, 2] * lines[:, 3])
+        kept = text_area >= text_area.sum() * self.config['crop_min_cluster_ratio']
+        members = lines[kept[cluster]]
+
+        margin = median_height
+        left = max(int(members[:, 0].min()) - margin, 0)
+        top = max(int(members[:, 1].min()) - margin, 0)
+        right = min(int((members[:, 0] + members[:, 2]).max()) + margin, width)
+        bottom = min(int((members[:, 1] + members[:, 3]).max()) + margin, height)
+        return left, top, right - left, bottom - top
+
+    @staticmethod
+    def _crop_report(region: dict, cropped: np.ndarray, output_size: Tuple[int, int], decode_info: dict) -> dict:
+        """
+        生成裁剪几何信息，to_frame把OCR坐标（预处理输出图）映射回原始照片坐标
+
+        坐标链：OCR输出图 -缩放-> 裁剪图 -matrix-> 解码图 -缩小解码比例-> 原始照片
+
+        解码图到原始照片只差缩小解码比例（各向同性）。不能用文件头尺寸/解码尺寸换算：
+        文件头尺寸是EXIF旋转前的方向，竖拍照片解码后宽高互换，两轴比例会错位。
+        """
+        to_crop = np.diag([cropped.shape[1] / output_size[0], cropped.shape[0] / output_size[1], 1.0])
+        scale = float(decode_info['scale'])
+        to_source = np.diag([scale, scale, 1.0])
+        to_frame = to_source @ region['matrix'] @ to_crop
+
+        region_points = region['region'] * scale
+        return {
+            'method': region['method'],
+            'region': np.round(region_points).astype(int).tolist(),
+            'area_ratio': round(float(region['area_ratio']), 4),
+            'output_size': list(output_size),
+            'to_frame': to_frame.tolist()
+        }
+
+    @staticmethod
+    def map_blocks_to_frame(text_blocks: list, crop: Optional[dict]) -> list:
+        """
+        把OCR文本块位置映射回原始照片坐标
+
+        Args:
+            text_blocks: OCR文本块列表（location为OCR图片坐标）
+            crop: preprocess_image_bytes报告中的crop信息，为空时原样返回
+
+        Returns:
+            list: 文本块副本，带位置信息的块增加frame_location（原始照片中的外接框）
+        """
+        if not crop:
+            return text_blocks
+
+        matrix = np.array(crop['to_frame'], dtype=np.float64)
+        mapped = []
+        for block in text_blocks:
+            location = block.get('location')
+            block = dict(block)
+            if location:
+                left, top = location['left'], location['top']
+                right, bottom = left + location['width'], top + location['height']
+                corners = np.array([[[left, top], [right, top], [right, bottom], [left, bottom]]],
+                                   dtype=np.float64)
+                points = cv2.perspectiveTransform(corners, matrix)[0]
+                x_min, y_min = points.min(axis=0)
+                x_max, y_max = points.max(axis=0)
+                block['frame_location'] = {
+                    'left': int(round(x_min)),
+                    'top': int(round(y_min)),
+                    'width': int(round(x_max - x_min)),
+                    'height': int(round(y_max - y_min))
+                }
+            mapped.append(block)
+        return mapped
+
+    def decode_for_processing(self, image_bytes: bytes, grayscale: bool = False,
+                              max_size: Tuple[int, int] = None) -> Tuple[Optional[np.ndarray], dict]:
+        """
+        按处理目标尺寸解码图片
+
+        对远大于目标尺寸的JPEG，先读取文件头中的尺寸，再以1/2、1/4或1/8比例
+        直接缩小解码，避免先完整解码上千万像素再缩放。
+
+        Args:
+            image_bytes: 原始图片字节
+            grayscale: 是否直接解码为灰度图
+            max_size: 目标尺寸(宽, 高)上限，默认使用max_width/max_height
+
+        Returns:
+            Tuple[np.ndarray, dict]: (图像, 解码信息)，解码失败时图像为None
+        """
+        header_size = self._read_jpeg_size(image_bytes) if self.config['reduced_decode'] else None
+        scale = self._choose_decode_scale(*header_size, max_size=max_size) if header_size else 1
+
+        reduced_flags = REDUCED_GRAYSCALE_FLAGS if grayscale else REDUCED_DECODE_FLAGS
+        full_flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+
+        img = None
+        if scale > 1:
+            flag = dict(reduced_flags)[scale]
+            img = self.decode_image(image_bytes, flag)
+            if img is None:
+                scale = 1
+
+        if img is None:
+            img = self.decode_image(image_bytes, full_flag)
+
+        if img is None:
+            return None, {}
+
+        decoded_height, decoded_width = img.shape[:2]
+        source_size = (self._orient_source_size(header_size, (decoded_width, decoded_height), scale)
+                       if header_size else [decoded_width, decoded_height])
+        return img, {
+            'scale': scale,
+            'source_size': source_size,
+            'decoded_size': [decoded_width, decoded_height]
+        }
+
+    @staticmethod
+    def _orient_source_size(header_size: Tuple[int, int], decoded_size: Tuple[int, int], scale: int) -> list:
+        """
+        把文件头中的原图尺寸换成解码后的方向
+
+        文件头记录的是EXIF旋转前的宽高，imdecode会按EXIF方向旋转（竖拍照片宽高互换）；
+        按缩小比例还原的解码尺寸与哪种方向更接近，就取哪种。
+
+        Args:
+            header_size: 文件头中的(宽, 高)
+            decoded_size: 解码后的(宽, 高)
+            scale: 缩小解码比例
+
+        Returns:
+            list: 与解码图方向一致的[宽, 高]
+        """
+        width, height = header_size
+        decoded_width, decoded_height = decoded_size[0] * scale, decoded_size[1] * scale
+        same = abs(decoded_width - width) + abs(decoded_height - height)
+        swapped = abs(decoded_width - height) + abs(decoded_height - width)
+        return [height, width] if swapped < same else [width, height]
+
+    def _choose_decode_scale(self, width: int, height: int, max_size: Tuple[int, int] = None) -> int:
+        """
+        选择不损失最终分辨率的最大缩小解码比例
+
+        Args:
+            width: 原图宽度
+            height: 原图高度
+            max_size: 目标尺寸(宽, 高)上限，默认使用max_width/max_height
+
+        Returns:
+            int: 缩小比例（1、2、4或8）
+        """
+        max_width, max_height = max_size or (self.config['max_width'], self.config['max_height'])
+
+        # EXIF旋转后宽高可能互换，取两种方向中较保守的缩放
+        target_scale = max(
+            min(max_width / width, max_height / height),
+            min(max_width / height, max_height / width)
+        )
+
+        for scale, _ in REDUCED_DECODE_FLAGS:
+            if scale * target_scale <= 1:
+                return scale
+        return 1
+
+    def _estimate_decode_saving(self, decode_info: dict, decode_ms: float) -> dict:
+        """
+        估算缩小解码节省的时间
+
+        全尺寸解码耗时按历史全尺寸解码速度（毫秒/百万像素）的滑动平均估算；
+        全尺寸解码的请求同时用于更新该速度。
+
+        Args:
+            decode_info: 解码信息
+            decode_ms: 本次实际解码耗时
+
+        Returns:
+            dict: {'full_decode_ms_est', 'decode_saved_ms_est'}
+        """
+        width, height = decode_info['source_size']
+        megapixels = width * height / 1e6
+
+        with self._decode_rate_lock:
+            if decode_info['scale'] == 1:
+                if megapixels >= 0.5:
+                    rate = decode_ms / megapixels
+                    self._full_decode_ms_per_mp = 0.8 * self._full_decode_ms_per_mp + 0.2 * rate
+                return {'full_decode_ms_est': decode_ms, 'decode_saved_ms_est': 0.0}
+
+            full_ms = self._full_decode_ms_per_mp * megapixels
+
+        return {
+            'full_decode_ms_est': round(full_ms, 2),
+            'decode_saved_ms_est': round(max(full_ms - decode_ms, 0.0), 2)
+        }
+
+    @staticmethod
+    def _read_jpeg_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+        """
+        从JPEG文件头读取图像尺寸（无需解码）
+
+        Args:
+            image_bytes: 图片字节
+
+        Returns:
+            Tuple[int, int]: (宽, 高)，非JPEG或解析失败返回None
+        """
+        if len(image_bytes) < 4 or image_bytes[0] != 0xFF or image_bytes[1] != 0xD8:
+            return None
+
+        pos = 2
+        length = len(image_bytes)
+        while pos + 4 <= length:
+            if image_bytes[pos] != 0xFF:
+                return None
+            marker = image_bytes[pos + 1]
+            if marker == 0xFF:           # 填充字节
+                pos += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:   # 无长度字段的标记
+                pos += 2
+                continue
+
+            segment_length = int.from_bytes(image_bytes[pos + 2:pos + 4], 'big')
+            if marker in JPEG_SOF_MARKERS:
+                if pos + 9 > length:
+                    return None
+                height = int.from_bytes(image_bytes[pos + 5:pos + 7], 'big')
+                width = int.from_bytes(image_bytes[pos + 7:pos + 9], 'big')
+                return (width, height) if width and height else None
+            pos += 2 + segment_length
+
+        return None
+
+    def build_analysis_frame(self, image_bytes: bytes, report: dict = None) -> Optional[np.ndarray]:
+        """
+        为拍照分析构建缩小的灰度工作图（只解码一次）
+
+        JPEG直接按1/2~1/8比例解码为灰度图，再用INTER_AREA缩放到analysis_max_side以内。
+        光线、清晰度、指纹和内容预检都基于这张工作图。
+
+        Args:
+            image_bytes: 原始图片字节
+            report: 可选字典，写入解码信息(decode)和耗时(timings_ms)
+
+        Returns:
+            np.ndarray: 灰度工作图，解码失败返回None
+        """
+        report = report if report is not None else {}
+        timings = report.setdefault('timings_ms', {})
+        max_side = self.config['analysis_max_side']
+
+        start = time.perf_counter()
+        gray, decode_info = self.decode_for_processing(image_bytes, grayscale=True, max_size=(max_side, max_side))
+        timings['decode'] = self._elapsed_ms(start)
+        if gray is None:
+            return None
+
+        start = time.perf_counter()
+        height, width = gray.shape[:2]
+        if max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            gray = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+        timings['resize'] = self._elapsed_ms(start)
+
+        decode_info['working_size'] = [gray.shape[1], gray.shape[0]]
+        report['decode'] = decode_info
+        return gray
+
+    def measure_analysis_metrics(self, gray: np.ndarray, timings: dict = None) -> dict:
+        """
+        在工作图上计算亮度、对比度和拉普拉斯清晰度
+
+        清晰度是缩小后工作图的拉普拉斯方差，比同一照片全分辨率下的值大得多，
+        只能与按工作图尺寸标定的阈值比较。
+
+        Args:
+            gray: 灰度工作图
+            timings: 可选字典，写入各指标耗时
+
+        Returns:
+            dict: {'brightness', 'contrast', 'sharpness'}
+        """
+        timings = timings if timings is not None else {}
+
+        # 均值和标准差一次遍历得到
+        start = time.perf_counter()
+        mean, std = cv2.meanStdDev(gray)
+        timings['brightness_contrast'] = self._elapsed_ms(start)
+
+        start = time.perf_counter()
+        _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        timings['sharpness'] = self._elapsed_ms(start)
+
+        return {
+            'brightness': float(mean[0][0]),
+            'contrast': float(std[0][0]),
+            'sharpness': float(laplacian_std[0][0]) ** 2
+        }
+
+    def encode_analysis_frame(self, gray: np.ndarray) -> Optional[bytes]:
+        """
+        将工作图编码为内容预检OCR使用的JPEG
+
+        Args:
+            gray: 灰度工作图
+
+        Returns:
+            bytes: JPEG字节，失败返回None
+        """
+        return self.encode_image(gray, '.jpg', [cv2.IMWRITE_JPEG_QUALITY, self.config['analysis_jpeg_quality']])
+
+    def _save_debug_images(self, original_bytes: bytes, processed_bytes: bytes):
+        """
+        调试模式下保存原图和处理结果（不会被自动清理）
+
+        Args:
+            original_bytes: 原始图片字节
+            processed_bytes: 处理后图片字节
+        """
+        try:
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+            base = os.path.join(self.config['upload_folder'], f"debug_{timestamp}")
+            with open(f"{base}.jpg", 'wb') as f:
+                f.write(original_bytes)
+            with open(f"{base}_processed{self._bytes_extension(processed_bytes)}", 'wb') as f:
+                f.write(processed_bytes)
+            logger.info(f"调试图片已保存: {base}")
+        except Exception as e:
+            logger.warning(f"保存调试图片失败: {str(e)}")
+
+    def preprocess_array(self, img: np.ndarray, out: np.ndarray = None,
+                         report: dict = None, mode: str = None, workspace: _Workspace = None) -> np.ndarray:
+        """
+        对已解码的图像执行预处理流水线
+
+        中间结果写入工作区中复用的缓冲区（两块灰度缓冲区交替使用），
+        各阶段通过OpenCV的dst参数原地写入，不再逐阶段分配整幅图像。
+
+        Args:
+            img: BGR或灰度图像
+            out: 可选的输出缓冲区；为空时分配新数组，调用方可长期持有结果
+            report: 可选字典，写入执行/跳过的阶段、图像统计和各阶段耗时
+            mode: 预处理模式（full/adaptive），默认使用配置中的preprocess_mode
+            workspace: 调用方已借出的工作区，为空时在本次调用内从工作区池借用
+
+        Returns:
+            np.ndarray: 处理后的灰度图像
+        """
+        if workspace is None:
+            with self._workspace() as workspace:
+                return self.preprocess_array(img, out=out, report=report, mode=mode, workspace=workspace)
+
+        mode = mode or self.config['preprocess_mode']
+        report = report if report is not None else {}
+        timings = report.setdefault('timings_ms', {})
+
+        # 1. 调整图像大小（如果太大）
+        start = time.perf_counter()
+        img = self._resize_image(img, dst=self._resize_buffer(img, workspace))
+        timings['resize'] = self._elapsed_ms(start)
+
+        height, width = img.shape[:2]
+        buffer_a = workspace.buffer((height, width), 'gray_a')
+        buffer_b = workspace.buffer((height, width), 'gray_b')
+
+        # 2. 转换为灰度图
+        start = time.perf_counter()
+        gray = self._convert_to_grayscale(img, dst=buffer_a)
+        timings['grayscale'] = self._elapsed_ms(start)
+
+        # 3. 选择增强阶段：完整模式全部执行，自适应模式按图像统计决定
+        if mode == 'adaptive':
+            start = time.perf_counter()
+            stats = self.measure_image_stats(gray)
+            timings['stats'] = self._elapsed_ms(start)
+            stages = self._plan_stages(stats)
+            report['image_stats'] = stats
+        else:
+            stages = list(FULL_STAGES)
+
+        report['mode'] = mode
+        report['stages'] = stages
+        report['skipped_stages'] = [stage for stage in FULL_STAGES if stage not in stages]
+
+        if out is None or out.shape != (height, width) or out.dtype != np.uint8:
+            out = np.empty((height, width), dtype=np.uint8)
+
+        # 4. 依次执行对比度增强、降噪、锐化，中间结果在两块缓冲区间交替
+        stage_funcs = {
+            'clahe': self._enhance_contrast,
+            'denoise': self._denoise_image,
+            'sharpen': self._sharpen_image
+        }
+        current = gray
+        for index, stage in enumerate(stages):
+            if index == len(stages) - 1:
+                dst = out
+            else:
+                dst = buffer_b if current is buffer_a else buffer_a
+            start = time.perf_counter()
+            current = stage_funcs[stage](current, dst=dst, workspace=workspace)
+            timings[stage] = self._elapsed_ms(start)
+
+        if not stages:
+            np.copyto(out, current)
+
+        return out
+
+    @contextmanager
+    def _preprocessed(self, img: np.ndarray, report: dict = None):
+        """
+        按配置的后端预处理图像，产出的结果仅在with块内有效
+
+        进程池不可用（启动失败、工作进程崩溃、超时）时回退到当前线程处理。
+
+        Args:
+            img: 已解码的图像
+            report: 可选字典，写入处理报告和实际使用的后端(backend)
+
+        Yields:
+            np.ndarray: 处理后的灰度图像
+        """
+        report = report if report is not None else {}
+        pool = self._get_preprocess_pool()
+
+        with ExitStack() as stack:
+            processed = None
+            if pool is not None:
+                try:
+                    processed = stack.enter_context(pool.preprocess(img, report=report))
+                    report['backend'] = 'process'
+                except Exception as e:
+                    logger.warning(f"进程池预处理失败，改为在当前线程处理: {str(e)}")
+
+            if processed is None:
+                workspace = stack.enter_context(self._workspace())
+                processed = self.preprocess_array(img, out=self._output_buffer(img, workspace),
+                                                  report=report, workspace=workspace)
+                report['backend'] = 'thread'
+
+            yield processed
+
+    def _get_preprocess_pool(self):
+        """获取预处理进程池，backend不是process时返回None"""
+        if self.config['preprocess_backend'] != 'process':
+            return None
+
+        with self._pool_lock:
+            if self._preprocess_pool is None:
+                from services.preprocess_pool import PreprocessPool
+
+                self._preprocess_pool = PreprocessPool(self.config, {
+                    'workers': self.config['preprocess_workers'],
+                    'task_timeout': self.config['preprocess_task_timeout']
+                })
+                atexit.register(self._preprocess_pool.shutdown)
+            return self._preprocess_pool
+
+    def get_preprocess_pool_stats(self) -> Optional[dict]:
+        """
+        获取预处理进程池统计信息
+
+        Returns:
+            dict: 进程池统计，未启用进程池返回None
+        """
+        pool = self._preprocess_pool
+        return pool.get_stats() if pool else None
+
+    def measure_image_stats(self, gray: np.ndarray) -> dict:
+        """
+        在缩小的工作图上计算廉价的图像统计指标
+
+        Args:
+            gray: 灰度图像
+
+        Returns:
+            dict: 平均亮度、对比度（标准差）、动态范围、噪声估计和拉普拉斯方差
+        """
+        # 等间隔抽样得到工作图：比INTER_AREA缩放快得多，且不会平均掉噪声和边缘
+        step = max(int(np.ceil(max(gray.shape[:2]) / self.config['stats_max_side'])), 1)
+        work = np.ascontiguousarray(gray[::step, ::step]) if step > 1 else gray
+
+        mean, std = cv2.meanStdDev(work)
+
+        # 灰度直方图的2%、98%分位数之差作为动态范围
+        hist = cv2.calcHist([work], [0], None, [256], [0, 256]).ravel()
+        cdf = np.cumsum(hist) / max(hist.sum(), 1)
+        low = int(np.searchsorted(cdf, 0.02))
+        high = int(np.searchsorted(cdf, 0.98))
+
+        # 噪声估计：Immerkær残差的中位绝对值（对文字边缘不敏感），纯噪声时残差标准差为6σ
+        residual = cv2.filter2D(work, cv2.CV_32F, NOISE_KERNEL)[1:-1, 1:-1]
+        noise = float(np.median(np.abs(residual))) / 0.6745 / 6 if residual.size else 0.0
+
+        _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(work, cv2.CV_32F))
+
+        return {
+            'brightness': round(float(mean[0][0]), 2),
+            'contrast': round(float(std[0][0]), 2),
+            'dynamic_range': high - low,
+            'noise': round(float(noise), 3),
+            'sharpness': round(float(laplacian_std[0][0]) ** 2, 2)
+        }
+
+    def _plan_stages(self, stats: dict) -> list:
+        """
+        根据图像统计选择需要执行的增强阶段
+
+        Args:
+            stats: measure_image_stats的结果
+
+        Returns:
+            list: 按执行顺序排列的阶段名
+        """
+        thresholds = self.config['adaptive_thresholds']
+        stages = []
+
+        # 白底标签整体偏亮属正常，只要动态范围足够就不增强
+        if (stats['brightness'] < thresholds['min_brightness'] or
+                stats['contrast'] < thresholds['min_contrast'] or
+                stats['dynamic_range'] < thresholds['min_dynamic_range']):
+            stages.append('clahe')
+
+        # CLAHE会放大噪声，增强对比度后同样需要降噪
+        if stats['noise'] > thresholds['max_noise'] or 'clahe' in stages:
+            stages.append('denoise')
+
+        if stats['sharpness'] < thresholds['min_sharpness']:
+            stages.append('sharpen')
+
+        return stages
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        """计算自start起经过的毫秒数"""
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    @contextmanager
+    def _workspace(self):
+        """
+        从工作区池借出一个工作区，with块结束时归还
+
+        池中没有空闲工作区时新建；归还时池已满（并发超过workspace_pool_size）则丢弃，
+        常驻内存不超过workspace_pool_size个工作区。
+
+        Yields:
+            _Workspace: 当前请求独占的工作区
+        """
+        with self._workspace_lock:
+            self._workspace_stats['checkouts'] += 1
+            workspace = self._workspaces.pop() if self._workspaces else None
+            self._workspace_stats['reused' if workspace else 'created'] += 1
+        if workspace is None:
+            workspace = _Workspace(self.config)
+
+        try:
+            yield workspace
+        finally:
+            with self._workspace_lock:
+                if len(self._workspaces) < self.config['workspace_pool_size']:
+                    self._workspaces.append(workspace)
+                else:
+                    self._workspace_stats['discarded'] += 1
+
+    def _output_buffer(self, img: np.ndarray, workspace: _Workspace) -> np.ndarray:
+        """获取预处理输出的工作区缓冲区（结果需在归还工作区前消费）"""
+        height, width = img.shape[:2]
+        target = self._target_size(width, height)
+        if target:
+            width, height = target
+        return workspace.buffer((height, width), 'output')
+
+    def _resize_buffer(self, img: np.ndarray, workspace: _Workspace) -> Optional[np.ndarray]:
+        """获取缩放结果的缓冲区，不需要缩放时返回None"""
+        target = self._target_size(*img.shape[:2][::-1])
+        if target is None:
+            return None
+        new_width, new_height = target
+        return workspace.buffer((new_height, new_width) + img.shape[2:], 'resized')
+
     def preprocess_image(self, image_path: str) -> str:
         """
         图像预处理函数
@@ -155,141 +1172,151 @@ class ImageProcessor:
             original_height, original_width = img.shape[:2]
             logger.info(f"原始图片尺寸: {original_width}x{original_height}")
 
-            # 1. 调整图像大小（如果太大）
-            img = self._resize_image(img)
-            
-            # 2. 转换为灰度图
-            gray = self._convert_to_grayscale(img)
-            
-            # 3. 图像增强 - 对比度增强
-            enhanced = self._enhance_contrast(gray)
-            
-            # 4. 降噪
-            denoised = self._denoise_image(enhanced)
-            
-            # 5. 锐化（可选）
-            sharpened = self._sharpen_image(denoised)
-
             # 保存处理后的图片
-            processed_path = self._get_processed_path(image_path)
-            success = cv2.imwrite(processed_path, sharpened)
+            with self._preprocessed(img) as sharpened:
+                processed_bytes = self.encode_for_ocr(sharpened)
 
-            if success:
+            if processed_bytes is not None:
+                processed_path = self._get_processed_path(image_path, self._bytes_extension(processed_bytes))
+                with open(processed_path, 'wb') as f:
+                    f.write(processed_bytes)
                 logger.info(f"图像预处理完成: {processed_path}")
                 return processed_path
             else:
-                logger.error(f"保存处理后的图片失败: {processed_path}")
+                logger.error(f"编码处理后的图片失败: {image_path}")
                 return image_path
 
         except Exception as e:
             logger.error(f"图像预处理失败: {str(e)}")
             return image_path  # 返回原图
 
-    def _resize_image(self, img: np.ndarray) -> np.ndarray:
+    def _target_size(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """
+        计算缩放后的尺寸
+
+        Returns:
+            Tuple[int, int]: (新宽度, 新高度)，无需缩放返回None
+        """
+        max_width = self.config['max_width']
+        max_height = self.config['max_height']
+
+        if width > max_width or height > max_height:
+            scale = min(max_width / width, max_height / height)
+            return int(width * scale), int(height * scale)
+        return None
+
+    def _resize_image(self, img: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
         """
         调整图像大小
         
         Args:
             img: 输入图像
+            dst: 可选的目标缓冲区
             
         Returns:
             np.ndarray: 调整后的图像
         """
         height, width = img.shape[:2]
-        max_width = self.config['max_width']
-        max_height = self.config['max_height']
+        target = self._target_size(width, height)
 
-        if width > max_width or height > max_height:
-            scale = min(max_width / width, max_height / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        if target:
+            new_width, new_height = target
+            img = cv2.resize(img, (new_width, new_height), dst=dst, interpolation=cv2.INTER_AREA)
             logger.info(f"图像缩放: {width}x{height} -> {new_width}x{new_height}")
 
         return img
 
-    def _convert_to_grayscale(self, img: np.ndarray) -> np.ndarray:
+    def _convert_to_grayscale(self, img: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
         """
         转换为灰度图
         
         Args:
             img: 输入图像
+            dst: 可选的目标缓冲区
             
         Returns:
             np.ndarray: 灰度图像
         """
         if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=dst)
         else:
             gray = img
         return gray
 
-    def _enhance_contrast(self, gray: np.ndarray) -> np.ndarray:
+    def _enhance_contrast(self, gray: np.ndarray, dst: np.ndarray = None,
+                          workspace: _Workspace = None) -> np.ndarray:
         """
         增强对比度
         
         Args:
             gray: 灰度图像
+            dst: 可选的目标缓冲区
+            workspace: 提供CLAHE对象的工作区，为空时新建CLAHE
             
         Returns:
             np.ndarray: 增强后的图像
         """
-        clahe = cv2.createCLAHE(
-            clipLimit=self.config['clahe_clip_limit'],
-            tileGridSize=self.config['clahe_tile_size']
-        )
-        enhanced = clahe.apply(gray)
+        if workspace is not None:
+            clahe = workspace.clahe
+        else:
+            clahe = cv2.createCLAHE(clipLimit=self.config['clahe_clip_limit'],
+                                    tileGridSize=self.config['clahe_tile_size'])
+        enhanced = clahe.apply(gray, dst=dst)
         return enhanced
 
-    def _denoise_image(self, img: np.ndarray) -> np.ndarray:
+    def _denoise_image(self, img: np.ndarray, dst: np.ndarray = None,
+                       workspace: _Workspace = None) -> np.ndarray:
         """
         图像降噪
         
         Args:
             img: 输入图像
+            dst: 可选的目标缓冲区（不能与输入相同）
+            workspace: 未使用，与其他阶段保持相同签名
             
         Returns:
             np.ndarray: 降噪后的图像
         """
         # 使用中值滤波降噪
-        denoised = cv2.medianBlur(img, 3)
+        denoised = cv2.medianBlur(img, 3, dst=dst)
         return denoised
 
-    def _sharpen_image(self, img: np.ndarray) -> np.ndarray:
+    def _sharpen_image(self, img: np.ndarray, dst: np.ndarray = None,
+                       workspace: _Workspace = None) -> np.ndarray:
         """
         图像锐化
         
         Args:
             img: 输入图像
+            dst: 可选的目标缓冲区（不能与输入相同）
+            workspace: 未使用，与其他阶段保持相同签名
             
         Returns:
             np.ndarray: 锐化后的图像
         """
-        # 创建锐化核
-        kernel = np.array([[-1, -1, -1],
-                          [-1,  9, -1],
-                          [-1, -1, -1]])
-        
-        # 应用锐化
-        sharpened = cv2.filter2D(img, -1, kernel)
-        
-        # 确保像素值在有效范围内
-        sharpened = np.clip(sharpened, 0, 255).astype(np.uint8)
-        
+        # 应用锐化（ddepth=-1时uint8输出已饱和截断到0-255，无需再clip）
+        sharpened = cv2.filter2D(img, -1, SHARPEN_KERNEL, dst=dst)
+
         return sharpened
 
-    def _get_processed_path(self, original_path: str) -> str:
+    def _get_processed_path(self, original_path: str, ext: str = None) -> str:
         """
         获取处理后图片的路径
         
         Args:
             original_path: 原始图片路径
+            ext: 处理后图片的扩展名，默认沿用原图
             
         Returns:
             str: 处理后图片路径
         """
-        base, ext = os.path.splitext(original_path)
-        return f"{base}_processed{ext}"
+        base, original_ext = os.path.splitext(original_path)
+        return f"{base}_processed{ext or original_ext}"
+
+    @staticmethod
+    def _bytes_extension(image_bytes: bytes) -> str:
+        """按文件头判断编码后图片的扩展名（按预算编码可能输出PNG）"""
+        return '.png' if image_bytes[:8] == b'\x89PNG\r\n\x1a\n' else '.jpg'
 
     def cleanup_temp_files(self, *file_paths):
         """
@@ -344,6 +1371,64 @@ class ImageProcessor:
         except Exception as e:
             return False, f"验证图片失败: {str(e)}"
 
+    def compute_dhash(self, gray: np.ndarray, hash_size: int = 8) -> int:
+        """
+        计算灰度图的差值感知哈希（dHash）
+
+        对传感器噪声和轻微抖动不敏感，用于识别近重复帧
+
+        Args:
+            gray: 灰度图像
+            hash_size: 哈希边长，默认8（64位）
+
+        Returns:
+            int: 感知哈希值
+        """
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        diff = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(diff).tobytes(), 'big')
+
+    def fingerprint_image(self, image_path: str) -> Optional[int]:
+        """
+        计算图片文件的感知指纹
+
+        Args:
+            image_path: 图片文件路径
+
+        Returns:
+            int: 64位dHash指纹，读取失败返回None
+        """
+        try:
+            # 指纹只需要极小的图像，按1/4分辨率解码即可
+            img = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if img is None:
+                return None
+            return self.compute_dhash(self._convert_to_grayscale(img))
+
+        except Exception as e:
+            logger.error(f"计算图片指纹失败: {str(e)}")
+            return None
+
+    def fingerprint_image_bytes(self, image_bytes: bytes) -> Optional[int]:
+        """
+        计算内存图片数据的感知指纹
+
+        Args:
+            image_bytes: 编码后的图片字节
+
+        Returns:
+            int: 64位dHash指纹，解码失败返回None
+        """
+        try:
+            img = self.decode_image(image_bytes, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if img is None:
+                return None
+            return self.compute_dhash(self._convert_to_grayscale(img))
+
+        except Exception as e:
+            logger.error(f"计算图片指纹失败: {str(e)}")
+            return None
+
     def get_image_info(self, image_path: str) -> dict:
         """
         获取图片信息
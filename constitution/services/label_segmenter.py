@@ -0,0 +1,141 @@
+"""
+说明书分段服务
+按【用法用量】、【不良反应】、【禁忌】等标题把OCR文本切分为带标签的段落，
+字段提取只在各自的段落内进行
+"""
+
+import re
+from typing import Dict, List
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 段落标题：【】内不含括号、长度有限，逐个匹配是线性的
+HEADER_PATTERN = re.compile(r'【([^【】]{1,16})】')
+
+# 标题别名 -> 规范标题
+SECTION_ALIASES = {
+    '名称': '药品名称',
+    '用法与用量': '用法用量',
+    '用法及用量': '用法用量',
+    '禁忌症': '禁忌',
+    '禁忌证': '禁忌',
+    '贮存': '贮藏',
+    '储藏': '贮藏',
+    '储存': '贮藏',
+    '有效期限': '有效期',
+    '生产厂家': '生产企业',
+    '批号': '产品批号',
+    '生产批号': '产品批号'
+}
+
+# 规范标题 -> 字段
+#   body:  段落正文直接作为字段值
+#   rules: 字段规则只在该段落内匹配
+SECTION_FIELDS = {
+    '药品名称': {'rules': ['drug_name']},
+    '用法用量': {'rules': ['usage', 'dosage']},
+    '不良反应': {'body': ['side_effects']},
+    '禁忌': {'body': ['contraindications'], 'rules': ['allergens']},
+    '注意事项': {'rules': ['allergens']},
+    '贮藏': {'body': ['storage']},
+    '有效期': {'body': ['expiry_date']},
+    '生产企业': {'body': ['manufacturer']},
+    '产品批号': {'body': ['batch_number']},
+    '批准文号': {'body': ['approval_number']}
+}
+
+
+class LabelSegmenter:
+    """
+    说明书分段器
+
+    一遍扫描找出所有【标题】，相邻标题之间为上一段的正文；未收录的标题（如【成份】）
+    同样作为段落边界，避免其正文混入前一段。没有标题的包装盒文本不分段，
+    字段提取退回到全文匹配。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化分段器
+
+        Args:
+            config: 配置字典，可包含section_aliases, section_fields（与默认表合并）
+        """
+        self.aliases = dict(SECTION_ALIASES)
+        self.section_fields = {title: dict(fields) for title, fields in SECTION_FIELDS.items()}
+
+        if config:
+            self.aliases.update(config.get('section_aliases') or {})
+            self.section_fields.update(config.get('section_fields') or {})
+
+    def normalize_title(self, title: str) -> str:
+        """
+        规范化段落标题（去空白、别名映射）
+
+        Args:
+            title: 【】内的原始标题
+
+        Returns:
+            str: 规范标题
+        """
+        title = ''.join(title.split())
+        return self.aliases.get(title, title)
+
+    def segment(self, text: str) -> List[Dict]:
+        """
+        切分段落
+
+        Args:
+            text: 合并后的完整文本
+
+        Returns:
+            List[Dict]: 按出现顺序的段落 {'title', 'start', 'body_start', 'end'}，
+                        body_start/end为正文在原文中的区间
+        """
+        headers = list(HEADER_PATTERN.finditer(text))
+        sections = []
+        for index, header in enumerate(headers):
+            end = headers[index + 1].start() if index + 1 < len(headers) else len(text)
+            sections.append({
+                'title': self.normalize_title(header.group(1)),
+                'start': header.start(),
+                'body_start': header.end(),
+                'end': end
+            })
+        return sections
+
+    def field_spans(self, text: str, sections: List[Dict]) -> Dict[str, Dict]:
+        """
+        计算各字段对应的段落
+
+        Args:
+            text: 完整文本
+            sections: segment()的结果
+
+        Returns:
+            Dict[str, Dict]: {'body': {字段: 正文}, 'rules': {字段: [(起点, 终点), ...]}}，
+                             同一字段body优先；正文为空的段落忽略
+        """
+        bodies = {}
+        spans = {}
+        for section in sections:
+            fields = self.section_fields.get(section['title'])
+            if not fields:
+                continue
+
+            start, end = section['body_start'], section['end']
+            body = text[start:end].strip().rstrip('。').strip()
+            if not body:
+                continue
+
+            for field in fields.get('body', ()):
+                bodies.setdefault(field, body)
+            for field in fields.get('rules', ()):
+                spans.setdefault(field, []).append((start, end))
+
+        return {
+            'body': bodies,
+            'rules': {field: value for field, value in spans.items() if field not in bodies}
+        }
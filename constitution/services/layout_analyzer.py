@@ -0,0 +1,191 @@
+"""
+版面分析服务
+按OCR文本块的外接框把文本块聚成列和行，输出阅读顺序的行及其几何信息，
+避免多栏说明书的文字交错、同一行因相差几个像素被拆开
+"""
+
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LayoutAnalyzer:
+    """
+    版面分析器
+
+    全部在numpy数组上完成，几百个文本块也只需几毫秒：
+    1. 宽度超过版面一定比例的文本块（标题、通栏文字）视为通栏块，把版面分为上下若干带；
+    2. 其余文本块按x区间投影，间隔足够宽的空白为栏间距，按中心x分栏；
+    3. 同一带、同一栏内按中心y排序，相邻块的y差小于容差时归为同一行，行内按left排序。
+    阅读顺序为：带从上到下，带内各栏从左到右，栏内各行从上到下。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化版面分析器
+
+        Args:
+            config: 配置字典，可包含line_tolerance, column_gap, spanning_ratio
+        """
+        self.config = {
+            'line_tolerance': 0.5,   # 同一行的中心y差上限（相对文字行高中位数）
+            'column_gap': 2.0,       # 栏间空白宽度下限（相对文字行高中位数）
+            'spanning_ratio': 0.6    # 宽度超过版面宽度该比例的文本块视为通栏块
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+    @staticmethod
+    def _block_boxes(text_blocks: List[Dict]) -> Optional[np.ndarray]:
+        """
+        取文本块外接框 (N, 4)：left, top, width, height
+
+        Returns:
+            np.ndarray: 任一文本块缺少位置信息时返回None
+        """
+        try:
+            return np.array([
+                [block['location']['left'], block['location']['top'],
+                 block['location']['width'], block['location']['height']]
+                for block in text_blocks
+            ], dtype=np.float64).reshape(-1, 4)
+        except (KeyError, TypeError):
+            return None
+
+    def analyze(self, text_blocks: List[Dict]) -> Dict:
+        """
+        分析文本块版面
+
+        Args:
+            text_blocks: OCR文本块列表（words, location）
+
+        Returns:
+            Dict: {'lines': [{'text', 'blocks', 'left', 'top', 'right', 'bottom', 'column', 'band'}],
+                   'columns': 栏数, 'has_geometry': 是否有位置信息}，
+                  lines中的blocks为文本块在text_blocks中的下标，按行内从左到右排列
+        """
+        if not text_blocks:
+            return {'lines': [], 'columns': 0, 'has_geometry': False}
+
+        boxes = self._block_boxes(text_blocks)
+        if boxes is None:
+            # 没有位置信息时保持OCR返回顺序，每个文本块一行
+            lines = [{'text': block.get('words', ''), 'blocks': [index], 'left': None, 'top': None,
+                      'right': None, 'bottom': None, 'column': 0, 'band': 0}
+                     for index, block in enumerate(text_blocks)]
+            return {'lines': lines, 'columns': 1, 'has_geometry': False}
+
+        left, top = boxes[:, 0], boxes[:, 1]
+        right, bottom = left + boxes[:, 2], top + boxes[:, 3]
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        line_height = max(float(np.median(boxes[:, 3])), 1.0)
+
+        # 1. 通栏块把版面分为上下若干带：第k个通栏块为带2k+1，其上下的普通块为带2k、2k+2
+        page_width = max(float(right.max() - left.min()), 1.0)
+        spanning = boxes[:, 2] >= page_width * self.config['spanning_ratio']
+        band = np.zeros(len(boxes), dtype=np.int64)
+        if spanning.any():
+            spanning_y = np.sort(center_y[spanning])
+            band[~spanning] = 2 * np.searchsorted(spanning_y, center_y[~spanning])
+            band[spanning] = 2 * np.searchsorted(spanning_y, center_y[spanning]) + 1
+
+        # 2. 普通块按x区间投影找栏间空白
+        column = np.zeros(len(boxes), dtype=np.int64)
+        gutters = self._find_gutters(left[~spanning], right[~spanning],
+                                     line_height * self.config['column_gap'])
+        if len(gutters):
+            column[~spanning] = np.searchsorted(gutters, center_x[~spanning])
+
+        # 3. 同带同栏内按中心y聚行
+        order = np.lexsort((center_y, column, band))
+        same_group = (band[order][1:] == band[order][:-1]) & (column[order][1:] == column[order][:-1])
+        close = np.diff(center_y[order]) <= line_height * self.config['line_tolerance']
+        line_of_sorted = np.concatenate(([0], np.cumsum(~(same_group & close))))
+        line_id = np.empty(len(boxes), dtype=np.int64)
+        line_id[order] = line_of_sorted
+
+        # 行内按left排序；行号本身已是阅读顺序
+        reading_order = np.lexsort((left, line_id))
+        boundaries = np.flatnonzero(np.diff(line_id[reading_order])) + 1
+
+        lines = []
+        for indices in np.split(reading_order, boundaries):
+            first = indices[0]
+            lines.append({
+                'text': ' '.join(text_blocks[index].get('words', '') for index in indices),
+                'blocks': indices.tolist(),
+                'left': int(left[indices].min()),
+                'top': int(top[indices].min()),
+                'right': int(right[indices].max()),
+                'bottom': int(bottom[indices].max()),
+                'column': int(column[first]),
+                'band': int(band[first])
+            })
+
+        return {'lines': lines, 'columns': len(gutters) + 1, 'has_geometry': True}
+
+    @staticmethod
+    def _find_gutters(left: np.ndarray, right: np.ndarray, min_gap: float) -> np.ndarray:
+        """
+        找出x方向上没有任何文本块覆盖、且宽度不小于min_gap的空白
+
+        Returns:
+            np.ndarray: 各栏间空白的中心x（升序）
+        """
+        if len(left) < 2:
+            return np.empty(0)
+
+        order = np.argsort(left)
+        left, right = left[order], right[order]
+        covered_right = np.maximum.accumulate(right)[:-1]
+        gaps = left[1:] - covered_right
+        split = gaps >= min_gap
+        return (left[1:][split] + covered_right[split]) / 2
+
+    @staticmethod
+    def neighbor_value(text_blocks: List[Dict], layout: Dict, block_index: int,
+                       is_key: Callable[[str], bool] = None) -> Optional[str]:
+        """
+        取键文本块对应的值：同一行右侧的文本块，没有（或右侧也是键）时取正下方最近的文本块
+
+        用于“批号 / 有效期至”等键在上、值在下的表格式标签。
+
+        Args:
+            text_blocks: OCR文本块列表
+            layout: analyze()的结果
+            block_index: 键文本块下标
+            is_key: 判断文本是否为键的函数，右侧为键时改取下方
+
+        Returns:
+            str: 值文本，找不到时返回None
+        """
+        for line in layout['lines']:
+            if block_index in line['blocks']:
+                position = line['blocks'].index(block_index)
+                if position + 1 < len(line['blocks']):
+                    words = text_blocks[line['blocks'][position + 1]].get('words')
+                    if not (is_key and is_key(words)):
+                        return words
+                break
+
+        if not layout['has_geometry']:
+            return None
+
+        boxes = LayoutAnalyzer._block_boxes(text_blocks)
+        left, top = boxes[:, 0], boxes[:, 1]
+        right = left + boxes[:, 2]
+        key_left, key_top, key_width, key_height = boxes[block_index]
+
+        # 正下方：顶边在键文本块中心以下、相距不超过两行，且与其x区间重叠
+        below = ((top > key_top + key_height / 2) & (top < key_top + key_height * 3) &
+                 (left < key_left + key_width) & (right > key_left))
+        below[block_index] = False
+        if not below.any():
+            return None
+        candidates = np.flatnonzero(below)
+        return text_blocks[int(candidates[np.argmin(top[candidates])])].get('words')
@@ -0,0 +1,233 @@
+"""
+OCR识别结果缓存
+以预处理后图片字节 + OCR参数的哈希为键，避免重复帧重复消耗OCR配额
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.lru_cache import TTLLRUCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class OCRResultCache:
+    """
+    两级OCR结果缓存
+
+    内存层为有界LRU（条目数 + 字节数上限，带TTL）；
+    可选磁盘层按键存储JSON文件，服务重启后仍可命中。
+    缓存内保存的是独立副本，读取时也返回副本，调用方修改结果不会影响后续命中。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化OCR结果缓存
+
+        Args:
+            config: 缓存配置字典，可包含max_entries, max_bytes, ttl,
+                    disk_dir（为空时不启用磁盘层）, disk_max_bytes
+        """
+        self.config = {
+            'max_entries': 256,
+            'max_bytes': 32 * 1024 * 1024,   # 32MB
+            'ttl': 3600,                     # 1小时
+            'disk_dir': None,
+            'disk_max_bytes': 256 * 1024 * 1024
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._memory = TTLLRUCache(
+            max_entries=self.config['max_entries'],
+            max_bytes=self.config['max_bytes'],
+            ttl=self.config['ttl'],
+            size_func=lambda entry: entry['_size']
+        )
+
+        self._disk_dir = self.config['disk_dir'] or None
+        self._disk_lock = threading.Lock()
+        self._disk_hits = 0
+        self._disk_writes = 0
+        self._stored_bytes = 0
+
+        if self._disk_dir:
+            os.makedirs(self._disk_dir, exist_ok=True)
+            logger.info(f"OCR缓存磁盘层已启用: {self._disk_dir}")
+
+        logger.info(
+            f"OCR结果缓存初始化完成: max_entries={self.config['max_entries']}, "
+            f"ttl={self.config['ttl']}s"
+        )
+
+    @staticmethod
+    def make_key(image_bytes: bytes, options: Dict = None) -> str:
+        """
+        生成缓存键
+
+        Args:
+            image_bytes: 预处理后的图片字节
+            options: OCR参数
+
+        Returns:
+            str: sha256十六进制摘要
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        读取缓存的OCR结果，先查内存层再查磁盘层
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Dict: OCR结果的副本，未命中返回None
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            return copy.deepcopy(entry['result'])
+
+        if not self._disk_dir:
+            return None
+
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+
+        # 回填内存层，只保留磁盘文件剩余的有效期（不重新计时）
+        remaining = self.config['ttl'] - entry.pop('_age') if self.config['ttl'] else None
+        if remaining is None or remaining > 0:
+            self._memory.set(key, entry, ttl=remaining)
+        with self._disk_lock:
+            self._disk_hits += 1
+        return copy.deepcopy(entry['result'])
+
+    def set(self, key: str, result: Dict):
+        """
+        写入OCR结果
+
+        Args:
+            key: 缓存键
+            result: OCR结果（仅缓存成功结果）
+        """
+        payload = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        entry = {'result': copy.deepcopy(result), '_size': len(payload)}
+        self._memory.set(key, entry)
+
+        with self._disk_lock:
+            self._stored_bytes += len(payload)
+
+        if self._disk_dir:
+            self._write_disk(key, payload)
+
+    def _disk_path(self, key: str) -> str:
+        """磁盘缓存文件路径"""
+        return os.path.join(self._disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        """从磁盘层读取，过期文件直接删除；_age为文件写入至今的秒数"""
+        path = self._disk_path(key)
+        try:
+            age = max(time.time() - os.path.getmtime(path), 0.0)
+            if self.config['ttl'] and age > self.config['ttl']:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                payload = f.read()
+            return {'result': json.loads(payload.decode('utf-8')), '_size': len(payload), '_age': age}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取OCR磁盘缓存失败: {path}, 错误: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, payload: bytes):
+        """写入磁盘层（先写临时文件再原子替换）"""
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            with self._disk_lock:
+                self._disk_writes += 1
+                need_prune = self._disk_writes % 64 == 0
+            if need_prune:
+                self._prune_disk()
+        except Exception as e:
+            logger.warning(f"写入OCR磁盘缓存失败: {path}, 错误: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _prune_disk(self):
+        """清理磁盘层：删除过期文件，超出容量时按修改时间淘汰最旧文件"""
+        now = time.time()
+        files = []
+        total = 0
+        for entry in os.scandir(self._disk_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            stat = entry.stat()
+            if self.config['ttl'] and now - stat.st_mtime > self.config['ttl']:
+                os.remove(entry.path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.config['disk_max_bytes']:
+                break
+            os.remove(path)
+            total -= size
+
+    def _disk_usage(self) -> Dict:
+        """统计磁盘层文件数和字节数"""
+        count = 0
+        size = 0
+        for entry in os.scandir(self._disk_dir):
+            if entry.name.endswith('.json'):
+                count += 1
+                size += entry.stat().st_size
+        return {'entries': count, 'bytes': size}
+
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict: 内存层/磁盘层命中率与字节数
+        """
+        memory_stats = self._memory.get_stats()
+        with self._disk_lock:
+            disk_hits = self._disk_hits
+            stored_bytes = self._stored_bytes
+
+        # 内存未命中中包含了磁盘命中，总命中 = 内存命中 + 磁盘命中
+        lookups = memory_stats['hits'] + memory_stats['misses']
+        total_hits = memory_stats['hits'] + disk_hits
+
+        stats = {
+            'lookups': lookups,
+            'hits': total_hits,
+            'misses': lookups - total_hits,
+            'hit_rate': round(total_hits / lookups, 4) if lookups else 0.0,
+            'stored_bytes_total': stored_bytes,
+            'memory': memory_stats,
+            'disk': None
+        }
+
+        if self._disk_dir:
+            stats['disk'] = {'hits': disk_hits, **self._disk_usage()}
+
+        return stats
@@ -0,0 +1,314 @@
+"""
+多帧OCR结果融合
+同一标签的多次OCR结果（连拍的多帧、同一会话内对同一面的重拍）按位置和文字相似度对齐文字行，
+每行按各次结果的行置信度(probability)加权逐字投票，不增加往返即可纠正单帧的个别错字
+"""
+
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def block_weight(block: Dict, default: float = 0.5) -> float:
+    """文字行的投票权重：百度OCR返回的行平均置信度，未返回时取default"""
+    try:
+        return float(block['probability']['average'])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def vote_text(members: List[Tuple[str, float]]) -> str:
+    """
+    加权逐字投票
+
+    以第一个成员为参照，其余成员与参照做序列对齐：对齐上的字符为该位置投票，
+    缺字投“删除”，多出的字投“在该位置插入”；每个位置取权重最高的结果（平票时参照优先），
+    插入需超过总权重的一半才采纳。
+
+    Args:
+        members: [(文本, 权重), ...]，第一个为参照
+
+    Returns:
+        str: 投票后的文本
+    """
+    reference = members[0][0]
+    votes = [defaultdict(float) for _ in reference]
+    inserts = [defaultdict(float) for _ in range(len(reference) + 1)]
+    total = sum(weight for _, weight in members)
+
+    for text, weight in members:
+        inserted = {}
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, reference, text, autojunk=False).get_opcodes():
+            if tag == 'equal':
+                for offset in range(i2 - i1):
+                    votes[i1 + offset][reference[i1 + offset]] += weight
+            elif tag == 'replace':
+                common = min(i2 - i1, j2 - j1)
+                for offset in range(common):
+                    votes[i1 + offset][text[j1 + offset]] += weight
+                for position in range(i1 + common, i2):
+                    votes[position][''] += weight
+                if j2 - j1 > common:
+                    inserted[i2] = inserted.get(i2, '') + text[j1 + common:j2]
+            elif tag == 'delete':
+                for position in range(i1, i2):
+                    votes[position][''] += weight
+            elif tag == 'insert':
+                inserted[i1] = inserted.get(i1, '') + text[j1:j2]
+        for slot, fragment in inserted.items():
+            inserts[slot][fragment] += weight
+
+    fused = []
+    for slot in range(len(reference) + 1):
+        if inserts[slot]:
+            fragment, weight = max(inserts[slot].items(), key=lambda item: item[1])
+            if weight > total / 2:
+                fused.append(fragment)
+        if slot < len(reference):
+            fused.append(max(votes[slot].items(), key=lambda item: item[1])[0])
+    return ''.join(fused)
+
+
+class OCRResultFusion:
+    """
+    OCR结果融合器
+
+    以主结果（当前帧）为参照，其余结果的文字行按文字相似度（有位置信息时再结合归一化外接框的重叠度）
+    一对一贪心对齐；与主结果对齐的行数占比过低的结果视为拍的是另一面，不参与融合。
+    主结果中没有、但在其他结果中置信度足够高的行按其在原结果中的位置插入。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化融合器
+
+        Args:
+            config: 配置字典，可包含min_line_similarity, geometry_weight, max_order_shift,
+                    min_overlap, min_extra_probability
+        """
+        self.config = {
+            'min_line_similarity': 0.5,     # 两行对齐所需的最低相似度
+            'max_order_shift': 0.25,        # 对齐的两行在各自结果中的相对次序差上限（至少允许相差3行）
+            'geometry_weight': 0.3,         # 有位置信息时外接框重叠度在相似度中的权重
+            'min_overlap': 0.5,             # 主结果中能对齐的行数占比下限，低于该值视为不同标签面
+            'min_extra_probability': 0.85   # 主结果缺失的行需要的最低置信度
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._stats_lock = threading.Lock()
+        self.fusions = 0
+        self.changed_lines = 0
+
+    @staticmethod
+    def _text_extent(blocks: List[Dict]) -> Optional[Tuple[float, float, float, float]]:
+        """整幅文字区域 (left, top, width, height)，任一行缺少位置信息时返回None"""
+        try:
+            boxes = [(block['location']['left'], block['location']['top'],
+                      block['location']['left'] + block['location']['width'],
+                      block['location']['top'] + block['location']['height']) for block in blocks]
+        except (KeyError, TypeError):
+            return None
+        if not boxes:
+            return None
+        left = min(box[0] for box in boxes)
+        top = min(box[1] for box in boxes)
+        return (left, top, max(max(box[2] for box in boxes) - left, 1), max(max(box[3] for box in boxes) - top, 1))
+
+    @classmethod
+    def _normalized_boxes(cls, blocks: List[Dict]) -> Optional[List[Tuple[float, float, float, float]]]:
+        """各行外接框按整幅文字区域归一化到0~1（不同帧之间有平移、缩放也可比较）"""
+        extent = cls._text_extent(blocks)
+        if extent is None:
+            return None
+        left, top, width, height = extent
+        return [((block['location']['left'] - left) / width,
+                 (block['location']['top'] - top) / height,
+                 (block['location']['left'] + block['location']['width'] - left) / width,
+                 (block['location']['top'] + block['location']['height'] - top) / height)
+                for block in blocks]
+
+    @staticmethod
+    def _box_overlap(a: Tuple, b: Tuple) -> float:
+        """两个归一化外接框的交并比"""
+        width = min(a[2], b[2]) - max(a[0], b[0])
+        height = min(a[3], b[3]) - max(a[1], b[1])
+        if width <= 0 or height <= 0:
+            return 0.0
+        intersection = width * height
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+        return intersection / union if union > 0 else 0.0
+
+    def _align(self, reference: List[Dict], other: List[Dict]) -> Dict[int, int]:
+        """
+        文字行一对一贪心对齐
+
+        重拍的大部分行与参照完全相同，先按文字精确配对；剩余的行只与相对次序相近的行比较相似度。
+
+        Returns:
+            Dict[int, int]: other中的行下标 -> reference中的行下标
+        """
+        mapping, used = {}, set()
+        unmatched = defaultdict(list)
+        for i, block in enumerate(reference):
+            unmatched[block.get('words', '')].append(i)
+        for j, block in enumerate(other):
+            candidates = unmatched.get(block.get('words', ''))
+            if candidates:
+                # 同一文字出现多次时取相对次序最近的一行
+                i = min(candidates, key=lambda i: abs(i / len(reference) - j / len(other)))
+                candidates.remove(i)
+                mapping[j] = i
+                used.add(i)
+
+        reference_boxes = self._normalized_boxes(reference)
+        other_boxes = self._normalized_boxes(other)
+        use_geometry = reference_boxes is not None and other_boxes is not None
+        geometry_weight = self.config['geometry_weight'] if use_geometry else 0.0
+        threshold = self.config['min_line_similarity']
+        max_shift = max(self.config['max_order_shift'] * max(len(reference), len(other)), 3)
+
+        pairs = []
+        for i, block in enumerate(reference):
+            if i in used:
+                continue
+            text = block.get('words', '')
+            for j, other_block in enumerate(other):
+                if j in mapping or abs(i * len(other) / len(reference) - j) > max_shift:
+                    continue
+                matcher = SequenceMatcher(None, text, other_block.get('words', ''), autojunk=False)
+                if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                    continue
+                similarity = matcher.ratio()
+                if similarity < threshold:
+                    continue
+                if use_geometry:
+                    similarity = ((1 - geometry_weight) * similarity +
+                                  geometry_weight * self._box_overlap(reference_boxes[i], other_boxes[j]))
+                pairs.append((similarity, i, j))
+
+        for _, i, j in sorted(pairs, reverse=True):
+            if j not in mapping and i not in used:
+                mapping[j] = i
+                used.add(i)
+        return mapping
+
+    def _to_reference_frame(self, block: Dict, blocks: List[Dict], reference_extent: Optional[Tuple]) -> Optional[Dict]:
+        """
+        把其他帧中的行位置按文字区域映射到参照帧坐标
+
+        Returns:
+            Dict: 映射后的行；参照帧有位置信息而该帧没有时无法映射，返回None
+        """
+        block = dict(block)
+        if reference_extent is None:
+            block.pop('location', None)
+            return block
+        extent = self._text_extent(blocks)
+        if extent is None:
+            return None
+
+        left, top, width, height = extent
+        ref_left, ref_top, ref_width, ref_height = reference_extent
+        scale_x, scale_y = ref_width / width, ref_height / height
+        location = block['location']
+        block['location'] = {
+            'left': int(ref_left + (location['left'] - left) * scale_x),
+            'top': int(ref_top + (location['top'] - top) * scale_y),
+            'width': int(location['width'] * scale_x),
+            'height': int(location['height'] * scale_y)
+        }
+        return block
+
+    def fuse(self, primary: Dict, others: List[Dict]) -> Dict:
+        """
+        融合同一标签的多次OCR结果
+
+        Args:
+            primary: 当前帧的OCR结果（作为参照，融合结果沿用其行顺序和位置）
+            others: 其他帧的OCR结果
+
+        Returns:
+            Dict: 与OCR结果结构相同的融合结果，另含fusion: {'sources', 'changed_lines', 'added_lines'}；
+                  没有可融合的结果时原样返回primary
+        """
+        reference = primary.get('text_blocks') or []
+        if not primary.get('success') or not reference:
+            return primary
+
+        # 每个参照行的投票成员，以及参照中缺失、需插入到某参照行之后的高置信度行
+        members = [[(block.get('words', ''), block_weight(block))] for block in reference]
+        extras = defaultdict(list)
+        sources = 1
+
+        reference_extent = self._text_extent(reference)
+        for other in others:
+            if not other or other is primary or not other.get('success') or not other.get('text_blocks'):
+                continue
+            blocks = other['text_blocks']
+            mapping = self._align(reference, blocks)
+            if len(mapping) < len(reference) * self.config['min_overlap']:
+                continue
+
+            sources += 1
+            previous = -1
+            for j, block in enumerate(blocks):
+                if j in mapping:
+                    previous = mapping[j]
+                    members[previous].append((block.get('words', ''), block_weight(block)))
+                elif block_weight(block, 0.0) >= self.config['min_extra_probability'] and block.get('words'):
+                    extra = self._to_reference_frame(block, blocks, reference_extent)
+                    if extra is not None:
+                        extras[previous].append(extra)
+
+        if sources == 1:
+            return primary
+
+        fused_blocks, changed, added = [], 0, 0
+        seen_extras = set()
+        for position in range(-1, len(reference)):
+            if position >= 0:
+                block = dict(reference[position])
+                words = vote_text(members[position]) if len(members[position]) > 1 else block.get('words', '')
+                if words != block.get('words', ''):
+                    block['words_original'] = block.get('words', '')
+                    block['words'] = words
+                    changed += 1
+                fused_blocks.append(block)
+            for extra in extras.get(position, ()):
+                # 多个结果都缺的同一行只插入一次
+                if extra['words'] not in seen_extras:
+                    seen_extras.add(extra['words'])
+                    fused_blocks.append(extra)
+                    added += 1
+
+        with self._stats_lock:
+            self.fusions += 1
+            self.changed_lines += changed
+
+        fused = dict(primary)
+        fused.update({
+            'text_blocks': fused_blocks,
+            'words_result_num': len(fused_blocks),
+            'fusion': {'sources': sources, 'changed_lines': changed, 'added_lines': added}
+        })
+        return fused
+
+    def get_stats(self) -> Dict:
+        """
+        获取融合统计信息
+
+        Returns:
+            Dict: 融合次数和被纠正的行数
+        """
+        with self._stats_lock:
+            return {
+                'fusions': self.fusions,
+                'changed_lines': self.changed_lines
+            }
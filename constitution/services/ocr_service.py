@@ -7,10 +7,15 @@ import requests
 import base64
 import json
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime
 from typing import Dict, Optional
 from utils.logger import get_logger
 from utils.logger import log_ocr_call
+from services.http_client import PooledHTTPClient
+from services.ocr_cache import OCRResultCache
+from services.token_store import SQLiteTokenStore, TokenRecord
 
 logger = get_logger(__name__)
 
@@ -23,16 +28,58 @@ class BaiduOCRService:
         初始化OCR服务
 
         Args:
-            config: OCR配置字典，包含api_key, secret_key, token_url, ocr_url
+            config: OCR配置字典，包含api_key, secret_key, token_url, ocr_url，
+                    可选http_pool（连接池配置）、token_timeout、ocr_timeout、
+                    cache（OCR结果缓存配置，enabled为False时关闭）、
+                    token_refresh_ahead（后台刷新线程提前刷新的秒数，线程由start_token_refresher启动）、
+                    token_store_path（多进程共享token的SQLite文件路径）
         """
         self.api_key = config['api_key']
         self.secret_key = config['secret_key']
         self.token_url = config['token_url']
         self.ocr_url = config['ocr_url']
+        self.token_timeout = config.get('token_timeout', 10)
+        self.ocr_timeout = config.get('ocr_timeout', 30)
+
+        # 服务级HTTP连接池，复用到aip.baidubce.com的keep-alive连接
+        self.http_client = PooledHTTPClient(config.get('http_pool'))
+
+        # OCR结果缓存（相同图片+相同参数直接复用结果，节省OCR配额）
+        cache_config = config.get('cache')
+        if cache_config and cache_config.get('enabled', True):
+            self.cache = OCRResultCache(cache_config)
+        else:
+            self.cache = None
 
         # 全局变量存储access_token
         self._access_token = None
         self._token_expire_time = None
+        self._token_lifetime = None
+
+        # token刷新单飞控制：同一时刻只有一个线程请求token，其余线程等待结果
+        self._token_lock = threading.Lock()
+        self._token_generation = 0
+
+        # 后台token刷新线程
+        self.token_refresh_ahead = config.get('token_refresh_ahead', 6 * 3600)
+        self.token_retry_interval = config.get('token_retry_interval', 60)
+        self._refresher_thread = None
+        self._refresher_stop = threading.Event()
+
+        # 跨进程共享token存储：多worker及重启后复用同一个有效token
+        self.token_store = None
+        self._token_store_key = None
+        if config.get('token_store_path'):
+            try:
+                self.token_store = SQLiteTokenStore(config['token_store_path'])
+                self._token_store_key = SQLiteTokenStore.make_key(self.api_key, self.token_url)
+                record = self.token_store.load(self._token_store_key)
+                if record:
+                    self._set_token(record)
+                    logger.info("复用共享存储中的百度云OCR token")
+            except Exception as e:
+                logger.error(f"token共享存储不可用，退回进程内token: {str(e)}")
+                self.token_store = None
 
         logger.info("百度云OCR服务初始化完成")
 
@@ -40,15 +87,83 @@ class BaiduOCRService:
         """
         获取百度云OCR的access_token
 
+        token过期时只有一个线程去请求新token，并发的其他线程阻塞等待
+        并直接使用该次刷新的结果，不会各自重复请求token接口。
+
         Returns:
             str: access_token，失败返回None
         """
         # 检查token是否过期（百度云token有效期为30天）
-        if (self._access_token and
-                self._token_expire_time and
-                datetime.now() < self._token_expire_time):
+        if self.is_token_valid():
             return self._access_token
 
+        generation = self._token_generation
+        with self._token_lock:
+            # 等待期间已有其他线程完成刷新（无论成败），直接使用其结果
+            if generation != self._token_generation:
+                return self._access_token if self.is_token_valid() else None
+
+            if self.is_token_valid():
+                return self._access_token
+
+            return self._fetch_access_token()
+
+    def refresh_access_token(self, min_remaining: float = 0) -> Optional[str]:
+        """
+        刷新access_token（供后台刷新线程调用）
+
+        Args:
+            min_remaining: 共享存储中的token剩余有效期超过该值时直接复用（秒）
+
+        Returns:
+            str: 新的access_token，失败返回None
+        """
+        with self._token_lock:
+            return self._fetch_access_token(min_remaining, force=min_remaining <= 0)
+
+    def _fetch_access_token(self, min_remaining: float = 0, force: bool = False) -> Optional[str]:
+        """
+        获取新token（调用方需持有_token_lock）
+
+        启用共享存储时先在文件锁保护下检查其他进程是否已刷新，
+        只有存储中也没有有效token时才请求token接口。
+
+        Args:
+            min_remaining: 共享存储中token要求的最短剩余有效期（秒）
+            force: 是否忽略共享存储中的token强制刷新
+
+        Returns:
+            str: access_token，失败返回None
+        """
+        try:
+            if self.token_store:
+                record = self.token_store.get_or_refresh(
+                    self._token_store_key,
+                    self._request_access_token,
+                    min_remaining=float('inf') if force else min_remaining
+                )
+            else:
+                record = self._request_access_token()
+
+            if not record:
+                return None
+
+            self._set_token(record)
+            return self._access_token
+
+        except Exception as e:
+            logger.error(f"获取百度云OCR token异常: {str(e)}")
+            return None
+        finally:
+            self._token_generation += 1
+
+    def _request_access_token(self) -> Optional[TokenRecord]:
+        """
+        请求百度云token接口
+
+        Returns:
+            TokenRecord: (access_token, 过期时间戳)，失败返回None
+        """
         try:
             # 请求获取access_token
             params = {
@@ -57,15 +172,14 @@ class BaiduOCRService:
                 'client_secret': self.secret_key
             }
 
-            response = requests.post(self.token_url, params=params, timeout=10)
+            response = self.http_client.post(self.token_url, params=params, timeout=self.token_timeout)
             result = response.json()
 
             if 'access_token' in result:
-                self._access_token = result['access_token']
                 # 设置token过期时间（提前1小时刷新）
-                self._token_expire_time = datetime.now() + timedelta(days=29, hours=23)
+                expires_in = int(result.get('expires_in', 30 * 24 * 3600))
                 logger.info("百度云OCR token获取成功")
-                return self._access_token
+                return result['access_token'], time.time() + expires_in - 3600
             else:
                 logger.error(f"获取百度云OCR token失败: {result}")
                 return None
@@ -77,6 +191,64 @@ class BaiduOCRService:
             logger.error(f"获取百度云OCR token异常: {str(e)}")
             return None
 
+    def _set_token(self, record: TokenRecord):
+        """
+        更新进程内token
+
+        Args:
+            record: (access_token, 过期时间戳)
+        """
+        token, expire_at = record
+        self._token_expire_time = datetime.fromtimestamp(expire_at)
+        self._token_lifetime = expire_at - time.time()
+        self._access_token = token
+
+    def start_token_refresher(self):
+        """
+        启动后台token刷新线程
+
+        在token到期前token_refresh_ahead秒自动续期，请求线程始终拿到有效token，
+        不会阻塞在token接口上。
+        """
+        if self._refresher_thread and self._refresher_thread.is_alive():
+            return
+
+        self._refresher_stop.clear()
+        self._refresher_thread = threading.Thread(
+            target=self._token_refresher_loop,
+            name='baidu-token-refresher',
+            daemon=True
+        )
+        self._refresher_thread.start()
+        logger.info("百度云OCR token后台刷新线程已启动")
+
+    def stop_token_refresher(self):
+        """停止后台token刷新线程"""
+        self._refresher_stop.set()
+        if self._refresher_thread:
+            self._refresher_thread.join(timeout=5)
+            self._refresher_thread = None
+
+    def _token_refresher_loop(self):
+        """后台刷新循环：启动时预取token，之后在到期前续期"""
+        while not self._refresher_stop.is_set():
+            refresh_ahead = self.token_refresh_ahead
+            if self.is_token_valid():
+                remaining = (self._token_expire_time - datetime.now()).total_seconds()
+                # 有效期较短的token最多提前半个有效期刷新，避免反复刷新
+                refresh_ahead = min(self.token_refresh_ahead, (self._token_lifetime or remaining) / 2)
+                wait_seconds = remaining - refresh_ahead
+                if wait_seconds > 0:
+                    # 分段等待，便于停止线程
+                    self._refresher_stop.wait(min(wait_seconds, 3600))
+                    continue
+
+            if self.refresh_access_token(min_remaining=refresh_ahead):
+                logger.info(f"后台刷新token成功，过期时间: {self._token_expire_time.isoformat()}")
+            else:
+                logger.warning(f"后台刷新token失败，{self.token_retry_interval}秒后重试")
+                self._refresher_stop.wait(self.token_retry_interval)
+
     @log_ocr_call
     def recognize_text(self, image_path: str, options: Dict = None, force_call: bool = False) -> Dict:
         """
@@ -115,6 +287,73 @@ class BaiduOCRService:
                     'error_code': 'EMPTY_FILE'
                 }
 
+            # 读取图片
+            with open(image_path, 'rb') as f:
+                image_data = f.read()
+
+        except FileNotFoundError:
+            logger.error(f"图片文件不存在: {image_path}")
+            return {
+                'success': False,
+                'error': '图片文件不存在',
+                'error_code': 'FILE_NOT_FOUND'
+            }
+        except Exception as e:
+            logger.error(f"读取OCR图片异常: {str(e)}")
+            return {
+                'success': False,
+                'error': f'OCR服务异常: {str(e)}',
+                'error_code': 'SERVICE_ERROR'
+            }
+
+        return self._recognize_bytes(image_data, options)
+
+    @log_ocr_call
+    def recognize_image_bytes(self, image_bytes: bytes, options: Dict = None) -> Dict:
+        """
+        直接识别内存中的图片数据（无需落盘）
+
+        Args:
+            image_bytes: 编码后的图片字节（JPEG/PNG等）
+            options: OCR识别选项
+
+        Returns:
+            Dict: 识别结果
+        """
+        if not image_bytes:
+            logger.error("图片数据为空")
+            return {
+                'success': False,
+                'error': '图片数据为空',
+                'error_code': 'EMPTY_FILE'
+            }
+
+        logger.info(f"OCR处理内存图片, 大小: {len(image_bytes)} 字节")
+        return self._recognize_bytes(image_bytes, options)
+
+    def _recognize_bytes(self, image_data: bytes, options: Dict = None) -> Dict:
+        """
+        识别图片字节：查询缓存、获取token并调用百度云OCR API
+
+        Args:
+            image_data: 编码后的图片字节
+            options: OCR识别选项
+
+        Returns:
+            Dict: 识别结果
+        """
+        try:
+            default_options = self._build_options(options)
+
+            # 查询OCR结果缓存
+            cache_key = None
+            if self.cache:
+                cache_key = self.cache.make_key(image_data, default_options)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"OCR结果缓存命中: {cache_key[:12]}")
+                    return self._cached_response(cached)
+
             # 获取access_token
             access_token = self.get_access_token()
             if not access_token:
@@ -124,24 +363,10 @@ class BaiduOCRService:
                     'error_code': 'TOKEN_ERROR'
                 }
 
-            # 读取图片并转换为base64
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-
+            # 转换为base64
             image_base64 = base64.b64encode(image_data).decode('utf-8')
             logger.info(f"图片Base64编码完成，长度: {len(image_base64)} 字符")
 
-            # 默认OCR参数
-            default_options = {
-                'language_type': 'CHN_ENG',  # 中英文混合
-                'detect_direction': 'true',  # 检测图像朝向
-                'paragraph': 'true',  # 输出段落信息
-                'probability': 'true'  # 返回识别结果中每一行的置信度
-            }
-
-            if options:
-                default_options.update(options)
-
             # 调用百度云OCR API
             ocr_url = f"{self.ocr_url}?access_token={access_token}"
             headers = {'Content-Type': 'application/x-www-form-urlencoded'}
@@ -150,13 +375,14 @@ class BaiduOCRService:
                 **default_options
             }
 
-            response = requests.post(ocr_url, headers=headers, data=data, timeout=30)
+            response = self.http_client.post(ocr_url, headers=headers, data=data, timeout=self.ocr_timeout)
             result = response.json()
 
             if 'words_result' in result:
                 logger.info(f"百度云OCR识别成功，识别到{result.get('words_result_num', 0)}个文字块")
                 # ========== 新增：记录调用详情到日志 ==========
                 logger.info(f"百度OCR调用详情：{json.dumps(result, ensure_ascii=False)}")
+                self._store_cache(cache_key, result)
                 return {
                     'success': True,
                     'text_blocks': result['words_result'],
@@ -175,13 +401,6 @@ class BaiduOCRService:
                     'raw_result': result  # 新增：返回原始错误
                 }
 
-        except FileNotFoundError:
-            logger.error(f"图片文件不存在: {image_path}")
-            return {
-                'success': False,
-                'error': '图片文件不存在',
-                'error_code': 'FILE_NOT_FOUND'
-            }
         except requests.exceptions.RequestException as e:
             logger.error(f"百度云OCR网络异常: {str(e)}")
             return {
@@ -210,6 +429,17 @@ class BaiduOCRService:
             Dict: 识别结果
         """
         try:
+            default_options = self._build_options(options)
+
+            # 查询OCR结果缓存
+            cache_key = None
+            if self.cache:
+                cache_key = self.cache.make_key(image_base64.encode('utf-8'), default_options)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"OCR Base64结果缓存命中: {cache_key[:12]}")
+                    return self._cached_response(cached)
+
             access_token = self.get_access_token()
             if not access_token:
                 return {
@@ -218,17 +448,6 @@ class BaiduOCRService:
                     'error_code': 'TOKEN_ERROR'
                 }
 
-            # 默认OCR参数
-            default_options = {
-                'language_type': 'CHN_ENG',
-                'detect_direction': 'true',
-                'paragraph': 'true',
-                'probability': 'true'
-            }
-
-            if options:
-                default_options.update(options)
-
             # 调用百度云OCR API
             ocr_url = f"{self.ocr_url}?access_token={access_token}"
             headers = {'Content-Type': 'application/x-www-form-urlencoded'}
@@ -237,11 +456,12 @@ class BaiduOCRService:
                 **default_options
             }
 
-            response = requests.post(ocr_url, headers=headers, data=data, timeout=30)
+            response = self.http_client.post(ocr_url, headers=headers, data=data, timeout=self.ocr_timeout)
             result = response.json()
 
             if 'words_result' in result:
                 logger.info(f"百度云OCR Base64识别成功，识别到{result.get('words_result_num', 0)}个文字块")
+                self._store_cache(cache_key, result)
                 return {
                     'success': True,
                     'text_blocks': result['words_result'],
@@ -273,6 +493,53 @@ class BaiduOCRService:
                 'error_code': 'SERVICE_ERROR'
             }
 
+    def _build_options(self, options: Dict = None) -> Dict:
+        """
+        合并默认OCR参数
+
+        Args:
+            options: 调用方指定的OCR参数
+
+        Returns:
+            Dict: 最终OCR参数
+        """
+        default_options = {
+            'language_type': 'CHN_ENG',  # 中英文混合
+            'detect_direction': 'true',  # 检测图像朝向
+            'paragraph': 'true',  # 输出段落信息
+            'probability': 'true'  # 返回识别结果中每一行的置信度
+        }
+
+        if options:
+            default_options.update(options)
+
+        return default_options
+
+    def _store_cache(self, cache_key: Optional[str], result: Dict):
+        """缓存成功的OCR原始结果"""
+        if self.cache and cache_key:
+            self.cache.set(cache_key, result)
+
+    def _cached_response(self, result: Dict) -> Dict:
+        """由缓存的OCR原始结果构造识别响应"""
+        return {
+            'success': True,
+            'text_blocks': result['words_result'],
+            'words_result_num': result.get('words_result_num', len(result['words_result'])),
+            'raw_result': result,
+            'token_info': self.get_token_info(),
+            'cache_hit': True
+        }
+
+    def get_cache_stats(self) -> Optional[Dict]:
+        """
+        获取OCR结果缓存统计信息
+
+        Returns:
+            Dict: 缓存命中率与字节数统计，未启用缓存返回None
+        """
+        return self.cache.get_stats() if self.cache else None
+
     def is_token_valid(self) -> bool:
         """
         检查当前token是否有效
@@ -296,3 +563,12 @@ class BaiduOCRService:
             'is_valid': self.is_token_valid(),
             'expire_time': self._token_expire_time.isoformat() if self._token_expire_time else None
         }
+
+    def get_pool_stats(self) -> Dict:
+        """
+        获取HTTP连接池统计信息
+
+        Returns:
+            Dict: 连接池命中/未命中统计
+        """
+        return self.http_client.get_pool_stats()
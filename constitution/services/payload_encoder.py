@@ -0,0 +1,252 @@
+"""
+按字节预算编码OCR上传图片
+预处理结果原先一律按默认JPEG质量编码，再经Base64膨胀约33%后上传；
+这里按内容选择格式（二值文字图用1位PNG，其他用JPEG质量搜索，必要时按文字大小缩小），
+在文字仍然清晰的前提下让上传体积落在预算内，并报告节省的字节数
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def base64_length(size: int) -> int:
+    """size字节的数据Base64编码后的长度"""
+    return (size + 2) // 3 * 4
+
+
+class PayloadEncoder:
+    """
+    OCR上传图片编码器
+
+    1. 灰度几乎全部集中在两端的图视为二值文字图，直接编码为1位PNG（无损，体积最小）；
+    2. 其他图按JPEG质量从高到低二分搜索，取放得进预算的最高质量；
+    3. 最低质量仍超预算时逐级缩小重试，缩小比例受文字高度和笔画宽度限制，
+       保证缩小后文字高度、笔画宽度不低于OCR可辨认的下限；
+    4. 在可辨认下限内仍放不下时取下限处最小的编码（within_budget为False）。
+    预算按Base64编码后的长度计算，即实际上传的体积。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化编码器
+
+        Args:
+            config: 配置字典，可包含budget_bytes, max_quality, min_quality, quality_step,
+                    scale_step, min_text_height, min_stroke_width, binary_ratio
+        """
+        self.config = {
+            'budget_bytes': 200 * 1024,   # Base64编码后的上传体积预算
+            'max_quality': 90,            # JPEG质量搜索上限
+            'min_quality': 60,            # JPEG质量下限，低于该值笔画边缘振铃明显
+            'quality_step': 5,            # 质量搜索步长
+            'scale_step': 0.8,            # 每级缩小比例
+            'min_text_height': 16,        # 缩小后文字高度下限（像素）
+            'min_stroke_width': 1.5,      # 缩小后笔画宽度下限（像素）
+            'binary_ratio': 0.98,         # 灰度落在两端的像素占比达到该值视为二值图
+            'baseline_quality': 95        # 计算节省字节数的基准（cv2默认JPEG质量）
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._stats_lock = threading.Lock()
+        self.encoded = 0
+        self.over_budget = 0
+        self.bytes_saved = 0
+
+    def _is_binarized(self, gray: np.ndarray) -> bool:
+        """灰度直方图几乎全部落在两端（二值化后的文字图）"""
+        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        extremes = histogram[:16].sum() + histogram[240:].sum()
+        return bool(extremes >= gray.size * self.config['binary_ratio'])
+
+    @staticmethod
+    def estimate_text_scale(gray: np.ndarray) -> Tuple[Optional[float], Optional[float]]:
+        """
+        估计文字高度和笔画宽度
+
+        Otsu阈值分出墨迹（占比较少的一类）：墨迹连通域的中位高度作为文字高度
+        （汉字的偏旁可能各自成块，估计偏小，缩小时更保守）；
+        距离变换在笔画中心线上的中位值换算为笔画宽度。
+
+        Args:
+            gray: 灰度图像
+
+        Returns:
+            Tuple[float, float]: (文字高度, 笔画宽度)，找不到文字时为 (None, None)
+        """
+        _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        if cv2.countNonZero(ink) > ink.size / 2:
+            ink = cv2.bitwise_not(ink)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        glyphs = heights[(heights >= 4) & (heights <= gray.shape[0] * 0.2) & (areas >= 8)]
+        if len(glyphs) < 3:
+            return None, None
+
+        distance = cv2.distanceTransform(ink, cv2.DIST_L2, 3)
+        ridge = (distance > 0) & (distance >= cv2.dilate(distance, np.ones((3, 3), np.uint8)))
+        stroke_width = max(2 * float(np.median(distance[ridge])) - 1, 1.0)
+        return float(np.median(glyphs)), stroke_width
+
+    def _min_scale(self, text_height: Optional[float], stroke_width: Optional[float]) -> float:
+        """文字仍可辨认的最小缩放比例，估计不出文字大小时不缩小"""
+        if not text_height or not stroke_width:
+            return 1.0
+        return min(max(self.config['min_text_height'] / text_height,
+                       self.config['min_stroke_width'] / stroke_width), 1.0)
+
+    def _search_quality(self, img: np.ndarray, limit: int, attempts: list) -> Optional[Tuple[bytes, int]]:
+        """
+        搜索放得进limit字节的最高JPEG质量
+
+        先试最高质量（多数图片一次即可）；放不下时试最低质量，最低质量也放不下说明需要缩小，
+        否则在两者之间二分。
+
+        Returns:
+            Tuple[bytes, int]: (编码结果, 质量)，最低质量也放不下时返回None
+        """
+        config = self.config
+        qualities = list(range(config['max_quality'], config['min_quality'] - 1, -config['quality_step']))
+
+        def fits(quality: int) -> Optional[bytes]:
+            success, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            attempts.append(('jpeg', quality, len(encoded) if success else None))
+            return encoded.tobytes() if success and len(encoded) <= limit else None
+
+        payload = fits(qualities[0])
+        if payload is not None:
+            return payload, qualities[0]
+
+        if len(qualities) == 1:
+            return None
+        payload = fits(qualities[-1])
+        if payload is None:
+            return None
+
+        best = (payload, qualities[-1])
+        low, high = 1, len(qualities) - 2
+        while low <= high:
+            middle = (low + high) // 2
+            payload = fits(qualities[middle])
+            if payload is not None:
+                best = (payload, qualities[middle])
+                high = middle - 1
+            else:
+                low = middle + 1
+        return best
+
+    def encode(self, gray: np.ndarray, report: dict = None) -> Optional[bytes]:
+        """
+        按预算编码预处理后的灰度图
+
+        Args:
+            gray: 预处理后的灰度图像
+            report: 可选字典，写入编码信息：format, quality, scale, size, bytes, base64_bytes,
+                    baseline_bytes, bytes_saved, budget_bytes, within_budget, binarized,
+                    text_height, stroke_width（需要缩小时才估计）, attempts, elapsed_ms
+
+        Returns:
+            bytes: 编码后的图片字节，失败返回None
+        """
+        report = report if report is not None else {}
+        start = time.perf_counter()
+        config = self.config
+        limit = config['budget_bytes'] * 3 // 4
+        attempts = []
+
+        success, baseline = cv2.imencode('.jpg', gray, [cv2.IMWRITE_JPEG_QUALITY, config['baseline_quality']])
+        if not success:
+            return None
+        baseline = baseline.tobytes()
+
+        binarized = self._is_binarized(gray)
+        text_height = stroke_width = None
+
+        chosen = None
+        if binarized:
+            # 二值图：阈值化后按1位PNG无损编码
+            _, bilevel = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
+            success, encoded = cv2.imencode('.png', bilevel, [cv2.IMWRITE_PNG_BILEVEL, 1])
+            if success:
+                attempts.append(('png', None, len(encoded)))
+                chosen = (encoded.tobytes(), 'png', None, 1.0, gray)
+
+        if chosen is None:
+            scale, img = 1.0, gray
+            while True:
+                found = self._search_quality(img, limit, attempts)
+                if found is not None:
+                    chosen = (found[0], 'jpeg', found[1], scale, img)
+                    break
+                if scale == 1.0:
+                    # 原尺寸放不下才需要估计文字大小，确定可缩小到的下限
+                    text_height, stroke_width = self.estimate_text_scale(gray)
+                    min_scale = self._min_scale(text_height, stroke_width)
+                next_scale = max(scale * config['scale_step'], min_scale)
+                if next_scale >= scale - 1e-6:
+                    # 可辨认下限处仍放不下预算：取下限处最低质量的编码
+                    success, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, config['min_quality']])
+                    if not success:
+                        return None
+                    chosen = (encoded.tobytes(), 'jpeg', config['min_quality'], scale, img)
+                    break
+                scale = next_scale
+                size = (max(int(round(gray.shape[1] * scale)), 1), max(int(round(gray.shape[0] * scale)), 1))
+                img = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+        payload, image_format, quality, scale, img = chosen
+        if len(payload) > len(baseline):
+            payload, image_format, quality, scale, img = baseline, 'jpeg', config['baseline_quality'], 1.0, gray
+        within_budget = base64_length(len(payload)) <= config['budget_bytes']
+        bytes_saved = base64_length(len(baseline)) - base64_length(len(payload))
+
+        with self._stats_lock:
+            self.encoded += 1
+            self.over_budget += not within_budget
+            self.bytes_saved += bytes_saved
+
+        report.update({
+            'format': image_format,
+            'quality': quality,
+            'scale': round(scale, 4),
+            'size': [img.shape[1], img.shape[0]],
+            'bytes': len(payload),
+            'base64_bytes': base64_length(len(payload)),
+            'baseline_bytes': base64_length(len(baseline)),
+            'bytes_saved': bytes_saved,
+            'budget_bytes': config['budget_bytes'],
+            'within_budget': within_budget,
+            'binarized': binarized,
+            'text_height': round(text_height, 1) if text_height else None,
+            'stroke_width': round(stroke_width, 2) if stroke_width else None,
+            'attempts': len(attempts),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+        if not within_budget:
+            logger.info(f"文字可辨认下限内无法放入上传预算: {report['base64_bytes']} > {config['budget_bytes']}")
+        return payload
+
+    def get_stats(self) -> Dict:
+        """
+        获取编码统计信息
+
+        Returns:
+            Dict: 编码次数、超出预算次数和累计节省的上传字节数（Base64后）
+        """
+        with self._stats_lock:
+            return {
+                'encoded': self.encoded,
+                'over_budget': self.over_budget,
+                'bytes_saved': self.bytes_saved
+            }
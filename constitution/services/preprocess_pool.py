@@ -0,0 +1,307 @@
+"""
+图像预处理进程池
+CPU密集的OpenCV预处理在独立进程中执行，不占用请求线程；
+帧数据经multiprocessing.shared_memory传递，不经过pickle序列化
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 共享内存块按1MB对齐分配，便于不同尺寸的帧复用同一块
+BLOCK_ALIGN = 1024 * 1024
+
+# 工作进程内的图像处理器与已映射的共享内存块
+_worker_processor = None
+_worker_blocks = OrderedDict()
+
+
+def available_cpus() -> int:
+    """
+    获取当前进程可用的CPU核数（考虑CPU亲和性限制）
+
+    Returns:
+        int: 可用核数
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _init_worker(processor_config: dict, cv_threads: int):
+    """工作进程初始化：限制OpenCV线程数，创建进程内的图像处理器"""
+    global _worker_processor
+    from services.image_processor import ImageProcessor
+
+    cv2.setNumThreads(cv_threads)
+    _worker_processor = ImageProcessor(processor_config)
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    """映射父进程创建的共享内存块，按名称缓存映射"""
+    block = _worker_blocks.get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        _worker_blocks[name] = block
+        # 父进程会淘汰旧块，这里只保留最近使用的映射
+        while len(_worker_blocks) > 16:
+            _, stale = _worker_blocks.popitem(last=False)
+            stale.close()
+    else:
+        _worker_blocks.move_to_end(name)
+    return block
+
+
+def _run_preprocess(in_name: str, in_shape: tuple, out_name: str,
+                    mode: Optional[str]) -> Tuple[tuple, dict]:
+    """
+    工作进程任务：从共享内存读取帧，预处理结果直接写入输出共享内存
+
+    Returns:
+        Tuple[tuple, dict]: (输出图像形状, 处理报告)
+    """
+    processor = _worker_processor
+    in_block = _attach_block(in_name)
+    out_block = _attach_block(out_name)
+
+    img = np.ndarray(in_shape, dtype=np.uint8, buffer=in_block.buf)
+    height, width = in_shape[:2]
+    target = processor._target_size(width, height)
+    if target:
+        width, height = target
+    out = np.ndarray((height, width), dtype=np.uint8, buffer=out_block.buf)
+
+    report = {}
+    processor.preprocess_array(img, out=out, report=report, mode=mode)
+    return out.shape, report
+
+
+class PreprocessPool:
+    """
+    图像预处理进程池
+
+    工作进程数按CPU拓扑确定，每个进程的OpenCV线程数为 可用核数 / 进程数，
+    避免多进程叠加OpenCV内部线程导致超额订阅。父进程维护可复用的共享内存块，
+    输入帧复制一次进入共享内存，输出由工作进程直接写入共享内存块，
+    父进程以numpy视图零拷贝读取。
+    """
+
+    def __init__(self, processor_config: dict, config: Dict = None):
+        """
+        初始化进程池（工作进程在首次提交任务时启动）
+
+        Args:
+            processor_config: 工作进程内ImageProcessor的配置
+            config: 进程池配置，可包含workers（0表示自动）, cv_threads（0表示自动）,
+                    start_method, task_timeout, max_free_blocks
+        """
+        self.config = {
+            'workers': 0,
+            'cv_threads': 0,
+            'start_method': None,      # 默认forkserver，避免从多线程进程fork
+            'task_timeout': 30,        # 单帧处理超时（秒）
+            'max_free_blocks': 0       # 空闲共享内存块上限，0表示 工作进程数*4
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        cpus = available_cpus()
+        self.workers = self.config['workers'] or max(1, cpus - 1)
+        self.cv_threads = self.config['cv_threads'] or max(1, cpus // self.workers)
+        self.max_free_blocks = self.config['max_free_blocks'] or self.workers * 4
+
+        # 工作进程只做纯计算，不落盘调试图片，也不再嵌套进程池
+        self._processor_config = {**processor_config, 'preprocess_backend': 'thread', 'debug_save': False}
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._free_blocks = []
+        self._blocks_created = 0
+
+        self.tasks = 0
+        self.failures = 0
+        self.restarts = 0
+
+        logger.info(
+            f"预处理进程池配置完成: workers={self.workers}, "
+            f"cv_threads={self.cv_threads}, cpus={cpus}"
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """获取（必要时启动）进程池"""
+        with self._lock:
+            if self._executor is None:
+                method = self.config['start_method']
+                if method is None:
+                    methods = multiprocessing.get_all_start_methods()
+                    method = 'forkserver' if 'forkserver' in methods else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker,
+                    initargs=(self._processor_config, self.cv_threads)
+                )
+                logger.info(f"预处理进程池已启动: start_method={method}")
+            return self._executor
+
+    def _reset_executor(self):
+        """进程池损坏（工作进程崩溃）后丢弃，下次调用时重建"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire_block(self, nbytes: int) -> shared_memory.SharedMemory:
+        """取一块不小于nbytes的共享内存，优先复用空闲块"""
+        with self._lock:
+            for index, block in enumerate(self._free_blocks):
+                # 不复用远大于需求的块，避免小帧长期占用大块内存
+                if nbytes <= block.size <= nbytes * 4:
+                    return self._free_blocks.pop(index)
+            self._blocks_created += 1
+
+        size = max(-(-nbytes // BLOCK_ALIGN) * BLOCK_ALIGN, BLOCK_ALIGN)
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    def _release_block(self, block: shared_memory.SharedMemory, reusable: bool = True):
+        """归还共享内存块；空闲块超出上限或不可复用时释放"""
+        if reusable:
+            with self._lock:
+                if len(self._free_blocks) < self.max_free_blocks:
+                    self._free_blocks.append(block)
+                    return
+        self._destroy_block(block)
+
+    @staticmethod
+    def _destroy_block(block: shared_memory.SharedMemory):
+        """关闭并删除共享内存块"""
+        try:
+            block.close()
+        except BufferError:
+            # 仍有numpy视图引用该块，映射随视图回收；名称照常删除
+            pass
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def preprocess(self, img: np.ndarray, report: dict = None, mode: str = None):
+        """
+        在工作进程中预处理一帧
+
+        产出的图像是共享内存上的只读视图，仅在with块内有效，
+        需要长期持有时调用方自行copy()。
+
+        Args:
+            img: BGR或灰度图像（uint8）
+            report: 可选字典，写入工作进程返回的阶段/耗时报告
+            mode: 预处理模式（full/adaptive），默认使用处理器配置
+
+        Yields:
+            np.ndarray: 处理后的灰度图像
+        """
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        in_block = self._acquire_block(img.nbytes)
+        # 输出为缩放后的灰度图，像素数不超过输入
+        out_block = self._acquire_block(img.shape[0] * img.shape[1])
+        reusable = True
+        out = None
+
+        try:
+            try:
+                out_shape, worker_report = self._submit(img, in_block, out_block, mode)
+            except (FutureTimeoutError, BrokenProcessPool):
+                # 工作进程可能仍在写入，这两块内存不再复用
+                reusable = False
+                raise
+
+            if report is not None:
+                for key, value in worker_report.items():
+                    if key == 'timings_ms':
+                        report.setdefault('timings_ms', {}).update(value)
+                    else:
+                        report[key] = value
+
+            out = np.ndarray(out_shape, dtype=np.uint8, buffer=out_block.buf)
+            out.flags.writeable = False
+            yield out
+
+        finally:
+            # 释放视图后才能安全关闭共享内存
+            del out
+            self._release_block(in_block, reusable)
+            self._release_block(out_block, reusable)
+
+    def _submit(self, img: np.ndarray, in_block: shared_memory.SharedMemory,
+                out_block: shared_memory.SharedMemory, mode: Optional[str]) -> Tuple[tuple, dict]:
+        """复制帧到输入块并等待工作进程完成"""
+        np.ndarray(img.shape, dtype=np.uint8, buffer=in_block.buf)[...] = img
+
+        try:
+            future = self._get_executor().submit(
+                _run_preprocess, in_block.name, img.shape, out_block.name, mode
+            )
+            try:
+                result = future.result(timeout=self.config['task_timeout'])
+            except FutureTimeoutError:
+                future.cancel()
+                raise
+        except BrokenProcessPool:
+            with self._lock:
+                self.failures += 1
+            self._reset_executor()
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        with self._lock:
+            self.tasks += 1
+        return result
+
+    def shutdown(self):
+        """关闭进程池并删除所有空闲共享内存块"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            blocks, self._free_blocks = self._free_blocks, []
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for block in blocks:
+            self._destroy_block(block)
+
+    def get_stats(self) -> Dict:
+        """
+        获取进程池统计信息
+
+        Returns:
+            Dict: 进程数、线程数、任务数、共享内存块使用情况
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'cv_threads_per_worker': self.cv_threads,
+                'running': self._executor is not None,
+                'tasks': self.tasks,
+                'failures': self.failures,
+                'restarts': self.restarts,
+                'shm_blocks_created': self._blocks_created,
+                'shm_blocks_free': len(self._free_blocks)
+            }
@@ -0,0 +1,237 @@
+"""
+本地文字存在性检测
+在调用远程OCR前判断画面中是否有药品标签文字、文字是否足够大，
+没有文字的引导帧不再消耗OCR配额
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TextPresenceDetector:
+    """
+    文字存在性检测器
+
+    默认使用经典方法（无需模型，几毫秒内完成）：
+    1. 形态学梯度 + 阈值得到边缘图，水平闭运算把相邻字符连成文字行候选；
+    2. 按高度、宽高比、边缘填充率过滤候选；
+    3. 每个候选区域要求灰度双峰明显（墨迹与底色分离）且笔画宽度一致，剔除纹理和光斑。
+    配置了离线EAST模型时改用EAST检测文字框。
+    """
+
+    def __init__(self, config: Dict = None):
+        """
+        初始化文字检测器
+
+        Args:
+            config: 配置字典，可包含max_side, min_text_lines, min_text_height_ratio,
+                    east_model_path等
+        """
+        self.config = {
+            'max_side': 640,                 # 检测工作图最长边
+            'min_gradient': 20,              # 边缘阈值下限（Otsu阈值低于该值时使用）
+            'join_width': 9,                 # 水平闭运算核宽度，连接同一行的字符
+            'min_line_height': 5,            # 文字行最小高度（像素）
+            'max_line_height_ratio': 0.2,    # 文字行最大高度占画面高度比例
+            'min_line_aspect': 2.0,          # 文字行最小宽高比
+            'min_edge_fill': 0.35,           # 文字行外接框内边缘像素占比下限
+            'min_bimodality': 0.8,           # 墨迹/底色双峰分离度（类间方差/总方差）下限
+            'max_stroke_cv': 0.6,            # 笔画宽度变异系数上限
+            'max_candidates': 40,            # 最多校验的候选行数（按面积从大到小）
+            'min_text_lines': 2,             # 判定有文字所需的最少文字行
+            'min_text_height_ratio': 0.018,  # 文字行中位高度占画面高度的下限（文字足够大）
+            'east_model_path': None,         # 离线EAST模型(.pb)路径，为空时使用经典方法
+            'east_input_size': (320, 320),
+            'east_confidence': 0.5
+        }
+
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self._gradient_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._join_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (self.config['join_width'], 1))
+        self._ridge_kernel = np.ones((3, 3), dtype=np.uint8)
+
+        self._east = self._load_east(self.config['east_model_path'])
+        self.method = 'east' if self._east is not None else 'edge'
+
+        self._stats_lock = threading.Lock()
+        self.checks = 0
+        self.text_found = 0
+        self.text_large_enough = 0
+
+        logger.info(f"文字检测器初始化完成: method={self.method}")
+
+    def _load_east(self, model_path: Optional[str]):
+        """加载离线EAST模型，不可用时返回None"""
+        if not model_path:
+            return None
+        if not os.path.exists(model_path):
+            logger.warning(f"EAST模型文件不存在，改用经典检测: {model_path}")
+            return None
+
+        try:
+            model = cv2.dnn.TextDetectionModel_EAST(model_path)
+            model.setConfidenceThreshold(self.config['east_confidence'])
+            model.setNMSThreshold(0.4)
+            model.setInputParams(1.0, tuple(self.config['east_input_size']),
+                                 (123.68, 116.78, 103.94), True)
+            return model
+        except Exception as e:
+            logger.warning(f"加载EAST模型失败，改用经典检测: {str(e)}")
+            return None
+
+    def detect(self, gray: np.ndarray) -> Dict:
+        """
+        检测灰度图中是否存在足够大的文字
+
+        Args:
+            gray: 灰度图像
+
+        Returns:
+            Dict: {'has_text', 'text_large_enough', 'line_count', 'text_height_ratio',
+                   'edge_density', 'method', 'elapsed_ms'}
+        """
+        start = time.perf_counter()
+
+        height, width = gray.shape[:2]
+        scale = min(self.config['max_side'] / max(height, width), 1.0)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+
+        if self._east is not None:
+            lines, edge_density = self._detect_east(gray), None
+        else:
+            lines, edge_density = self._detect_edge_lines(gray)
+
+        line_count = len(lines)
+        height_ratio = float(np.median(lines[:, 3])) / gray.shape[0] if line_count else 0.0
+        has_text = line_count >= self.config['min_text_lines']
+        large_enough = has_text and height_ratio >= self.config['min_text_height_ratio']
+
+        with self._stats_lock:
+            self.checks += 1
+            self.text_found += int(has_text)
+            self.text_large_enough += int(large_enough)
+
+        return {
+            'has_text': bool(has_text),
+            'text_large_enough': bool(large_enough),
+            'line_count': line_count,
+            'text_height_ratio': round(height_ratio, 4),
+            'edge_density': edge_density,
+            'method': self.method,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def _detect_edge_lines(self, gray: np.ndarray):
+        """
+        经典方法检测文字行
+
+        Returns:
+            tuple: (文字行外接框 (N, 4)，每行为 x, y, w, h; 全图边缘密度)
+        """
+        config = self.config
+
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, self._gradient_kernel)
+        threshold, _ = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        _, edges = cv2.threshold(gradient, max(threshold, config['min_gradient']), 255, cv2.THRESH_BINARY)
+        edge_density = round(cv2.countNonZero(edges) / edges.size, 4)
+
+        joined = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._join_kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+        boxes = stats[1:, :4]
+        areas = stats[1:, 4]
+
+        widths, heights = boxes[:, 2], boxes[:, 3]
+        fill = areas / np.maximum(widths * heights, 1)
+        keep = ((heights >= config['min_line_height']) &
+                (heights <= gray.shape[0] * config['max_line_height_ratio']) &
+                (widths >= heights * config['min_line_aspect']) &
+                (fill >= config['min_edge_fill']))
+        candidates = boxes[keep]
+        candidates = candidates[np.argsort(-(candidates[:, 2] * candidates[:, 3]))][:config['max_candidates']]
+
+        lines = [box for box in candidates if self._looks_like_text(gray, box)]
+        return np.array(lines, dtype=np.int32).reshape(-1, 4), edge_density
+
+    def _looks_like_text(self, gray: np.ndarray, box: np.ndarray) -> bool:
+        """
+        校验候选行：墨迹与底色双峰分离，且笔画宽度一致
+
+        Args:
+            gray: 检测工作图
+            box: 候选行外接框 x, y, w, h
+
+        Returns:
+            bool: 是否像文字
+        """
+        x, y, w, h = box
+        roi = gray[y:y + h, x:x + w]
+
+        _, ink = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+        # Otsu分离度：类间方差占总方差的比例，印刷文字接近1，纹理明显偏低
+        total_var = float(roi.var())
+        if total_var <= 0:
+            return False
+        ink_ratio = cv2.countNonZero(ink) / ink.size
+        high = roi[ink > 0]
+        low = roi[ink == 0]
+        if high.size == 0 or low.size == 0:
+            return False
+        between_var = ink_ratio * (1 - ink_ratio) * (float(high.mean()) - float(low.mean())) ** 2
+        if between_var / total_var < self.config['min_bimodality']:
+            return False
+
+        # 文字墨迹通常少于底色，面积较小的一类视为笔画
+        if ink_ratio > 0.5:
+            ink = cv2.bitwise_not(ink)
+
+        # 笔画宽度：距离变换在笔画中轴（局部极大值）处的取值
+        distance = cv2.distanceTransform(ink, cv2.DIST_L2, 3)
+        ridge = (distance > 0) & (distance >= cv2.dilate(distance, self._ridge_kernel))
+        widths = distance[ridge]
+        if widths.size < 4:
+            return False
+        return float(widths.std() / widths.mean()) <= self.config['max_stroke_cv']
+
+    def _detect_east(self, gray: np.ndarray) -> np.ndarray:
+        """
+        EAST检测文字框
+
+        Returns:
+            np.ndarray: 文字框外接矩形 (N, 4)
+        """
+        frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        detections, _ = self._east.detect(frame)
+        if not detections:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.array([cv2.boundingRect(np.asarray(quad, dtype=np.int32)) for quad in detections],
+                        dtype=np.int32)
+
+    def get_stats(self) -> Dict:
+        """
+        获取检测统计信息
+
+        Returns:
+            Dict: 检测次数、检出文字次数及放行比例
+        """
+        with self._stats_lock:
+            return {
+                'method': self.method,
+                'checks': self.checks,
+                'text_found': self.text_found,
+                'text_large_enough': self.text_large_enough,
+                'pass_rate': round(self.text_large_enough / self.checks, 4) if self.checks else 0.0
+            }
@@ -0,0 +1,142 @@
+"""
+跨进程access_token共享存储
+多个worker进程及服务重启后复用同一个有效token，由SQLite文件锁协调刷新
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Callable, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (access_token, 过期时间戳)
+TokenRecord = Tuple[str, float]
+
+
+class SQLiteTokenStore:
+    """
+    基于SQLite的token存储
+
+    读取走WAL模式不阻塞；刷新时以BEGIN IMMEDIATE获取数据库写锁，
+    同一时刻只有一个进程调用token接口，其余进程等待后直接读取新token。
+    """
+
+    def __init__(self, db_path: str, lock_timeout: float = 30):
+        """
+        初始化token存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+            lock_timeout: 等待其他进程刷新token的最长时间（秒）
+        """
+        self.db_path = db_path
+        self.lock_timeout = lock_timeout
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS access_tokens ('
+                ' key TEXT PRIMARY KEY,'
+                ' access_token TEXT NOT NULL,'
+                ' expire_at REAL NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+
+        # token属于敏感凭据，仅允许当前用户读写
+        try:
+            os.chmod(db_path, 0o600)
+        except OSError:
+            pass
+
+        logger.info(f"token共享存储初始化完成: {db_path}")
+
+    @staticmethod
+    def make_key(api_key: str, token_url: str) -> str:
+        """
+        生成存储键（不直接保存api_key）
+
+        Args:
+            api_key: 百度云API Key
+            token_url: token接口地址
+
+        Returns:
+            str: 存储键
+        """
+        return hashlib.sha256(f"{token_url}|{api_key}".encode('utf-8')).hexdigest()[:32]
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（每次调用独立连接，可跨线程使用）"""
+        return sqlite3.connect(self.db_path, timeout=self.lock_timeout, isolation_level=None)
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str) -> Optional[TokenRecord]:
+        row = conn.execute(
+            'SELECT access_token, expire_at FROM access_tokens WHERE key = ?', (key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def load(self, key: str, min_remaining: float = 0) -> Optional[TokenRecord]:
+        """
+        读取仍然有效的token
+
+        Args:
+            key: 存储键
+            min_remaining: 要求的最短剩余有效期（秒）
+
+        Returns:
+            TokenRecord: (token, 过期时间戳)，无有效token返回None
+        """
+        conn = self._connect()
+        try:
+            record = self._read(conn, key)
+        finally:
+            conn.close()
+
+        if record and record[1] - time.time() > min_remaining:
+            return record
+        return None
+
+    def get_or_refresh(self, key: str, fetch: Callable[[], Optional[TokenRecord]],
+                       min_remaining: float = 0) -> Optional[TokenRecord]:
+        """
+        获取有效token，必要时在文件锁保护下刷新
+
+        Args:
+            key: 存储键
+            fetch: 请求新token的函数，返回(token, 过期时间戳)或None
+            min_remaining: 存储中token剩余有效期不足该值时刷新（秒）
+
+        Returns:
+            TokenRecord: (token, 过期时间戳)，失败返回None
+        """
+        conn = self._connect()
+        try:
+            # 获取写锁；其他进程正在刷新时在此等待
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                record = self._read(conn, key)
+                if record and record[1] - time.time() > min_remaining:
+                    conn.execute('COMMIT')
+                    return record
+
+                record = fetch()
+                if record:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO access_tokens (key, access_token, expire_at, updated_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, record[0], record[1], time.time())
+                    )
+                conn.execute('COMMIT')
+                return record
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
@@ -0,0 +1,71 @@
+"""
+多面拍摄会话合并测试
+换药的判断不依赖OCR置信度：错字继续合并，名录确认的不同药名重新开始，无法确认的不同药名不合并
+"""
+
+import pytest
+
+from services.capture_session import CaptureSessionStore, same_drug_name
+
+
+def shot(name: str, confidence: float, verified: bool = None, **fields) -> dict:
+    drug_info = {'drug_name': name, 'confidence': confidence, **fields}
+    if verified is not None:
+        drug_info['drug_name_verified'] = verified
+    return drug_info
+
+
+@pytest.fixture
+def store():
+    return CaptureSessionStore({'ocr_history': 0})
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('阿莫西林胶囊', '阿莫西林胶囊', True),
+    ('阿莫西林胶囊', '阿莫西林胶嚢', True),
+    ('Amoxicillin Capsules', 'amoxicilin capsules', True),
+    ('阿莫西林胶囊', '布洛芬缓释胶囊', False),
+    ('布洛芬片', '维C片', False),
+])
+def test_same_drug_name_tolerates_ocr_typos_only(a, b, expected):
+    assert same_drug_name(a, b, 0.34) is expected
+
+
+def test_ocr_typo_at_high_confidence_keeps_merging(store):
+    first = store.merge(None, shot('阿莫西林胶囊', 0.995, usage='口服'))
+    second = store.merge(first['session_id'], shot('阿莫西林胶嚢', 0.993, dosage='一次1粒，一日3次'))
+    assert not second['restarted'] and not second['conflict']
+    assert second['shots'] == 2
+    assert second['drug_info']['usage'] == '口服'
+    assert second['drug_info']['dosage'] == '一次1粒，一日3次'
+
+
+def test_unverified_different_name_is_a_conflict_and_not_merged(store):
+    first = store.merge(None, shot('阿莫西林胶囊', 0.97, dosage='一次1粒，一日3次'))
+    second = store.merge(first['session_id'], shot('布洛芬缓释胶囊', 0.95, usage='餐后服用'))
+    assert second['conflict'] and not second['restarted']
+    assert second['drug_info']['drug_name'] == '布洛芬缓释胶囊'
+    assert 'dosage' not in second['drug_info']
+    assert second['updated_fields'] == [] and second['shots'] == 1
+
+    # 会话记录保持不变，不混入另一盒药的字段
+    third = store.merge(first['session_id'], shot('阿莫西林胶囊', 0.97, storage='密封保存'))
+    assert not third['conflict']
+    assert third['drug_info']['dosage'] == '一次1粒，一日3次'
+    assert 'usage' not in third['drug_info']
+    assert store.get_stats()['conflicts'] == 1
+
+
+def test_verified_different_names_restart_the_session(store):
+    first = store.merge(None, shot('阿莫西林胶囊', 0.6, verified=True, dosage='一次1粒，一日3次'))
+    second = store.merge(first['session_id'], shot('布洛芬缓释胶囊', 0.6, verified=True, usage='餐后服用'))
+    assert second['restarted'] and not second['conflict']
+    assert second['session_id'] == first['session_id'] and second['shots'] == 1
+    assert second['drug_info']['drug_name'] == '布洛芬缓释胶囊'
+    assert 'dosage' not in second['drug_info']
+
+
+def test_one_verified_name_with_distant_name_is_a_conflict(store):
+    first = store.merge(None, shot('阿莫西林胶囊', 0.9, verified=True))
+    second = store.merge(first['session_id'], shot('布洛芬缓释胶囊', 0.9, verified=False))
+    assert second['conflict'] and not second['restarted']
@@ -0,0 +1,105 @@
+"""
+药品信息提取规则引擎测试
+单遍规则引擎（触发词自动机、_TextIndex、回溯边界的模拟）必须与逐字段正则扫描的原始实现逐字段一致
+"""
+
+import random
+
+import pytest
+
+from benchmarks.bench_drug_extractor import (
+    SECTIONS, LegacyDrugInfoExtractor, make_dense_text, make_fragment_text, make_insert
+)
+from services.drug_extractor import DrugInfoExtractor
+
+LABEL_TEXT = ' '.join(section + '。' for section in SECTIONS)
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return DrugInfoExtractor()
+
+
+@pytest.fixture(scope='module')
+def legacy():
+    return LegacyDrugInfoExtractor()
+
+
+def test_label_fields_match_baseline_output(extractor):
+    # 原始实现对完整说明书的输出（含其保留下来的截取边界）
+    assert extractor._extract_fields(LABEL_TEXT) == {
+        'drug_name': '阿莫西林胶囊',
+        'usage': '用量】口服；口服',
+        'dosage': '】口服；不超过4g',
+        'side_effects': '为恶心、呕吐、腹泻及假膜性肠炎等胃肠道反应',
+        'contraindications': '',
+        'allergens': '及青霉素皮肤试验阳性患者禁用',
+        'storage': '】遮光，密封保存',
+        'manufacturer': '】企业名称：某某制药有限公司 生产地址：某省某市',
+        'expiry_date': '】24个月',
+        'batch_number': '',
+        'approval_number': '国药准字H44021351'
+    }
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_fuzzed_fragments_match_legacy(extractor, legacy, seed):
+    rng = random.Random(seed)
+    for _ in range(1500):
+        text = make_fragment_text(rng)
+        assert legacy.comparable(extractor._extract_fields(text)) == legacy.extract_fields(text), text
+
+
+def test_dense_and_long_labels_match_legacy(extractor, legacy):
+    rng = random.Random(100)
+    texts = [make_dense_text(rng, 40) for _ in range(100)] + [make_insert(rng, 10) for _ in range(5)]
+    for text in texts:
+        assert legacy.comparable(extractor._extract_fields(text)) == legacy.extract_fields(text), text
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    '。',
+    '不良反应偶见头晕' * 50,
+    '用法用量用法用量',
+    '有效期至有效期至2027年05月',
+    '【】【药品名称】【】',
+    '布洛芬缓释胶囊复方甘草片',
+    '生产批号：230512 产品批号A2301'
+])
+def test_edge_cases_match_legacy(extractor, legacy, text):
+    assert legacy.comparable(extractor._extract_fields(text)) == legacy.extract_fields(text)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('批准文号：国药准字H44021351 生产企业：某某制药有限公司', '国药准字H44021351'),
+    ('国药准字 Z 20043012。有效期24个月', '国药准字 Z 20043012'),
+    ('批准文号：H44021351。', 'H44021351'),
+    ('阿莫西林胶囊 有效期24个月', '')
+])
+def test_approval_number_is_extracted(extractor, text, expected):
+    assert extractor._extract_fields(text)['approval_number'] == expected
+
+
+def test_approval_number_section_body(extractor):
+    sections = extractor.segmenter.segment(LABEL_TEXT)
+    fields = extractor._extract_fields(LABEL_TEXT, extractor.segmenter.field_spans(LABEL_TEXT, sections))
+    assert fields['approval_number'] == '国药准字H44021351'
+
+
+def test_approval_number_picks_same_name_knowledge_record(tmp_path):
+    from services.drug_knowledge import DrugKnowledgeBase
+
+    knowledge = DrugKnowledgeBase({'db_path': str(tmp_path / 'kb.db')})
+    knowledge.upsert([
+        {'name': '阿莫西林胶囊', 'manufacturer': '甲制药有限公司', 'approval_number': '国药准字H44021351',
+         'contraindications': '青霉素过敏者禁用'},
+        {'name': '阿莫西林胶囊', 'manufacturer': '乙制药有限公司', 'approval_number': '国药准字H13023964',
+         'contraindications': '对青霉素类药物过敏者禁用'}
+    ])
+    extractor = DrugInfoExtractor(knowledge_base=knowledge)
+    block = {'words': '阿莫西林胶囊 批准文号：国药准字H13023964', 'probability': {'average': 0.9}}
+    drug_info = extractor.extract_drug_info({'success': True, 'text_blocks': [block]})
+    assert drug_info['approval_number'] == '国药准字H13023964'
+    assert drug_info['knowledge']['filled'] == ['contraindications']
+    assert drug_info['contraindications'] == '对青霉素类药物过敏者禁用'
@@ -0,0 +1,79 @@
+"""
+药品名录SymSpell索引测试
+lookup必须与在整个名录上逐个计算编辑距离的暴力查找结果一致
+"""
+
+import random
+
+import pytest
+
+from services.drug_lexicon import DrugLexicon, edit_distance, normalize_name
+
+NAMES = ['阿莫西林胶囊', '阿莫西林克拉维酸钾片', '布洛芬缓释胶囊', '布洛芬片', '对乙酰氨基酚片',
+         '复方甘草片', '板蓝根颗粒', '头孢克肟分散片', '头孢拉定胶囊', '氯雷他定片', '蒙脱石散',
+         '维生素C片', 'Amoxicillin Capsules']
+ALPHABET = '阿莫西林胶囊片剂布洛芬缓释头孢克肟颗粒复方甘草板蓝根维生素氨基酚散分'
+
+
+def brute_force(lexicon: DrugLexicon, names: list, candidate: str):
+    """在整个名录上按与lookup相同的距离上限和排序规则取最近的名称"""
+    query = normalize_name(candidate)
+    max_distance = min(lexicon.config['max_distance'], int(len(query) * lexicon.config['distance_ratio']))
+    best = None
+    for name in names:
+        distance = edit_distance(query, normalize_name(name), max_distance)
+        if distance > max_distance:
+            continue
+        rank = (distance, abs(len(name) - len(candidate)), name)
+        if best is None or rank < best:
+            best = rank
+    return None if best is None else {'name': best[2], 'distance': best[0], 'candidate': candidate}
+
+
+def corrupt(rng: random.Random, name: str) -> str:
+    """随机替换、删除或插入0~3个字符"""
+    chars = list(name)
+    for _ in range(rng.randint(0, 3)):
+        operation = rng.choice(('replace', 'delete', 'insert'))
+        position = rng.randrange(len(chars) + (operation == 'insert')) if chars else 0
+        if operation == 'replace' and chars:
+            chars[position] = rng.choice(ALPHABET)
+        elif operation == 'delete' and len(chars) > 1:
+            del chars[position]
+        elif operation == 'insert':
+            chars.insert(position, rng.choice(ALPHABET))
+    return ''.join(chars)
+
+
+@pytest.fixture
+def names():
+    rng = random.Random(7)
+    generated = {''.join(rng.choice(ALPHABET) for _ in range(rng.randint(2, 12))) for _ in range(300)}
+    return NAMES + sorted(generated - set(NAMES))
+
+
+@pytest.fixture
+def lexicon(tmp_path, names):
+    path = tmp_path / 'names.txt'
+    path.write_text('\n'.join(names), encoding='utf-8')
+    return DrugLexicon({'path': str(path), 'index_dir': str(tmp_path / 'index'), 'reload_interval': 0})
+
+
+def test_exact_and_single_typo(lexicon):
+    assert lexicon.lookup('阿莫西林胶囊') == {'name': '阿莫西林胶囊', 'distance': 0, 'candidate': '阿莫西林胶囊'}
+    assert lexicon.lookup('阿莫西林胶嚢')['name'] == '阿莫西林胶囊'
+    assert lexicon.lookup('amoxicillin  capsules')['name'] == 'Amoxicillin Capsules'
+
+
+def test_distance_is_limited_by_candidate_length(lexicon):
+    # 三个字的候选最多纠正一个字；两个字的只允许精确匹配
+    assert lexicon.lookup('蒙脱散')['name'] == '蒙脱石散'
+    assert lexicon.lookup('蒙石') is None
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_lookup_matches_brute_force(lexicon, names, seed):
+    rng = random.Random(seed)
+    for _ in range(400):
+        candidate = corrupt(rng, rng.choice(names))
+        assert lexicon.lookup(candidate) == brute_force(lexicon, names, candidate), candidate
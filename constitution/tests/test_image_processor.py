@@ -0,0 +1,112 @@
+"""
+文字区域裁剪坐标映射测试
+OCR图片上的文本块位置经map_blocks_to_frame映射回原始照片（含EXIF旋转的竖拍照片）
+"""
+
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from services.image_processor import ImageProcessor
+
+# 竖拍照片中标签所在的矩形（EXIF旋转后的显示方向）
+LABEL = (600, 800, 2400, 3200)
+
+
+@pytest.fixture(scope='module')
+def processor(tmp_path_factory):
+    return ImageProcessor({'upload_folder': str(tmp_path_factory.mktemp('uploads'))})
+
+
+def block(left, top, width, height):
+    return {'words': '阿莫西林', 'location': {'left': left, 'top': top, 'width': width, 'height': height}}
+
+
+def portrait_jpeg() -> bytes:
+    """暗背景上的白色标签；按横向存储像素并写入EXIF方向6，解码后为3000x4000竖图"""
+    shown = np.full((4000, 3000, 3), 40, dtype=np.uint8)
+    left, top, right, bottom = LABEL
+    shown[top:bottom, left:right] = 235
+    for y in range(top + 150, bottom - 100, 120):
+        cv2.putText(shown, 'Amoxicillin 0.25g', (left + 80, y), cv2.FONT_HERSHEY_SIMPLEX, 2.5, (20, 20, 20), 6)
+
+    stored = np.ascontiguousarray(np.rot90(shown, 1))
+    image = Image.fromarray(stored[:, :, ::-1])
+    exif = image.getexif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif, quality=90)
+    return buffer.getvalue()
+
+
+def test_text_box_keeps_detached_lot_and_expiry_stamp(processor):
+    """正文与右下角单独印刷的批号/有效期分属两簇，裁剪区域必须同时包含两者"""
+    label = np.full((1200, 1600, 3), 235, dtype=np.uint8)
+    for index, line in enumerate(['Amoxicillin Capsules', 'Usage: oral, 1 capsule', '3 times daily',
+                                  'Store below 25C', 'Keep out of reach', 'of children']):
+        cv2.putText(label, line, (80, 140 + index * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (20, 20, 20), 2)
+    cv2.putText(label, 'LOT 230512  EXP 2027-05', (1050, 1120), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2)
+
+    _, region = processor.crop_text_region(label)
+    assert region['method'] == 'text_box'
+    (left, top), (right, bottom) = region['region'].min(axis=0), region['region'].max(axis=0)
+    assert left <= 80 and top <= 110
+    assert right >= 1450 and bottom >= 1125
+
+
+def test_without_crop_blocks_are_returned_unchanged(processor):
+    blocks = [block(1, 2, 3, 4)]
+    assert processor.map_blocks_to_frame(blocks, None) is blocks
+
+
+def test_text_box_crop_maps_through_output_scale_and_decode_scale(processor):
+    # 解码图(1000x800)中从(100, 50)裁出400x300，OCR图缩小一半，解码时缩小1/2
+    cropped = np.zeros((300, 400), dtype=np.uint8)
+    region = {
+        'method': 'text_box',
+        'matrix': np.array([[1, 0, 100], [0, 1, 50], [0, 0, 1]], dtype=np.float64),
+        'region': np.array([[100, 50], [500, 50], [500, 350], [100, 350]], dtype=np.float64),
+        'area_ratio': 0.15
+    }
+    crop = processor._crop_report(region, cropped, (200, 150), {'scale': 2})
+
+    assert crop['region'] == [[200, 100], [1000, 100], [1000, 700], [200, 700]]
+    mapped = processor.map_blocks_to_frame([block(10, 20, 30, 40), {'words': '无位置'}], crop)
+    assert mapped[0]['frame_location'] == {'left': 240, 'top': 180, 'width': 120, 'height': 160}
+    assert 'frame_location' not in mapped[1]
+
+
+def test_perspective_crop_maps_corners_back_to_quad(processor):
+    quad = np.array([[120, 80], [620, 100], [600, 480], [100, 460]], dtype=np.float32)
+    target = np.array([[0, 0], [499, 0], [499, 379], [0, 379]], dtype=np.float32)
+    transform = cv2.getPerspectiveTransform(quad, target)
+    region = {'method': 'perspective', 'matrix': np.linalg.inv(transform), 'region': quad.astype(np.float64),
+              'area_ratio': 0.4}
+    crop = processor._crop_report(region, np.zeros((380, 500), dtype=np.uint8), (500, 380), {'scale': 1})
+
+    location = processor.map_blocks_to_frame([block(0, 0, 499, 379)], crop)[0]['frame_location']
+    assert location == pytest.approx({'left': 100, 'top': 80, 'width': 520, 'height': 400}, abs=1)
+
+
+def test_exif_rotated_portrait_maps_to_label(processor):
+    report = {}
+    assert processor.preprocess_image_bytes(portrait_jpeg(), report) is not None
+
+    assert report['decode']['source_size'] == [3000, 4000]
+    crop = report['crop']
+    left, top, right, bottom = LABEL
+    region = np.array(crop['region'])
+    assert region[:, 0].min() == pytest.approx(left, abs=30)
+    assert region[:, 0].max() == pytest.approx(right, abs=30)
+    assert region[:, 1].min() == pytest.approx(top, abs=30)
+    assert region[:, 1].max() == pytest.approx(bottom, abs=30)
+
+    width, height = report['encoding']['size']
+    location = processor.map_blocks_to_frame([block(0, 0, width, height)], crop)[0]['frame_location']
+    assert location['left'] == pytest.approx(left, abs=30)
+    assert location['top'] == pytest.approx(top, abs=30)
+    assert location['left'] + location['width'] == pytest.approx(right, abs=30)
+    assert location['top'] + location['height'] == pytest.approx(bottom, abs=30)
@@ -0,0 +1,47 @@
+"""
+多帧OCR融合逐字投票测试
+"""
+
+import pytest
+
+from services.ocr_fusion import vote_text
+
+
+def test_single_member_is_returned_unchanged():
+    assert vote_text([('阿莫西林胶囊', 0.9)]) == '阿莫西林胶囊'
+
+
+@pytest.mark.parametrize('members, expected', [
+    # 参照帧的错字被另外两帧纠正
+    ([('阿莫西林胶嚢', 0.6), ('阿莫西林胶囊', 0.9), ('阿莫西林胶囊', 0.8)], '阿莫西林胶囊'),
+    # 两帧合计权重超过高置信度的参照帧
+    ([('阿莫西林胶嚢', 0.9), ('阿莫西林胶囊', 0.5), ('阿莫西林胶囊', 0.5)], '阿莫西林胶囊'),
+    # 平票时参照优先
+    ([('阿莫西林胶囊', 0.5), ('阿莫西林胶嚢', 0.5)], '阿莫西林胶囊'),
+    ([('阿莫西林胶嚢', 0.5), ('阿莫西林胶囊', 0.5)], '阿莫西林胶嚢'),
+])
+def test_substitutions_follow_weighted_majority(members, expected):
+    assert vote_text(members) == expected
+
+
+def test_missing_character_is_inserted_by_majority():
+    assert vote_text([('一次片', 0.5), ('一次1片', 0.9), ('一次1片', 0.8)]) == '一次1片'
+
+
+def test_extra_character_is_deleted_by_majority():
+    assert vote_text([('一次11片', 0.5), ('一次1片', 0.9), ('一次1片', 0.8)]) == '一次1片'
+
+
+def test_minority_deletion_keeps_reference_character():
+    assert vote_text([('一次1片', 0.5), ('一次片', 0.4), ('一次1片', 0.3)]) == '一次1片'
+
+
+def test_insertion_needs_more_than_half_of_total_weight():
+    assert vote_text([('一次1片', 0.9), ('一次1片X', 0.3), ('一次1片', 0.3)]) == '一次1片'
+    assert vote_text([('一次1片', 0.2), ('一次1片X', 0.5), ('一次1片X', 0.5)]) == '一次1片X'
+    # 恰好一半不采纳
+    assert vote_text([('一次1片', 0.5), ('一次1片X', 0.5)]) == '一次1片'
+
+
+def test_empty_reference_takes_majority_insertion():
+    assert vote_text([('', 0.5), ('abc', 0.9)]) == 'abc'
@@ -0,0 +1,113 @@
+"""
+上传图片按预算编码测试
+编码结果必须放进预算（或在文字可辨认下限处如实报告超出），且不大于基线编码
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from services.payload_encoder import PayloadEncoder, base64_length
+
+
+def text_image(font_scale: float = 1.2, thickness: int = 2, noise: float = 8.0) -> np.ndarray:
+    """浅底深字的说明书图像，noise为0时只有两种灰度"""
+    img = np.full((1200, 1600), 215, np.uint8)
+    for y in range(int(60 * font_scale), 1200, int(45 * font_scale)):
+        cv2.putText(img, 'Amoxicillin Capsules 0.25g x 24', (20, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 30, thickness)
+    if noise:
+        rng = np.random.default_rng(0)
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+def jpeg_size(img: np.ndarray, quality: int) -> int:
+    return len(cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1])
+
+
+def encode(img: np.ndarray, **config) -> dict:
+    report = {}
+    payload = PayloadEncoder(config).encode(img, report)
+    assert payload is not None and len(payload) == report['bytes']
+    assert report['base64_bytes'] == base64_length(len(payload))
+    assert report['base64_bytes'] <= report['baseline_bytes']
+    return report
+
+
+@pytest.mark.parametrize('size, expected', [(0, 0), (1, 4), (2, 4), (3, 4), (4, 8), (300, 400)])
+def test_base64_length(size, expected):
+    assert base64_length(size) == expected
+
+
+def test_generous_budget_keeps_max_quality():
+    report = encode(text_image(), budget_bytes=10 * 1024 * 1024)
+    assert (report['format'], report['quality'], report['scale']) == ('jpeg', 90, 1.0)
+    assert report['within_budget'] and report['attempts'] == 1
+
+
+def test_tight_budget_picks_highest_quality_that_fits():
+    img = text_image()
+    budget = base64_length(jpeg_size(img, 75))
+    report = encode(img, budget_bytes=budget)
+    assert report['within_budget'] and report['base64_bytes'] <= budget
+    assert report['scale'] == 1.0 and 60 <= report['quality'] < 90
+    # 高一档的质量放不下预算
+    assert base64_length(jpeg_size(img, report['quality'] + 5)) > budget
+
+
+def test_downscales_when_min_quality_does_not_fit():
+    img = text_image(font_scale=3.0, thickness=6)
+    budget = base64_length(jpeg_size(img, 60)) // 2
+    report = encode(img, budget_bytes=budget)
+    assert report['within_budget'] and report['base64_bytes'] <= budget
+    assert report['scale'] < 1.0
+    assert report['text_height'] * report['scale'] >= 16 - 1
+    assert report['size'] == [round(1600 * report['scale']), round(1200 * report['scale'])]
+
+
+def test_impossible_budget_stops_at_legibility_limit():
+    img = text_image()
+    report = encode(img, budget_bytes=1024)
+    assert not report['within_budget'] and report['base64_bytes'] > 1024
+    assert report['quality'] == 60
+    min_scale = max(16 / report['text_height'], 1.5 / report['stroke_width'])
+    assert report['scale'] == pytest.approx(min(min_scale, 1.0), abs=1e-3)
+
+
+def test_image_without_text_is_never_downscaled():
+    # 大色块之间没有文字尺度的连通域，估计不出文字大小
+    blocks = np.random.default_rng(1).integers(0, 256, (4, 5))
+    img = np.kron(blocks, np.ones((150, 160))).astype(np.uint8)
+    report = encode(img, budget_bytes=1024)
+    assert not report['within_budget']
+    assert report['scale'] == 1.0 and report['text_height'] is None
+
+
+def test_binarized_image_is_encoded_as_bilevel_png():
+    img = text_image(noise=0)
+    img[img > 127] = 255
+    img[img <= 127] = 0
+    report = encode(img)
+    assert report['binarized'] and report['format'] == 'png'
+    assert report['within_budget'] and report['scale'] == 1.0
+    decoded = cv2.imdecode(np.frombuffer(PayloadEncoder().encode(img), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert np.array_equal(decoded, img)
+
+
+def test_falls_back_to_baseline_when_it_is_smaller():
+    # 质量区间高于基线质量时，候选编码比q95基线大，应改用基线
+    report = encode(text_image(), budget_bytes=10 * 1024 * 1024, max_quality=100, min_quality=100)
+    assert (report['format'], report['quality'], report['scale']) == ('jpeg', 95, 1.0)
+    assert report['base64_bytes'] == report['baseline_bytes'] and report['bytes_saved'] == 0
+
+
+def test_stats_count_encodes_over_budget_and_savings():
+    encoder = PayloadEncoder({'budget_bytes': 4096})
+    reports = [{}, {}]
+    encoder.encode(text_image(), reports[0])
+    encoder.encode(np.full((200, 200), 128, np.uint8), reports[1])
+    stats = encoder.get_stats()
+    assert stats['encoded'] == 2
+    assert stats['over_budget'] == sum(not report['within_budget'] for report in reports) == 1
+    assert stats['bytes_saved'] == sum(report['bytes_saved'] for report in reports)
@@ -0,0 +1,164 @@
+"""
+多模式关键词自动机
+所有关键词类别构建一次，一遍扫描返回每个命中的关键词、所属类别和位置，
+供药品信息提取和拍照内容预检共用
+"""
+
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+# pyahocorasick为可选依赖（C实现的Aho-Corasick），未安装时使用基于前缀树正则的等价实现
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def literal_trie_pattern(words: Iterable[str]) -> str:
+    """
+    把一组字面量按公共前缀合并为正则（如 有效期(?:至)?），同一位置优先匹配最长的词
+
+    相比逐个列出的交替模式，每个位置只需按首字符进入一个分支。
+
+    Args:
+        words: 字面量列表
+
+    Returns:
+        str: 正则表达式
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # 当前位置已构成完整的词时，后续分支可选；贪婪匹配保证优先取更长的词
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordAutomaton:
+    """
+    关键词自动机
+
+    返回全部命中（含相互重叠、互相包含的关键词），按起点升序排列。
+    安装了pyahocorasick时直接使用其自动机；否则用前缀树正则做一遍最长匹配扫描，
+    被最长命中遮住的关键词（包含在其中或跨越其结尾）由构建时预先计算的偏移补回，
+    作用相当于Aho-Corasick的输出链接。
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        """
+        构建自动机
+
+        Args:
+            keywords: 类别 -> 关键词列表，同一关键词可属于多个类别
+        """
+        categories = {}
+        for category, words in keywords.items():
+            for word in words:
+                if word and category not in categories.setdefault(word, ()):
+                    categories[word] += (category,)
+        self._categories = categories
+
+        if ahocorasick is not None:
+            self.backend = 'pyahocorasick'
+            self._automaton = ahocorasick.Automaton()
+            for word in categories:
+                self._automaton.add_word(word, (len(word), word))
+            if categories:
+                self._automaton.make_automaton()
+        else:
+            self.backend = 'regex'
+            self._build_regex_scanner(sorted(categories, key=len, reverse=True))
+
+    def _build_regex_scanner(self, words: List[str]):
+        """构建前缀树正则及被遮住关键词的偏移表"""
+        self._pattern = re.compile(literal_trie_pattern(words)) if words else None
+
+        # 命中词 -> ((偏移, 关键词, 是否需要在文本上核对), ...)
+        # 包含在命中词内部的（含同起点的较短前缀）必然出现；跨越命中词结尾的需要核对
+        self._overlaps = {}
+        for word in words:
+            overlaps = []
+            for other in words:
+                for offset in range(len(word)):
+                    if other == word and offset == 0:
+                        continue
+                    if word.startswith(other, offset):
+                        overlaps.append((offset, other, False))
+                    elif offset > 0 and other.startswith(word[offset:]):
+                        overlaps.append((offset, other, True))
+            if overlaps:
+                self._overlaps[word] = tuple(overlaps)
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def categories_of(self, keyword: str) -> Tuple[str, ...]:
+        """
+        查询关键词所属类别
+
+        Args:
+            keyword: 关键词
+
+        Returns:
+            Tuple[str, ...]: 类别元组，未收录时为空
+        """
+        return self._categories.get(keyword, ())
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """
+        一遍扫描找出所有关键词命中
+
+        Args:
+            text: 待扫描文本
+
+        Returns:
+            List[Tuple[int, str]]: 按起点升序的 (起点, 关键词) 列表，类别用categories_of查询
+        """
+        if not text or not self._categories:
+            return []
+
+        if self.backend == 'pyahocorasick':
+            hits = [(end - length + 1, word) for end, (length, word) in self._automaton.iter(text)]
+            hits.sort()
+            return hits
+
+        hits = [(match.start(), match.group()) for match in self._pattern.finditer(text)]
+
+        overlaps = self._overlaps
+        hidden = []
+        for start, word in hits:
+            if word in overlaps:
+                for offset, other, check in overlaps[word]:
+                    if not check or text.startswith(other, start + offset):
+                        hidden.append((start + offset, other))
+
+        if hidden:
+            hits.extend(hidden)
+            hits.sort()
+        return hits
+
+    def find_categories(self, text: str) -> Dict[str, Set[str]]:
+        """
+        统计文本中出现的各类别关键词
+
+        Args:
+            text: 待扫描文本
+
+        Returns:
+            Dict[str, Set[str]]: 类别 -> 出现过的关键词集合
+        """
+        found = {}
+        for _, word in self.find_all(text):
+            for category in self._categories[word]:
+                found.setdefault(category, set()).add(word)
+        return found
@@ -0,0 +1,157 @@
+"""
+线程安全的LRU缓存
+支持条目数上限、字节数上限和TTL过期，供各服务层缓存复用
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class TTLLRUCache:
+    """带TTL和容量上限的线程安全LRU缓存"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 0, ttl: float = 0,
+                 size_func: Callable[[Any], int] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 最大占用字节数，0表示不限制
+            ttl: 过期时间（秒），0表示永不过期
+            size_func: 计算条目字节数的函数，默认按1字节计
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size_func = size_func or (lambda value: 1)
+
+        # key -> (value, 过期时间戳, 字节数)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        读取缓存，命中时移动到最近使用位置
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+
+        Returns:
+            缓存值或default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expire_at, _ = entry
+            if expire_at and time.monotonic() >= expire_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 单条目过期时间（秒），为空时使用默认TTL
+        """
+        size = self._size_func(value)
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl else 0
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            # 单个条目超过字节上限时不缓存
+            if self.max_bytes and size > self.max_bytes:
+                return
+
+            self._data[key] = (value, expire_at, size)
+            self._bytes += size
+
+            while self._data and (len(self._data) > self.max_entries or
+                                  (self.max_bytes and self._bytes > self.max_bytes)):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """删除并返回缓存条目"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def _remove(self, key: str):
+        """删除条目（调用方需持有锁）"""
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def purge_expired(self) -> int:
+        """
+        清理所有已过期条目
+
+        Returns:
+            int: 清理的条目数
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expire_at, _) in self._data.items()
+                       if expire_at and now >= expire_at]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict: 命中率、条目数、字节数等统计
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }